@@ -1,28 +1,85 @@
-from src.data_preprocessing import load_and_preprocess_data
-from src.document_creation import create_table_rag_documents_multidim
-from src.verification import verify_documents, check_query_capabilities, save_sample_documents
+import argparse
+import os
+from src.data_preprocessing import load_and_preprocess_data, iter_preprocessed_chunks
+from src.dataset_cache import load_preprocessed_dataset
+from src.document_creation import stream_table_rag_documents, render_cube_segment_document
+from src.document_store import compact_row_documents
+from src.verification import DocumentCounters, DocumentReservoir, observe_documents, check_query_capabilities
 from src.vector_store import create_vector_store
+from src.segment_aggregation import SegmentAggregator, aggregate_chunks
+from src.segment_cube import SegmentCube
 from src.qa.pipeline import EcommerceQAPairGenerator
+from src.qa.hybrid_retriever import index_vector_store
+from src.qa.template_generator import synthesize_qa_pairs
 from config.settings import (
-    CSV_PATH, EMBEDDING_MODEL, VECTOR_STORE_SAVE_PATH,
-    QA_LLM_MODEL, QA_OUTPUT_DIR, QA_TOTAL_QUESTIONS, QA_CATEGORIES
+    CSV_PATH, OPTIMIZE_MEMORY, CSV_CHUNK_SIZE, DATASET_CACHE_DIR, EMBEDDING_MODEL, VECTOR_STORE_SAVE_PATH,
+    EMBEDDING_BATCH_SIZE, EMBEDDING_MAX_WORKERS, EMBEDDING_MAX_IN_FLIGHT, EMBEDDING_MAX_RETRIES,
+    EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_MAX_ENTRIES, VECTOR_STORE_INCREMENTAL, VECTOR_INDEX_TYPE, VECTOR_INDEX_PARAMS,
+    COMPACT_DOCUMENT_STORE, SEGMENT_CUBE_DIMENSIONS,
+    QA_LLM_MODEL, QA_OUTPUT_DIR, QA_NUM_QUESTIONS_PER_CATEGORY, QA_TOTAL_QUESTIONS, QA_CATEGORIES,
+    QA_MAX_IN_FLIGHT, QA_LATENCY_TOLERANCE, QA_CACHE_PATH, QA_CACHE_TTL_SECONDS, QA_CACHE_MAX_ENTRIES,
+    QA_CACHE_REFRESH, QA_JOURNAL_PATH, QA_JOURNAL_BATCH_SIZE, QA_LLM_BACKEND, QA_LLM_OPTIONS, QA_LLM_BATCH_SIZE,
+    QA_LLM_BATCH_WAIT, QA_STREAMING, QA_FUSED_GENERATION, QA_TEMPLATE_PAIRS, QA_TEMPLATE_SEED, QA_DEDUP_THRESHOLD,
+    QA_HYBRID_RETRIEVAL, QA_CONTEXT_TOKEN_BUDGET,
 )
 
-def main():
-    # Load and preprocess data
-    processed_df = load_and_preprocess_data(CSV_PATH)
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build the table-RAG vector store and generate GSM8K-style QA pairs.")
+    parser.add_argument(
+        "--resume", action="store_true",
+        help="Reuse the saved vector store and continue the latest unfinished QA run from the run journal",
+    )
+    return parser.parse_args()
+
+def build_vector_store():
+    """
+    Create the table-RAG documents, index them and check their query capabilities.
 
-    # Create documents
-    documents = create_table_rag_documents_multidim(processed_df)
+    Returns the SegmentAggregator holding the segment aggregates of the documents.
+    """
+    # Segment cube for segment queries the documents do not cover, built in the same pass
+    cube = SegmentCube(SEGMENT_CUBE_DIMENSIONS)
+    aggregator = SegmentAggregator()
+    row_documents = compact_row_documents if COMPACT_DOCUMENT_STORE else None
+    if CSV_CHUNK_SIZE:
+        # Stream the CSV in chunks straight into document creation
+        chunks = iter_preprocessed_chunks(CSV_PATH, CSV_CHUNK_SIZE, optimize_memory=OPTIMIZE_MEMORY)
+        documents = stream_table_rag_documents(cube.consume(chunks), row_documents, aggregator)
+    else:
+        # Load and preprocess data, reusing the cached frame when the CSV is unchanged
+        if DATASET_CACHE_DIR:
+            processed_df = load_preprocessed_dataset(CSV_PATH, DATASET_CACHE_DIR, optimize_memory=OPTIMIZE_MEMORY)
+        else:
+            processed_df = load_and_preprocess_data(CSV_PATH, optimize_memory=OPTIMIZE_MEMORY)
 
-    # Create vector store
-    create_vector_store(documents, EMBEDDING_MODEL, VECTOR_STORE_SAVE_PATH)
+        # Create documents lazily from the whole frame
+        documents = stream_table_rag_documents([processed_df], row_documents, aggregator)
+        cube.add(processed_df)
+
+    # Documents flow through the verification counters and the sampler into the vector store
+    # in one pass, without building a list of every document
+    counters, samples = DocumentCounters(), DocumentReservoir()
+    vector_store = create_vector_store(
+        observe_documents(documents, counters, samples), EMBEDDING_MODEL, VECTOR_STORE_SAVE_PATH,
+        batch_size=EMBEDDING_BATCH_SIZE,
+        max_workers=EMBEDDING_MAX_WORKERS,
+        max_in_flight=EMBEDDING_MAX_IN_FLIGHT,
+        max_retries=EMBEDDING_MAX_RETRIES,
+        cache_dir=EMBEDDING_CACHE_DIR,
+        cache_max_entries=EMBEDDING_CACHE_MAX_ENTRIES,
+        incremental=VECTOR_STORE_INCREMENTAL,
+        index_type=VECTOR_INDEX_TYPE,
+        index_params=VECTOR_INDEX_PARAMS,
+        compact_documents=COMPACT_DOCUMENT_STORE,
+    )
 
     # Verify documents
-    verify_documents(documents)
+    counters.report()
 
     # Test query capabilities
     print("\nTesting document capabilities for analytical queries:")
+    metadata_index = index_vector_store(vector_store)
+    documents = metadata_index.documents
     check_query_capabilities(
         documents,
         "Female customers who used discount",
@@ -33,6 +90,7 @@ def main():
             "value1": "Female",
             "value2": "True",
         },
+        index=metadata_index,
     )
     check_query_capabilities(
         documents,
@@ -44,6 +102,7 @@ def main():
             "value1": "Electronics",
             "value2": "Online",
         },
+        index=metadata_index,
     )
     check_query_capabilities(
         documents,
@@ -55,10 +114,11 @@ def main():
             "value1": "Single",
             "value2": "Online",
         },
+        index=metadata_index,
     )
 
     # Check specific example
-    specific_example = check_query_capabilities(
+    check_query_capabilities(
         documents,
         "Unmarried people ordered electronics from online compared to total unmarried online orders",
         {
@@ -68,15 +128,55 @@ def main():
             "value1": "Single",
             "value2": "Online",
         },
+        index=metadata_index,
     )
-    if specific_example:
-        print("\nTo answer the specific example question:")
-        print("1. Retrieve 'Single + Online' statistics")
-        print("2. Retrieve 'Single + Electronics + Online' statistics")
-        print("3. Calculate proportion")
+    # The three-dimension segment (and, unless MULTI_DIMENSIONS pairs marital status with the
+    # channel, its parent) has no stored document; the cube answers it directly
+    single_online = {"Marital_Status": "Single", "Purchase_Channel": "Online"}
+    electronics = render_cube_segment_document(cube, {**single_online, "Purchase_Category": "Electronics"})
+    online_orders = (cube.segment(single_online) or {"count": 0})["count"]
+    print("\nTo answer the specific example question:")
+    print(f"1. 'Single + Online' statistics: {online_orders} customers")
+    if electronics is None:
+        print("2. No 'Single + Online + Electronics' customers")
+    else:
+        print(f"2. 'Single + Online + Electronics' statistics: {electronics.metadata['count']} customers")
+        print(f"3. Proportion: {electronics.metadata['percentage_of_parent']} of unmarried online orders")
 
     # Save sample documents
-    save_sample_documents(documents)
+    samples.save()
+    return aggregator
+
+def synthesize_template_qa_pairs(aggregator=None):
+    """
+    Generate QA pairs from the segment statistics of the dataset, without the LLM.
+
+    Reuses the aggregates of build_vector_store when given; otherwise (on
+    --resume) the data is read and aggregated again.
+    """
+    if aggregator is not None:
+        single_aggregates, multi_aggregates, total_count = aggregator.result()
+    else:
+        if CSV_CHUNK_SIZE:
+            chunks = iter_preprocessed_chunks(CSV_PATH, CSV_CHUNK_SIZE, optimize_memory=OPTIMIZE_MEMORY)
+        elif DATASET_CACHE_DIR:
+            chunks = [load_preprocessed_dataset(CSV_PATH, DATASET_CACHE_DIR, optimize_memory=OPTIMIZE_MEMORY)]
+        else:
+            chunks = [load_and_preprocess_data(CSV_PATH, optimize_memory=OPTIMIZE_MEMORY)]
+        single_aggregates, multi_aggregates, total_count = aggregate_chunks(chunks)
+    qa_pairs = synthesize_qa_pairs(
+        single_aggregates, multi_aggregates, total_count, max_pairs=QA_TEMPLATE_PAIRS, seed=QA_TEMPLATE_SEED
+    )
+    print(f"Synthesized {len(qa_pairs)} template QA pairs from segment statistics")
+    return qa_pairs
+
+def main():
+    args = parse_args()
+    aggregator = None
+    if args.resume and os.path.exists(os.path.join(VECTOR_STORE_SAVE_PATH, "index.faiss")):
+        print(f"Resuming with the saved vector store at {VECTOR_STORE_SAVE_PATH}")
+    else:
+        aggregator = build_vector_store()
 
     # Run QA pair generation pipeline
     print("\nStarting QA pair generation pipeline...")
@@ -84,9 +184,31 @@ def main():
         vector_store_path=VECTOR_STORE_SAVE_PATH,
         llm_model=QA_LLM_MODEL,
         output_dir=QA_OUTPUT_DIR,
-        num_questions_per_category=QA_NUM_QUESTIONS_PER_CATEGORY
+        num_questions_per_category=QA_NUM_QUESTIONS_PER_CATEGORY,
+        index_search_params=VECTOR_INDEX_PARAMS,
+        max_in_flight=QA_MAX_IN_FLIGHT,
+        latency_tolerance=QA_LATENCY_TOLERANCE,
+        cache_path=QA_CACHE_PATH,
+        cache_ttl_seconds=QA_CACHE_TTL_SECONDS,
+        cache_max_entries=QA_CACHE_MAX_ENTRIES,
+        refresh_cache=QA_CACHE_REFRESH,
+        journal_path=QA_JOURNAL_PATH,
+        journal_batch_size=QA_JOURNAL_BATCH_SIZE,
+        llm_backend=QA_LLM_BACKEND,
+        llm_batch_size=QA_LLM_BATCH_SIZE,
+        llm_batch_wait=QA_LLM_BATCH_WAIT,
+        llm_options=QA_LLM_OPTIONS,
+        streaming=QA_STREAMING,
+        fused_generation=QA_FUSED_GENERATION,
+        dedup_threshold=QA_DEDUP_THRESHOLD,
+        hybrid_retrieval=QA_HYBRID_RETRIEVAL,
+        context_token_budget=QA_CONTEXT_TOKEN_BUDGET,
+    )
+    template_qa_pairs = synthesize_template_qa_pairs(aggregator) if QA_TEMPLATE_PAIRS != 0 else None
+    qa_pipeline.run_pipeline(
+        categories=QA_CATEGORIES, num_questions_total=QA_TOTAL_QUESTIONS, resume=args.resume,
+        template_qa_pairs=template_qa_pairs,
     )
-    qa_pipeline.run_pipeline(categories=QA_CATEGORIES, num_questions_total=QA_TOTAL_QUESTIONS)
 
     print("\nFull pipeline execution complete!")
 
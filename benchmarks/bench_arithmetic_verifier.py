@@ -0,0 +1,47 @@
+"""Benchmark bulk arithmetic verification of a JSON QA dataset.
+
+The dataset is built from the template QA pairs of the sample CSV plus the LLM
+pairs in qa_outputs/, repeated to `--pairs`. Run from the project root:
+    python -m benchmarks.bench_arithmetic_verifier --pairs 500000
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from config.settings import CSV_PATH, QA_OUTPUT_DIR
+from src.data_preprocessing import load_and_preprocess_data
+from src.segment_aggregation import aggregate_chunks
+from src.qa.template_generator import synthesize_qa_pairs
+from src.qa.arithmetic_verifier import verify_qa_file, verify_qa_pairs
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pairs", type=int, default=500_000)
+    parser.add_argument("--csv", default=CSV_PATH)
+    args = parser.parse_args()
+
+    qa_pairs = synthesize_qa_pairs(*aggregate_chunks([load_and_preprocess_data(args.csv)]))
+    llm_pairs_path = os.path.join(QA_OUTPUT_DIR, "formatted_qa_pairs_final.json")
+    if os.path.exists(llm_pairs_path):
+        with open(llm_pairs_path) as f:
+            qa_pairs += json.load(f)
+    dataset = (qa_pairs * (args.pairs // len(qa_pairs) + 1))[:args.pairs]
+
+    start = time.perf_counter()
+    report = verify_qa_pairs(dataset)
+    elapsed = time.perf_counter() - start
+    print(f"\nVerified {report['pairs']} pairs in {elapsed:.2f}s ({report['pairs'] / elapsed:,.0f} pairs/s)")
+    print(f"Correct: {report['valid']} | Problems: {report['errors']}")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "qa_pairs.json")
+        with open(path, "w") as f:
+            json.dump(dataset, f)
+        start = time.perf_counter()
+        verify_qa_file(path)
+        elapsed = time.perf_counter() - start
+    print(f"Including JSON loading: {elapsed:.2f}s ({len(dataset) / elapsed:,.0f} pairs/s)")
+
+if __name__ == "__main__":
+    main()
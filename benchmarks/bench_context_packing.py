@@ -0,0 +1,143 @@
+"""Benchmark token-budgeted context packing against joining every retrieved document.
+
+Uses the generated documents, stub vector store and segment-targeted queries of
+bench_hybrid_retrieval, plus QA_CATEGORIES and questions about single customers
+answered from row documents (dense search among the customer rows selected
+through the metadata index), which get compressed. For each
+query set and retriever it reports the context tokens before and after packing,
+how many retrieved target segments or customers are still in the packed context,
+the answering prompt size and the packing time. Run from the project root:
+    python -m benchmarks.bench_context_packing --rows 20000 --budget 400
+"""
+import argparse
+import contextlib
+import io
+import random
+import time
+from langchain.vectorstores import FAISS
+from config.settings import CSV_PATH, QA_CATEGORIES, QA_CONTEXT_TOKEN_BUDGET
+from benchmarks.bench_hybrid_retrieval import make_queries
+from benchmarks.bench_row_documents import make_synthetic_frame
+from benchmarks.stubs import StubEmbeddings
+from src.document_creation import create_table_rag_documents_multidim
+from src.qa.answer_generator import answer_question
+from src.qa.context_packing import ContextPacker, estimate_tokens
+from src.qa.hybrid_retriever import HybridRetriever
+from src.vector_index import filtered_search
+from src.vector_store import embed_texts
+
+def customer_queries(documents, count, seed=0):
+    """(question about one customer, the customer's row position) pairs."""
+    rng = random.Random(seed)
+    rows = [i for i, doc in enumerate(documents) if doc.metadata["doc_type"] == "customer_row"]
+    queries = []
+    for position in rng.sample(rows, min(count, len(rows))):
+        m = documents[position].metadata
+        queries.append((f"A {m['Gender']} customer from {m['Location']} bought {m['Purchase_Category']} "
+                        f"{m['Purchase_Channel']} with a {m['Payment_Method']}. How much did they spend?", position))
+    return queries
+
+def target_marker(doc):
+    """Text that identifies a document's segment or customer in a context."""
+    metadata = doc.metadata
+    return metadata.get("segment_name") or f"(Row {metadata['row_idx']})"
+
+class RowRetriever:
+    """Vector search restricted to customer row documents."""
+
+    def __init__(self, vector_store, embeddings, metadata_index, k):
+        self.vector_store = vector_store
+        self.embeddings = embeddings
+        self.metadata_index = metadata_index
+        self.positions = metadata_index.positions({"doc_type": "customer_row"})
+        self.k = k
+
+    def get_relevant_documents(self, query):
+        query_vector = [self.embeddings.embed_query(query)]
+        _, ids = filtered_search(self.vector_store.index, query_vector, self.k, self.positions)
+        return [self.metadata_index.documents[i] for i in ids[0] if i >= 0]
+
+class PromptCounter:
+    """LLM stand-in that only counts estimated prompt tokens."""
+
+    def __init__(self):
+        self.prompt_tokens = 0
+
+    def invoke(self, prompt, *args, **kwargs):
+        self.prompt_tokens += estimate_tokens(prompt)
+        return ""
+
+def run(retriever, queries, stored, budget):
+    """Packing statistics for one retriever and query set."""
+    packer = ContextPacker(budget)
+    retrieved, kept, pack_seconds = 0, 0, 0.0
+    with contextlib.redirect_stdout(io.StringIO()):
+        for query, target in queries:
+            docs = retriever.get_relevant_documents(query)
+            start = time.perf_counter()
+            context = packer.pack(docs, query)
+            pack_seconds += time.perf_counter() - start
+            if target is not None and any(doc is stored[target] for doc in docs):
+                retrieved += 1
+                kept += target_marker(stored[target]) in context
+
+        prompts = {}
+        for name, context_packer in [("full", None), ("packed", ContextPacker(budget))]:
+            llm = PromptCounter()
+            for query, _ in queries:
+                answer_question(llm, retriever, query, context_packer=context_packer)
+            prompts[name] = llm.prompt_tokens / len(queries)
+    targeted = any(target is not None for _, target in queries)
+    return {
+        "original": packer.original_tokens / packer.calls,
+        "packed": packer.packed_tokens / packer.calls,
+        "kept": f"{kept}/{retrieved}" if targeted else "-",
+        "prompt_full": prompts["full"],
+        "prompt_packed": prompts["packed"],
+        "pack_us": pack_seconds / len(queries) * 1e6,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--csv", default=CSV_PATH)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--budget", type=int, default=QA_CONTEXT_TOKEN_BUDGET or 400)
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        documents = create_table_rag_documents_multidim(make_synthetic_frame(args.csv, args.rows))
+        embeddings = StubEmbeddings(bag_of_words=True)
+        texts = [doc.page_content for doc in documents]
+        vectors = embed_texts(texts, embeddings)
+    vector_store = FAISS.from_embeddings(list(zip(texts, vectors)), embeddings, [doc.metadata for doc in documents])
+    retrievers = {
+        "dense": vector_store.as_retriever(search_kwargs={"k": args.k}),
+        "hybrid": HybridRetriever(vector_store, embeddings, k=args.k),
+    }
+    metadata_index = retrievers["hybrid"].metadata_index
+    stored = metadata_index.documents
+    query_sets = [
+        ("segments", make_queries(stored, args.queries), retrievers),
+        ("categories", [(query, None) for query in QA_CATEGORIES], retrievers),
+        ("customers", customer_queries(stored, args.queries),
+         {"rows": RowRetriever(vector_store, embeddings, metadata_index, args.k)}),
+    ]
+    row = next(doc for doc in stored if doc.metadata["doc_type"] == "customer_row")
+    print(f"{len(stored)} documents, k={args.k}, budget {args.budget} tokens "
+          f"(a full row document is {estimate_tokens(row.page_content)} tokens)")
+
+    print(f"{'queries':<12}{'retriever':<10}{'context':>9}{'packed':>8}{'saved':>7}{'target kept':>13}"
+          f"{'prompt':>8}{'packed':>8}{'pack us':>9}")
+    for set_name, queries, set_retrievers in query_sets:
+        for name, retriever in set_retrievers.items():
+            stats = run(retriever, queries, stored, args.budget)
+            print(f"{set_name:<12}{name:<10}{stats['original']:>9.0f}{stats['packed']:>8.0f}"
+                  f"{1 - stats['packed'] / stats['original']:>7.0%}{stats['kept']:>13}"
+                  f"{stats['prompt_full']:>8.0f}{stats['prompt_packed']:>8.0f}{stats['pack_us']:>9.0f}")
+    print("context/packed: context tokens per call; prompt/packed: answering prompt tokens per call (estimated); "
+          "target kept: retrieved targets still in the packed context")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Benchmark loading the preprocessed dataset cold (CSV) against loading it from the Arrow cache.
+
+Resamples the source CSV to --rows rows in a temporary directory and loads it
+with load_preprocessed_dataset twice per OPTIMIZE_MEMORY mode: once on a cache
+miss, which parses, preprocesses and writes the cache, and once on a hit. Also
+checks that the row documents (create_row_documents) of both frames are
+identical, so a cached load does not change document text and with it the
+embedding cache keys and incremental-update hashes. Run from the project root:
+    python -m benchmarks.bench_dataset_cache --rows 200000
+"""
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+import pandas as pd
+from config.settings import CSV_PATH
+from src.dataset_cache import load_preprocessed_dataset
+from src.document_creation import create_row_documents
+
+def timed_load(csv_path, cache_dir, optimize_memory):
+    """(seconds, frame) of one load_preprocessed_dataset call."""
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        frame = load_preprocessed_dataset(csv_path, cache_dir, optimize_memory=optimize_memory)
+    return time.perf_counter() - start, frame
+
+def differing_documents(cold, cached):
+    """Number of rows whose documents differ between the two frames."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        pairs = zip(create_row_documents(cold), create_row_documents(cached))
+        return sum(a.page_content != b.page_content or a.metadata != b.metadata for a, b in pairs)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--csv", default=CSV_PATH)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path = os.path.join(directory, "customers.csv")
+        source = pd.read_csv(args.csv, low_memory=False)
+        source.sample(n=args.rows, replace=True, random_state=0).to_csv(csv_path, index=False)
+
+        print(f"{'optimize_memory':<16}{'cold s':>8}{'cached s':>10}{'speedup':>9}{'differing docs':>16}")
+        for optimize_memory in (False, True):
+            cache_dir = os.path.join(directory, f"cache-{optimize_memory}")
+            cold_time, cold = timed_load(csv_path, cache_dir, optimize_memory)
+            cached_time, cached = timed_load(csv_path, cache_dir, optimize_memory)
+            print(f"{str(optimize_memory):<16}{cold_time:>8.2f}{cached_time:>10.2f}{cold_time / cached_time:>8.1f}x"
+                  f"{differing_documents(cold, cached):>16,}")
+
+if __name__ == "__main__":
+    main()
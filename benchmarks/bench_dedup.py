@@ -0,0 +1,117 @@
+"""Benchmark near-duplicate detection of QA questions: dedup rate, recall and throughput.
+
+Questions are the template questions of the sample CSV plus the LLM questions in
+qa_outputs/, with their numbers redrawn to get `--questions` distinct questions.
+A `--duplicate-fraction` of them are instead edited copies of an earlier question
+(markdown, case, a dropped or added word). Run from the project root:
+    python -m benchmarks.bench_dedup --questions 200000
+"""
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import re
+import time
+import numpy as np
+from config.settings import CSV_PATH, QA_OUTPUT_DIR
+from src.data_preprocessing import load_and_preprocess_data
+from src.segment_aggregation import aggregate_chunks
+from src.qa.template_generator import synthesize_qa_pairs
+from src.qa.deduplication import DEFAULT_THRESHOLD, NearDuplicateIndex, normalize_question
+
+NUMBER_PATTERN = re.compile(r"\d+(?:\.\d+)?")
+
+def base_questions(csv_path):
+    """Template questions of the CSV plus the original and formatted questions in qa_outputs/."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        questions = [pair["question"] for pair in synthesize_qa_pairs(*aggregate_chunks([load_and_preprocess_data(csv_path)]))]
+    for path in sorted(glob.glob(os.path.join(QA_OUTPUT_DIR, "qa_pair_*.json"))):
+        with open(path) as f:
+            qa_pair = json.load(f)
+        questions += [q for q in (qa_pair.get("original_question"), qa_pair.get("formatted_question")) if q]
+    return questions
+
+def edit(question, rng):
+    """A near-duplicate of `question`: reformatted, or with one word dropped or added."""
+    kind = rng.integers(4)
+    if kind == 0:
+        return f"** {question.strip()} **"
+    if kind == 1:
+        return question.upper()
+    words = question.split()
+    position = int(rng.integers(len(words)))
+    if kind == 2 and len(words) > 20:
+        return " ".join(words[:position] + words[position + 1:])
+    return " ".join(words[:position] + ["exactly"] + words[position:])
+
+def make_questions(base, count, duplicate_fraction, seed=0):
+    """(questions, injected) where injected[i] is True for an edited copy of an earlier question."""
+    rng = np.random.default_rng(seed)
+    questions, injected = [], []
+    for i in range(count):
+        if questions and rng.random() < duplicate_fraction:
+            questions.append(edit(questions[int(rng.integers(len(questions)))], rng))
+            injected.append(True)
+        else:
+            redraw = lambda match: str(int(rng.integers(1, 100_000)))
+            questions.append(NUMBER_PATTERN.sub(redraw, base[i % len(base)]))
+            injected.append(False)
+    return questions, injected
+
+def word_shingles(question):
+    """Three-word shingles of a normalized question, as plain tuples."""
+    words = normalize_question(question).split()
+    return {tuple(words[i:i + 3]) for i in range(max(1, len(words) - 2))}
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--questions", type=int, default=200_000)
+    parser.add_argument("--duplicate-fraction", type=float, default=0.2)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--exact-sample", type=int, default=2000, help="Questions compared pairwise by brute force")
+    parser.add_argument("--csv", default=CSV_PATH)
+    args = parser.parse_args()
+
+    questions, injected = make_questions(base_questions(args.csv), args.questions, args.duplicate_fraction)
+    index = NearDuplicateIndex(args.threshold)
+    print(f"{len(questions)} questions, {sum(injected)} injected near-duplicates, "
+          f"LSH: {index.bands} bands x {index.rows} rows")
+
+    found = []
+    tenth = max(1, len(questions) // 10)
+    seconds = []
+    start = time.perf_counter()
+    for i, question in enumerate(questions):
+        found.append(index.add(question) is not None)
+        if (i + 1) % tenth == 0:
+            seconds.append(time.perf_counter() - start)
+    elapsed = time.perf_counter() - start
+    print(f"Checked {len(questions)} questions in {elapsed:.2f}s ({len(questions) / elapsed:,.0f} checks/s)")
+    print(f"Per check: {seconds[0] / tenth * 1e6:.0f} us over the first tenth, "
+          f"{(seconds[-1] - seconds[-2]) / tenth * 1e6:.0f} us over the last tenth")
+    caught = sum(f and i for f, i in zip(found, injected))
+    flagged_fresh = sum(f and not i for f, i in zip(found, injected))
+    print(f"Dedup rate: {sum(found) / len(found):.1%} | injected near-duplicates caught: "
+          f"{caught}/{sum(injected)} | other questions flagged: {flagged_fresh}")
+
+    # Brute-force check of the first questions against every earlier question that was kept
+    sample = questions[:args.exact_sample]
+    shingles = [word_shingles(question) for question in sample]
+    start = time.perf_counter()
+    exact, kept = [], []
+    for i in range(len(sample)):
+        exact.append(any(jaccard(shingles[i], shingles[j]) >= args.threshold for j in kept))
+        if not exact[-1]:
+            kept.append(i)
+    exact_elapsed = time.perf_counter() - start
+    agree = sum(e == f for e, f in zip(exact, found))
+    print(f"Brute force on the first {len(sample)}: {sum(exact)} near-duplicates, {agree}/{len(sample)} verdicts "
+          f"agree with the index, {len(sample) / exact_elapsed:,.0f} checks/s")
+
+if __name__ == "__main__":
+    main()
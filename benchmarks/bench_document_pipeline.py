@@ -0,0 +1,91 @@
+"""Benchmark the streaming document pipeline against building the list of every document first.
+
+The materialized pipeline is the previous flow: create_table_rag_documents_multidim
+builds the document list, every text is embedded into one list of vectors before
+the index is created, and verification and sampling rescan the list. The
+streaming pipeline feeds stream_table_rag_documents through the verification
+counters and reservoir sampler (observe_documents) into create_vector_store,
+which embeds and indexes one batch at a time. Both use StubEmbeddings and save
+the store to a temporary directory. Reports wall time and the Python heap peak
+(tracemalloc, which also slows both runs down) for growing row counts: the
+streaming peak only grows with the documents the store keeps, not with the
+texts and vectors of every document. Run from the project root:
+    python -m benchmarks.bench_document_pipeline --rows 2000 8000
+"""
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+import tracemalloc
+from langchain.docstore.in_memory import InMemoryDocstore
+from langchain.vectorstores import FAISS
+from config.settings import CSV_PATH
+from benchmarks.bench_row_documents import make_synthetic_frame
+from benchmarks.stubs import StubEmbeddings
+from src.document_creation import create_table_rag_documents_multidim, stream_table_rag_documents
+from src.vector_index import create_index
+from src.vector_store import create_vector_store, embed_texts, document_id
+from src.verification import (
+    DocumentCounters, DocumentReservoir, observe_documents, verify_documents, save_sample_documents,
+)
+
+def materialized(frame, embeddings, save_path, batch_size):
+    """The list-based flow: every document, text and vector in memory before indexing."""
+    documents = create_table_rag_documents_multidim(frame)
+    texts = [doc.page_content for doc in documents]
+    vectors = embed_texts(texts, embeddings, batch_size=batch_size)
+    vector_store = FAISS(embeddings, create_index(vectors), InMemoryDocstore(), {})
+    vector_store.add_embeddings(list(zip(texts, vectors)), metadatas=[doc.metadata for doc in documents],
+                                ids=[document_id(doc.metadata) for doc in documents])
+    vector_store.save_local(save_path)
+    verify_documents(documents)
+    save_sample_documents(documents)
+    return vector_store
+
+def streaming(frame, embeddings, save_path, batch_size):
+    """One pass from document creation through counters and sampling into the store."""
+    counters, samples = DocumentCounters(), DocumentReservoir()
+    vector_store = create_vector_store(
+        observe_documents(stream_table_rag_documents([frame]), counters, samples), "stub", save_path,
+        batch_size=batch_size, embeddings=embeddings, incremental=False,
+    )
+    counters.report()
+    samples.save()
+    return vector_store
+
+def measure(pipeline, frame, batch_size):
+    """(seconds, peak traced MB) of one pipeline run."""
+    embeddings = StubEmbeddings()
+    with tempfile.TemporaryDirectory() as directory:
+        cwd = os.getcwd()
+        os.chdir(directory)
+        try:
+            tracemalloc.start()
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                pipeline(frame, embeddings, os.path.join(directory, "store"), batch_size)
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        finally:
+            os.chdir(cwd)
+    return elapsed, peak / 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[2_000, 8_000])
+    parser.add_argument("--csv", default=CSV_PATH)
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    print(f"{'rows':>8}{'pipeline':>14}{'seconds':>10}{'peak MB':>10}")
+    for rows in args.rows:
+        frame = make_synthetic_frame(args.csv, rows)
+        for name, pipeline in [("materialized", materialized), ("streaming", streaming)]:
+            elapsed, peak = measure(pipeline, frame, args.batch_size)
+            print(f"{rows:>8,}{name:>14}{elapsed:>10.2f}{peak:>10.1f}")
+
+if __name__ == "__main__":
+    main()
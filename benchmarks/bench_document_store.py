@@ -0,0 +1,95 @@
+"""Benchmark the compact document store against holding LangChain Documents.
+
+Creates the documents of a synthetic frame (rows, plus single- and
+multi-dimension segments) both as LangChain Documents in an InMemoryDocstore
+and through compact_row_documents into a CompactDocumentStore. The resampled
+frame repeats source rows, so by default Customer_ID and Purchase_Amount are
+made unique per row, as in real data, which is the harder case for the compact
+row tables. Reports bytes per document (estimated per object, and the Python
+heap each store adds under tracemalloc), the pickled store size (index.pkl),
+search() latency and whether every materialized document is identical.
+Run from the project root:
+    python -m benchmarks.bench_document_store --rows 50000
+"""
+import argparse
+import contextlib
+import gc
+import io
+import pickle
+import time
+import tracemalloc
+import numpy as np
+from langchain.docstore.in_memory import InMemoryDocstore
+from config.settings import CSV_PATH
+from benchmarks.bench_row_documents import make_synthetic_frame
+from src.document_creation import stream_table_rag_documents
+from src.document_store import CompactDocumentStore, compact_row_documents, document_bytes
+from src.vector_store import document_id
+
+def traced_bytes(build):
+    """(result of build(), Python heap bytes it still holds)."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    gc.collect()
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return result, held
+
+def search_us(store, ids):
+    start = time.perf_counter()
+    for doc_id in ids:
+        store.search(doc_id)
+    return (time.perf_counter() - start) / len(ids) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--csv", default=CSV_PATH)
+    parser.add_argument("--resampled", action="store_true",
+                        help="Keep the resampled rows as they are instead of making IDs and amounts unique")
+    args = parser.parse_args()
+
+    frame = make_synthetic_frame(args.csv, args.rows)
+    if not args.resampled:
+        frame["Customer_ID"] = frame["Customer_ID"].astype(str) + "-" + frame.index.astype(str)
+        frame["Purchase_Amount"] = (frame["Purchase_Amount"] + np.arange(len(frame)) % 100 / 100).round(2)
+
+    def documents(row_documents=None):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return {document_id(doc.metadata): doc for doc in stream_table_rag_documents([frame], row_documents)}
+
+    full, full_bytes = traced_bytes(lambda: InMemoryDocstore(documents()))
+
+    def build_compact():
+        store = CompactDocumentStore()
+        store.add(documents(compact_row_documents))
+        return store
+
+    compact, compact_bytes = traced_bytes(build_compact)
+    count = len(compact)
+    rows = sum(doc_id.startswith("row:") for doc_id in full._dict)
+    print(f"{args.rows:,} rows ({'resampled' if args.resampled else 'unique IDs and amounts'}): "
+          f"{count:,} documents, {rows:,} of them rows")
+
+    estimated_full = sum(map(document_bytes, full._dict.values())) / count
+    pickled_full = len(pickle.dumps(full))
+    pickled_compact = len(pickle.dumps(compact))
+    ids = list(full._dict)[::max(1, count // 5_000)]
+    print(f"{'store':<12}{'est. B/doc':>12}{'traced B/doc':>14}{'pickle MB':>11}{'search us':>11}")
+    print(f"{'documents':<12}{estimated_full:>12,.0f}{full_bytes / count:>14,.0f}{pickled_full / 1e6:>11.1f}"
+          f"{search_us(full, ids):>11.1f}")
+    print(f"{'compact':<12}{compact.memory_bytes() / count:>12,.0f}{compact_bytes / count:>14,.0f}"
+          f"{pickled_compact / 1e6:>11.1f}{search_us(compact, ids):>11.1f}")
+    print("traced B/doc includes the docstore's ID dict and ID strings, which both stores hold")
+
+    identical = all(
+        compact.search(doc_id).page_content == doc.page_content and compact.search(doc_id).metadata == doc.metadata
+        for doc_id, doc in full._dict.items()
+    )
+    print(f"Identical materialized documents: {identical}")
+    print(f"Compact store: {compact.summary()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Benchmark batched, concurrent embedding against a single serial embed_documents call.
+
+Uses StubEmbeddings with a simulated per-request latency so it runs without Ollama:
+    python -m benchmarks.bench_embedding --docs 5000 --latency 0.05
+"""
+import argparse
+import time
+from benchmarks.stubs import StubEmbeddings
+from src.vector_store import embed_texts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, default=5000)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per embedding request")
+    parser.add_argument("--per-text-latency", type=float, default=0.001, help="Seconds per embedded text")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--max-in-flight", type=int, default=8)
+    parser.add_argument("--failure-rate", type=float, default=0.05)
+    args = parser.parse_args()
+
+    texts = [f"Customer data (Row {i}): synthetic document {i}" for i in range(args.docs)]
+
+    serial = StubEmbeddings(latency=args.latency, per_text_latency=args.per_text_latency)
+    start = time.perf_counter()
+    expected = serial.embed_documents(texts)
+    serial_time = time.perf_counter() - start
+    print(f"Serial: {serial_time:.2f}s ({args.docs / serial_time:.1f} docs/sec)")
+
+    batched = StubEmbeddings(
+        latency=args.latency, per_text_latency=args.per_text_latency, failure_rate=args.failure_rate
+    )
+    start = time.perf_counter()
+    vectors = embed_texts(
+        texts, batched, args.batch_size, args.workers, args.max_in_flight, max_retries=5, backoff=0.01
+    )
+    batched_time = time.perf_counter() - start
+    print(
+        f"Batched: {batched_time:.2f}s ({args.docs / batched_time:.1f} docs/sec), "
+        f"{batched.calls} calls with failure rate {args.failure_rate}"
+    )
+    print(f"Speedup: {serial_time / batched_time:.1f}x | Identical vectors: {vectors == expected}")
+
+if __name__ == "__main__":
+    main()
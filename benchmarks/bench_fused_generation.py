@@ -0,0 +1,84 @@
+"""Benchmark per-pair LLM calls, tokens and latency of two-call against single-call QA generation.
+
+The two-call path answers each question and then reformats the answer; the
+single-call path produces the GSM8K-formatted pair as JSON in one call. Uses
+StubBatchLLM, whose latency grows with prompt and output tokens, or a real model
+through Ollama. Questions are processed one at a time so latency is per pair.
+Run from the project root:
+    python -m benchmarks.bench_fused_generation
+    python -m benchmarks.bench_fused_generation --ollama llama3 --total 4
+"""
+import argparse
+import tempfile
+import time
+from langchain.schema import Document
+from benchmarks.stubs import StubBatchLLM, StubRetriever
+from src.qa.llm_backend import OllamaBackend
+from src.qa.pipeline import EcommerceQAPairGenerator
+
+# A retrieved row document of typical length
+CONTEXT_DOCUMENT = (
+    "Row 887: Customer ID: 887, Age: 25, Gender: Female, Income Level: Middle, Marital Status: Widowed, "
+    "Education: Bachelor's, Occupation: Middle, Location: Espirito Santo do Pinhal, Purchase Category: Animal Feed, "
+    "Purchase Amount: 331.79, Frequency of Purchase: 7, Purchase Channel: Online, Brand Loyalty: 3, "
+    "Product Rating: 4, Time Spent on Product Research (hours): 1.5, Social Media Influence: High, "
+    "Discount Sensitivity: Somewhat Sensitive, Return Rate: 1, Customer Satisfaction: 7, "
+    "Engagement with Ads: Medium, Device Used for Shopping: Smartphone, Payment Method: Credit Card, "
+    "Time of Purchase: 3/1/2024, Discount Used: True, Customer Loyalty Program Member: False, "
+    "Purchase Intent: Need-based, Shipping Preference: Standard, Time to Decision: 4"
+)
+
+def run(backend, fused, args):
+    """Run the QA pipeline; return (pairs, seconds, LLM calls, prompt tokens, generated tokens)."""
+    retriever = StubRetriever([Document(page_content=CONTEXT_DOCUMENT)] * args.context_docs)
+    with tempfile.TemporaryDirectory() as output_dir:
+        pipeline = EcommerceQAPairGenerator(
+            vector_store_path=None, llm_model="stub", output_dir=output_dir,
+            num_questions_per_category=args.per_category, max_in_flight=1,
+            llm=backend, retriever=retriever, fused_generation=fused,
+        )
+        calls = 0
+        invoke = pipeline.llm.invoke
+
+        def counting_invoke(prompt, *a, **k):
+            nonlocal calls
+            calls += 1
+            return invoke(prompt, *a, **k)
+
+        pipeline.llm.invoke = counting_invoke
+        prompt_before, generated_before = backend.prompt_tokens, backend.generated_tokens
+        start = time.perf_counter()
+        pairs = pipeline.run_pipeline(args.categories, args.total)
+        elapsed = time.perf_counter() - start
+        return (len(pairs), elapsed, calls, backend.prompt_tokens - prompt_before,
+                backend.generated_tokens - generated_before)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ollama", metavar="MODEL", help="Ollama model to use instead of the stub")
+    parser.add_argument("--context-docs", type=int, default=4, help="Retrieved documents per question")
+    parser.add_argument("--categories", nargs="+", default=["customer segments", "purchase channels"])
+    parser.add_argument("--per-category", type=int, default=6)
+    parser.add_argument("--total", type=int, default=12)
+    args = parser.parse_args()
+
+    if args.ollama:
+        backend = OllamaBackend(args.ollama)
+    else:
+        backend = StubBatchLLM(call_latency=0.05, token_latency=0.002, prompt_token_latency=0.0002)
+
+    rows = [("two-call", run(backend, False, args)), ("single-call", run(backend, True, args))]
+
+    print(f"\n{'path':<13}{'pairs':>7}{'calls/pair':>12}{'prompt tok/pair':>17}{'gen tok/pair':>14}{'sec/pair':>10}")
+    per_pair = {}
+    for name, (pairs, elapsed, calls, prompt_tokens, generated_tokens) in rows:
+        per_pair[name] = [value / max(pairs, 1) for value in (calls, prompt_tokens, generated_tokens, elapsed)]
+        calls, prompt_tokens, generated_tokens, elapsed = per_pair[name]
+        print(f"{name:<13}{pairs:>7}{calls:>12.2f}{prompt_tokens:>17.0f}{generated_tokens:>14.0f}{elapsed:>10.3f}")
+    two_call, single_call = per_pair["two-call"], per_pair["single-call"]
+    print(f"Single-call change per pair: {single_call[1] - two_call[1]:+.0f} prompt tokens, "
+          f"{single_call[2] - two_call[2]:+.0f} generated tokens, "
+          f"{single_call[3] - two_call[3]:+.3f}s ({two_call[3] / single_call[3]:.2f}x faster)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Benchmark hybrid (metadata pre-filter + dense + BM25) retrieval against plain dense retrieval.
+
+Queries are segment-targeted questions generated from the multi-dimension segment
+documents ("... Female customers who shop Online ...") and from the single-dimension
+ones, plus the QA_CATEGORIES queries used for question generation. Reports how
+often the targeted segment document is retrieved, the share of segment statistics
+in the results, the context size handed to the LLM and the latency per query.
+Run from the project root:
+    python -m benchmarks.bench_hybrid_retrieval --rows 20000
+"""
+import argparse
+import contextlib
+import io
+import random
+import time
+from langchain.vectorstores import FAISS
+from config.settings import CSV_PATH, QA_CATEGORIES
+from benchmarks.bench_row_documents import make_synthetic_frame
+from benchmarks.stubs import StubEmbeddings
+from src.document_creation import create_table_rag_documents_multidim
+from src.qa.hybrid_retriever import HybridRetriever
+from src.vector_store import embed_texts
+
+SEGMENT_DOC_TYPES = ("segment_statistics", "multi_segment_statistics")
+
+QUESTION_TEMPLATES = [
+    "An online store looked at {segment} customers. What was their average purchase amount?",
+    "How satisfied are {segment} shoppers compared with everyone else?",
+    "What percentage of {segment} customers used a discount on their last order?",
+]
+
+def segment_phrase(metadata):
+    """How a question names a segment: its values, with the dimension for flags and generic or shared values."""
+    if metadata["doc_type"] == "segment_statistics":
+        pairs = [(metadata["dimension"], metadata["segment_value"])]
+    else:
+        pairs = [(metadata["dimension1"], metadata["value1"]), (metadata["dimension2"], metadata["value2"])]
+    words = []
+    for dim, value in pairs:
+        if value in ("True", "False", "Other", "Mixed", "High", "Medium", "Low"):
+            words.append(f"{dim.replace('_', ' ')} {value}")
+        elif dim == "Age_Group":
+            words.append(f"aged {value}")
+        else:
+            words.append(value)
+    return " + ".join(words)
+
+def make_queries(documents, count, seed=0):
+    """(query, targeted document position) pairs over the segment documents."""
+    rng = random.Random(seed)
+    targets = [i for i, doc in enumerate(documents) if doc.metadata["doc_type"] in SEGMENT_DOC_TYPES]
+    queries = []
+    for position in rng.sample(targets, min(count, len(targets))):
+        template = rng.choice(QUESTION_TEMPLATES)
+        queries.append((template.format(segment=segment_phrase(documents[position].metadata)), position))
+    return queries
+
+def evaluate(retrieve, queries, documents):
+    """(hit rate, segment share, average context characters, ms per query) for a retrieval function."""
+    position_of = {id(doc): i for i, doc in enumerate(documents)}
+    hits, segment_docs, returned, characters = 0, 0, 0, 0
+    start = time.perf_counter()
+    results = [retrieve(query) for query, _ in queries]
+    elapsed = time.perf_counter() - start
+    for (_, target), docs in zip(queries, results):
+        positions = [position_of.get(id(doc)) for doc in docs]
+        hits += target in positions
+        segment_docs += sum(doc.metadata["doc_type"] in SEGMENT_DOC_TYPES for doc in docs)
+        returned += len(docs)
+        characters += len("\n\n".join(doc.page_content for doc in docs))
+    return hits / len(queries), segment_docs / max(returned, 1), characters / len(queries), elapsed / len(queries) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--csv", default=CSV_PATH)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        documents = create_table_rag_documents_multidim(make_synthetic_frame(args.csv, args.rows))
+    embeddings = StubEmbeddings(bag_of_words=True)
+    texts = [doc.page_content for doc in documents]
+    with contextlib.redirect_stdout(io.StringIO()):
+        vectors = embed_texts(texts, embeddings)
+    vector_store = FAISS.from_embeddings(list(zip(texts, vectors)), embeddings, [doc.metadata for doc in documents])
+    dense_retriever = vector_store.as_retriever(search_kwargs={"k": args.k})
+
+    start = time.perf_counter()
+    hybrid_retriever = HybridRetriever(vector_store, embeddings, k=args.k)
+    build_time = time.perf_counter() - start
+    stored = hybrid_retriever.metadata_index.documents
+    print(f"{len(stored)} documents, metadata index and vocabulary built in {build_time:.2f}s")
+
+    queries = make_queries(stored, args.queries)
+    print(f"{len(queries)} segment-targeted queries, k={args.k}, e.g. {queries[0][0]!r}")
+    print(f"{'retriever':<10}{'target hit':>12}{'segment docs':>14}{'context chars':>15}{'ms/query':>10}")
+    for name, retriever in [("dense", dense_retriever), ("hybrid", hybrid_retriever)]:
+        hit_rate, segment_share, characters, ms = evaluate(retriever.get_relevant_documents, queries, stored)
+        print(f"{name:<10}{hit_rate:>12.1%}{segment_share:>14.1%}{characters:>15,.0f}{ms:>10.2f}")
+
+    category_queries = [(query, None) for query in QA_CATEGORIES]
+    print(f"\nQA_CATEGORIES queries ({len(category_queries)}):")
+    for name, retriever in [("dense", dense_retriever), ("hybrid", hybrid_retriever)]:
+        _, segment_share, characters, ms = evaluate(retriever.get_relevant_documents, category_queries, stored)
+        print(f"{name:<10}{'':>12}{segment_share:>14.1%}{characters:>15,.0f}{ms:>10.2f}")
+    print(hybrid_retriever.summary())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Benchmark QA generation throughput with per-call LLM requests against micro-batched engine calls.
+
+Uses StubBatchLLM, which models a local engine that decodes a batch together, or a
+real CPU model through the transformers backend. Run from the project root:
+    python -m benchmarks.bench_llm_backend --batch-size 8
+    python -m benchmarks.bench_llm_backend --transformers HuggingFaceTB/SmolLM2-135M-Instruct --total 8
+"""
+import argparse
+import tempfile
+import time
+from benchmarks.stubs import StubBatchLLM, StubRetriever
+from src.qa.llm_backend import MicroBatchingLLM, TransformersBackend
+from src.qa.pipeline import EcommerceQAPairGenerator
+
+def run(backend, llm, max_in_flight, args):
+    """Run the QA pipeline and return (elapsed seconds, prompts, generated tokens)."""
+    with tempfile.TemporaryDirectory() as output_dir:
+        pipeline = EcommerceQAPairGenerator(
+            vector_store_path=None, llm_model="stub", output_dir=output_dir,
+            num_questions_per_category=args.per_category, max_in_flight=max_in_flight,
+            llm=llm, retriever=StubRetriever(),
+        )
+        prompts = 0
+        invoke = pipeline.llm.invoke
+
+        def counting_invoke(prompt, *a, **k):
+            nonlocal prompts
+            prompts += 1
+            return invoke(prompt, *a, **k)
+
+        pipeline.llm.invoke = counting_invoke
+        tokens_before = backend.generated_tokens
+        start = time.perf_counter()
+        pipeline.run_pipeline(args.categories, args.total)
+        return time.perf_counter() - start, prompts, backend.generated_tokens - tokens_before
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--batch-wait", type=float, default=0.05)
+    parser.add_argument("--transformers", metavar="MODEL", help="Hugging Face model ID to run on CPU instead of the stub")
+    parser.add_argument("--max-new-tokens", type=int, default=128)
+    parser.add_argument("--categories", nargs="+", default=["customer segments", "purchase channels", "discounts", "loyalty"])
+    parser.add_argument("--per-category", type=int, default=10)
+    parser.add_argument("--total", type=int, default=32)
+    args = parser.parse_args()
+
+    if args.transformers:
+        backend = TransformersBackend(args.transformers, max_new_tokens=args.max_new_tokens)
+    else:
+        backend = StubBatchLLM()
+
+    rows = []
+    per_call = run(backend, backend, 1, args)
+    rows.append(("per-call", per_call))
+    batched_llm = MicroBatchingLLM(backend, args.batch_size, args.batch_wait)
+    batched = run(backend, batched_llm, args.batch_size, args)
+    rows.append((f"batched x{args.batch_size}", batched))
+
+    print(f"\n{'path':<14}{'seconds':>10}{'prompts':>10}{'prompts/min':>14}{'tokens/sec':>12}")
+    for name, (elapsed, prompts, tokens) in rows:
+        print(f"{name:<14}{elapsed:>10.2f}{prompts:>10}{prompts / elapsed * 60:>14.1f}{tokens / elapsed:>12.1f}")
+    sizes = batched_llm.batch_sizes
+    print(f"Mean batch size: {sum(sizes) / max(len(sizes), 1):.1f} | Speedup: {per_call[0] / batched[0]:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Benchmark MetadataIndex lookups against the linear metadata scan of find_matching_documents.
+
+Run from the project root:
+    python -m benchmarks.bench_metadata_index --rows 200000
+"""
+import argparse
+import random
+import time
+from config.settings import CSV_PATH
+from benchmarks.bench_row_documents import make_synthetic_frame
+from src.document_creation import create_table_rag_documents_multidim
+from src.metadata_index import MetadataIndex
+from src.verification import find_matching_documents
+
+def sample_criteria(documents, count, seed=0):
+    """Conjunctive criteria of 1-4 metadata items taken from random documents, so each has a match."""
+    rng = random.Random(seed)
+    criteria = []
+    for _ in range(count):
+        metadata = rng.choice(documents).metadata
+        keys = ["doc_type"] + rng.sample(sorted(set(metadata) - {"doc_type"}), rng.randint(0, 3))
+        criteria.append({key: metadata[key] for key in keys})
+    return criteria
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--csv", default=CSV_PATH)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=None, help="Match limit (default: all matches)")
+    args = parser.parse_args()
+
+    documents = create_table_rag_documents_multidim(make_synthetic_frame(args.csv, args.rows))
+    queries = sample_criteria(documents, args.queries)
+    scan_limit = args.limit or len(documents)
+
+    start = time.perf_counter()
+    index = MetadataIndex(documents)
+    build_time = time.perf_counter() - start
+    print(
+        f"Built index over {len(documents)} documents in {build_time:.2f}s: "
+        f"{len(index.postings)} posting lists, {len(index.bitsets)} bitsets"
+    )
+
+    start = time.perf_counter()
+    scanned = [find_matching_documents(documents, criteria, scan_limit) for criteria in queries]
+    scan_time = time.perf_counter() - start
+    print(f"Linear scan: {scan_time / len(queries) * 1000:.2f} ms/query")
+
+    start = time.perf_counter()
+    indexed = [find_matching_documents(documents, criteria, args.limit, index=index) for criteria in queries]
+    index_time = time.perf_counter() - start
+    print(f"MetadataIndex: {index_time / len(queries) * 1000:.3f} ms/query")
+
+    identical = all(list(map(id, a)) == list(map(id, b)) for a, b in zip(scanned, indexed))
+    print(
+        f"Speedup: {scan_time / index_time:.0f}x | Break-even after {build_time / (scan_time / len(queries)):.0f} "
+        f"queries | Identical matches: {identical}"
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Benchmark concurrent QA pair generation against one-at-a-time processing with a stub LLM.
+
+Run from the project root:
+    python -m benchmarks.bench_qa_pipeline --latency 0.2 --max-in-flight 8
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from benchmarks.stubs import StubLLM, StubRetriever
+from src.qa.pipeline import EcommerceQAPairGenerator
+
+def run(output_dir, llm, max_in_flight, args):
+    """Run the pipeline and return (elapsed seconds, saved QA pairs in numbering order)."""
+    pipeline = EcommerceQAPairGenerator(
+        vector_store_path=None, llm_model="stub", output_dir=output_dir,
+        num_questions_per_category=args.per_category, max_in_flight=max_in_flight,
+        latency_tolerance=args.latency_tolerance, llm=llm, retriever=StubRetriever(),
+    )
+    start = time.perf_counter()
+    pipeline.run_pipeline(args.categories, args.total)
+    elapsed = time.perf_counter() - start
+    with open(os.path.join(output_dir, "qa_pairs_detailed.json")) as f:
+        return elapsed, json.load(f)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds per LLM call")
+    parser.add_argument("--parallel-slots", type=int, default=None, help="Concurrent requests the stub server handles")
+    parser.add_argument("--max-in-flight", type=int, default=8)
+    parser.add_argument("--latency-tolerance", type=float, default=None)
+    parser.add_argument("--categories", nargs="+", default=["customer segments", "purchase channels", "discounts", "loyalty"])
+    parser.add_argument("--per-category", type=int, default=10)
+    parser.add_argument("--total", type=int, default=30)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as sequential_dir, tempfile.TemporaryDirectory() as concurrent_dir:
+        sequential_llm = StubLLM(args.latency, args.parallel_slots)
+        sequential_time, sequential = run(sequential_dir, sequential_llm, 1, args)
+        concurrent_llm = StubLLM(args.latency, args.parallel_slots)
+        concurrent_time, concurrent = run(concurrent_dir, concurrent_llm, args.max_in_flight, args)
+
+    print(f"\nSequential: {sequential_time:.2f}s, {sequential_llm.calls} LLM calls, {len(sequential)} QA pairs")
+    print(
+        f"Concurrent ({args.max_in_flight} in flight): {concurrent_time:.2f}s, {concurrent_llm.calls} LLM calls, "
+        f"peak {concurrent_llm.max_concurrent} concurrent, {len(concurrent)} QA pairs"
+    )
+    print(f"Speedup: {sequential_time / concurrent_time:.1f}x | Identical numbered output: {sequential == concurrent}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""Benchmark the QA response parsers against the previous line-by-line parsers on a corpus from qa_outputs/.
+
+The corpus holds formatted QA completions rebuilt from qa_outputs/qa_pair_*.json
+(plain and markdown markers, with and without a preamble), completions whose answer
+lost its <<...>> annotations (the repair path, including one long answer with many
+calculations) and numbered question lists. Run from the project root:
+    python -m benchmarks.bench_response_parsing --repeat 20
+"""
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import re
+import time
+from config.settings import QA_OUTPUT_DIR
+from src.qa.qa_formatter import parse_formatted_qa
+from src.qa.response_parsing import parse_numbered_questions
+
+ANNOTATION_PATTERN = re.compile(r"<<[^<>]*>>")
+
+def comparable(qa_pair):
+    """A parsed QA pair without case, markdown emphasis and whitespace differences."""
+    return {key: " ".join(value.replace("*", "").lower().split()) for key, value in qa_pair.items()}
+
+def legacy_parse_formatted_qa(response, question, answer):
+    """Reference path: the previous lowercasing, line-by-line parser with its find() repair loop."""
+    formatted_qa = {"question": "", "answer": ""}
+    lines = response.lower().split('\n')
+    question_index = -1
+    answer_index = -1
+    for i, line in enumerate(lines):
+        if "question:" in line:
+            question_index = i
+        if "answer:" in line and i > question_index:
+            answer_index = i
+            break
+    if question_index != -1 and answer_index != -1:
+        question_text = lines[question_index].split("question:", 1)[1].strip()
+        if question_index + 1 < answer_index:
+            for j in range(question_index + 1, answer_index):
+                question_text += " " + lines[j].strip()
+        answer_lines = []
+        answer_start = lines[answer_index].split("answer:", 1)[1].strip()
+        if answer_start:
+            answer_lines.append(answer_start)
+        for j in range(answer_index + 1, len(lines)):
+            answer_lines.append(lines[j].strip())
+        formatted_qa["question"] = question_text
+        formatted_qa["answer"] = "\n".join(answer_lines)
+    else:
+        parts = response.split("question:", 1)
+        if len(parts) > 1:
+            qa_parts = parts[1].strip().split("answer:", 1)
+            if len(qa_parts) > 1:
+                formatted_qa["question"] = qa_parts[0].strip()
+                formatted_qa["answer"] = qa_parts[1].strip()
+    if not formatted_qa["question"] or not formatted_qa["answer"]:
+        formatted_qa["question"] = question
+        formatted_qa["answer"] = "The answer is #### 100"
+    if "<<" not in formatted_qa["answer"] or ">>" not in formatted_qa["answer"]:
+        calculations = re.findall(r'(\d+\.?\d*)\s*[+\-*/]\s*(\d+\.?\d*)\s*=\s*(\d+\.?\d*)', answer)
+        if calculations:
+            fixed_answer_lines = []
+            for op1, op2, result in calculations:
+                operation = "+" if "+" in answer[answer.find(op1):answer.find(result)] else \
+                           "-" if "-" in answer[answer.find(op1):answer.find(result)] else \
+                           "*" if "*" in answer[answer.find(op1):answer.find(result)] else "/"
+                step_description = "Calculation"
+                if "total" in answer.lower():
+                    step_description = "Total"
+                elif "average" in answer.lower():
+                    step_description = "Average"
+                elif "percentage" in answer.lower():
+                    step_description = "Percentage"
+                fixed_answer_lines.append(f"{step_description} = {op1} {operation} {op2} = <<{op1}{operation}{op2}={result}>>{result}")
+            fixed_answer_lines.append(f"#### {calculations[-1][2]}")
+            formatted_qa["answer"] = "\n".join(fixed_answer_lines)
+    if "####" not in formatted_qa["answer"]:
+        final_numbers = re.findall(r'(\d+\.?\d*)', formatted_qa["answer"])
+        formatted_qa["answer"] += f"\n#### {final_numbers[-1] if final_numbers else '100'}"
+    return formatted_qa
+
+def legacy_parse_questions(response):
+    """Reference path: the previous line-by-line question list parser."""
+    questions = []
+    for line in response.split('\n'):
+        line = line.strip()
+        if line and (line.startswith('Q') or line.startswith('Question') or (line[0].isdigit() and '.' in line[:3])):
+            clean_question = line
+            if line[0].isdigit() and '.' in line[:3]:
+                clean_question = line.split('.', 1)[1].strip()
+            elif line.startswith('Question'):
+                parts = line.split(':', 1)
+                if len(parts) > 1:
+                    clean_question = parts[1].strip()
+            questions.append(clean_question)
+    if not questions:
+        questions = [line.strip() for line in response.split('\n') if '?' in line]
+    return questions
+
+def build_corpus(output_dir):
+    """(formatted QA cases as (response, question, answer), question list responses) from qa_pair_*.json."""
+    pairs = []
+    for path in sorted(glob.glob(os.path.join(output_dir, "qa_pair_*.json"))):
+        with open(path) as f:
+            pairs.append(json.load(f))
+    formatted = []
+    for pair in pairs:
+        question, answer = pair["formatted_question"].strip("* \n"), pair["formatted_answer"]
+        original_question, original_answer = pair["original_question"], pair["original_answer"]
+        formatted.append((f"question: {question}\n\nanswer: {answer}", original_question, original_answer))
+        formatted.append((f"Here is the formatted QA pair:\n\n**Question:** {question}\n\n**Answer:**\n{answer}",
+                          original_question, original_answer))
+        formatted.append((f"question: {question}\n\nanswer: {ANNOTATION_PATTERN.sub('', answer)}",
+                          original_question, original_answer))
+    long_answer = "\n".join(pair["original_answer"] for pair in pairs)
+    formatted.append(("question: Summarize the store's metrics?\n\nanswer: See the steps above.", "", long_answer))
+
+    questions = [pair["original_question"] for pair in pairs if pair["original_question"]]
+    question_lists = [
+        "\n".join(f"{i + 1}. {q}" for i, q in enumerate(questions)),
+        "Here are the questions:\n\n" + "\n\n".join(f"Question {i + 1}: {q}" for i, q in enumerate(questions)),
+        "\n".join(questions),
+    ]
+    return formatted, question_lists
+
+def timed(function, cases, repeat):
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            results = [function(*case) for case in cases]
+        return (time.perf_counter() - start) / repeat, results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output-dir", default=QA_OUTPUT_DIR)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    formatted, question_lists = build_corpus(args.output_dir)
+    calculations = len(re.findall(r"=", formatted[-1][2]))
+    print(f"Corpus: {len(formatted)} formatted QA completions (the longest answer has {calculations} '=' signs), "
+          f"{len(question_lists)} question lists")
+
+    legacy_time, legacy = timed(legacy_parse_formatted_qa, formatted, args.repeat)
+    new_time, new = timed(parse_formatted_qa, formatted, args.repeat)
+    same = sum(comparable(old) == comparable(parsed) for old, parsed in zip(legacy, new))
+    cased = sum(parsed["question"] != parsed["question"].lower() for parsed in new)
+    print(f"Formatted QA: legacy {legacy_time * 1000:.2f} ms, single-pass {new_time * 1000:.2f} ms "
+          f"({legacy_time / new_time:.1f}x) | same result up to case and markdown: {same}/{len(formatted)} | "
+          f"questions with their case kept: {cased}")
+    long_case = formatted[-1:]
+    legacy_time, _ = timed(legacy_parse_formatted_qa, long_case, args.repeat)
+    new_time, _ = timed(parse_formatted_qa, long_case, args.repeat)
+    print(f"Long answer repair: legacy {legacy_time * 1000:.2f} ms, single-pass {new_time * 1000:.2f} ms "
+          f"({legacy_time / new_time:.1f}x)")
+
+    cases = [(response,) for response in question_lists]
+    legacy_time, legacy = timed(legacy_parse_questions, cases, args.repeat * 10)
+    new_time, new = timed(parse_numbered_questions, cases, args.repeat * 10)
+    same = sum(old == parsed for old, parsed in zip(legacy, new))
+    print(f"Question lists: legacy {legacy_time * 1e6:.0f} us, single-pass {new_time * 1e6:.0f} us "
+          f"({legacy_time / new_time:.1f}x) | same questions: {same}/{len(cases)} "
+          f"({', '.join(str(len(questions)) for questions in new)} questions)")
+
+if __name__ == "__main__":
+    main()
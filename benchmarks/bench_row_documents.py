@@ -0,0 +1,48 @@
+"""Benchmark the columnar row-document builder against the per-row iterrows path.
+
+Run from the project root:
+    python -m benchmarks.bench_row_documents --rows 1000000
+"""
+import argparse
+import time
+import pandas as pd
+from config.settings import CSV_PATH
+from src.data_preprocessing import preprocess_csv
+from src.document_creation import create_row_document, create_row_documents
+
+def make_synthetic_frame(csv_path, rows, seed=0):
+    """Build a synthetic frame of `rows` customers by resampling the source CSV."""
+    source = preprocess_csv(pd.read_csv(csv_path, low_memory=False))
+    return source.sample(n=rows, replace=True, random_state=seed).reset_index(drop=True)
+
+def iterrows_documents(df):
+    """Reference path: one create_row_document call per df.iterrows() row."""
+    return [create_row_document(idx, row, df.columns) for idx, row in df.iterrows()]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--csv", default=CSV_PATH)
+    args = parser.parse_args()
+
+    df = make_synthetic_frame(args.csv, args.rows)
+    print(f"Synthetic frame: {len(df)} rows x {len(df.columns)} columns")
+
+    start = time.perf_counter()
+    columnar = create_row_documents(df)
+    columnar_time = time.perf_counter() - start
+    print(f"Columnar builder: {columnar_time:.2f}s ({len(df) / columnar_time:,.0f} rows/sec)")
+
+    start = time.perf_counter()
+    reference = iterrows_documents(df)
+    reference_time = time.perf_counter() - start
+    print(f"iterrows builder: {reference_time:.2f}s ({len(df) / reference_time:,.0f} rows/sec)")
+
+    identical = all(
+        a.page_content == b.page_content and list(a.metadata.items()) == list(b.metadata.items())
+        for a, b in zip(columnar, reference)
+    ) and len(columnar) == len(reference)
+    print(f"Speedup: {reference_time / columnar_time:.1f}x | Identical output: {identical}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Benchmark SegmentCube segment queries against filtering and aggregating the DataFrame per query.
+
+Builds the cube over a synthetic frame in chunks, then answers random 1-, 2- and
+3-dimension segment queries (the "unmarried electronics online" kind) with a
+pandas boolean filter and aggregation per query, with the first cube lookup of
+each dimension combination (which rolls up its cuboid) and with memoized
+lookups. Checks the cube's counts and sums against pandas and that the segment
+documents rendered from the cube match those of create_table_rag_documents_multidim
+(up to which of several values with tied percentages is listed first).
+The resampled frame repeats source rows, which keeps the base cells at the
+number of source rows; --independent shuffles each column on its own so that
+rows rarely repeat, and --dims picks fewer cube dimensions to bound the cells.
+Run from the project root:
+    python -m benchmarks.bench_segment_cube --rows 200000
+    python -m benchmarks.bench_segment_cube --independent --chunk-size 5000
+"""
+import argparse
+import contextlib
+import io
+import random
+import re
+import time
+import numpy as np
+import pandas as pd
+from config.settings import CSV_PATH
+from benchmarks.bench_row_documents import make_synthetic_frame
+from src.document_creation import create_table_rag_documents_multidim, render_cube_segment_document
+from src.segment_aggregation import dimension_values
+from src.segment_cube import SegmentCube
+
+def make_queries(cube, frame, count, seed=0):
+    """Random {dimension: value} criteria of 1 to 3 dimensions, with non-missing values taken from customer rows."""
+    rng = random.Random(seed)
+    columns = {dim: dimension_values(frame, dim).to_numpy() for dim in cube.dims}
+    queries = []
+    for _ in range(count):
+        row = rng.randrange(len(frame))
+        present = [dim for dim in cube.dims if not pd.isna(columns[dim][row])]
+        dims = rng.sample(present, min(rng.randint(1, 3), len(present)))
+        queries.append({dim: columns[dim][row] for dim in dims})
+    return queries, columns
+
+def pandas_segment(frame, columns, criteria):
+    """(count, purchase amount sum) of a segment by filtering the DataFrame."""
+    mask = np.ones(len(frame), dtype=bool)
+    for dim, value in criteria.items():
+        mask &= columns[dim] == value
+    segment = frame.loc[mask, "Purchase_Amount"]
+    return len(segment), float(segment.sum())
+
+def criteria_of(metadata, cube):
+    """Cube criteria of a stored segment document, or None for other documents and those over other dimensions."""
+    if metadata["doc_type"] == "segment_statistics":
+        pairs = [(metadata["dimension"], metadata["segment_value"])]
+    elif metadata["doc_type"] == "multi_segment_statistics":
+        pairs = [(metadata["dimension1"], metadata["value1"]), (metadata["dimension2"], metadata["value2"])]
+    else:
+        return None
+    if any(dim not in cube.dims for dim, _ in pairs):
+        return None
+    return {dim: next(v for v in cube.values[dim] if str(v) == value) for dim, value in pairs}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--csv", default=CSV_PATH)
+    parser.add_argument("--chunk-size", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--document-rows", type=int, default=5_000)
+    parser.add_argument("--independent", action="store_true", help="Shuffle each column independently")
+    parser.add_argument("--dims", nargs="+", help="Cube dimensions (default: CUBE_DIMENSIONS)")
+    args = parser.parse_args()
+
+    frame = make_synthetic_frame(args.csv, args.rows)
+    if args.independent:
+        rng = np.random.default_rng(0)
+        for col in frame.columns:
+            frame[col] = frame[col].to_numpy()[rng.permutation(len(frame))]
+    start = time.perf_counter()
+    cube = SegmentCube(args.dims)
+    for begin in range(0, len(frame), args.chunk_size):
+        cube.add(frame.iloc[begin:begin + args.chunk_size])
+    build_time = time.perf_counter() - start
+    bound = np.prod([float(len(cube.values[dim])) for dim in cube.dims])
+    print(f"{len(frame):,} rows, {len(cube.dims)} dimensions: {len(cube.cells['count']):,} base cells "
+          f"(at most {bound:,.0f} value combinations), {cube.memory_bytes() / 1e6:.1f} MB, "
+          f"built in {build_time:.2f}s ({args.chunk_size:,}-row chunks)")
+
+    queries, columns = make_queries(cube, frame, args.queries)
+    start = time.perf_counter()
+    expected = [pandas_segment(frame, columns, criteria) for criteria in queries]
+    pandas_time = time.perf_counter() - start
+
+    first_times, cached_times, mismatches = [], [], 0
+    for criteria, (count, amount) in zip(queries, expected):
+        start = time.perf_counter()
+        segment = cube.segment(criteria)
+        first_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        cube.segment(criteria)
+        cached_times.append(time.perf_counter() - start)
+        if segment is None or segment["count"] != count or not np.isclose(segment["Purchase_Amount_sum"], amount):
+            mismatches += 1
+    print(f"{len(queries)} segment queries of 1-3 dimensions, {len(cube._cuboids)} cuboids rolled up")
+    print(f"{'method':<16}{'us/query':>10}")
+    print(f"{'pandas filter':<16}{pandas_time / len(queries) * 1e6:>10.0f}")
+    print(f"{'cube (first)':<16}{np.mean(first_times) * 1e6:>10.0f}")
+    print(f"{'cube (cached)':<16}{np.mean(cached_times) * 1e6:>10.1f}")
+    print(f"Mismatched counts/sums: {mismatches}")
+
+    sample = frame.iloc[:args.document_rows]
+    with contextlib.redirect_stdout(io.StringIO()):
+        documents = create_table_rag_documents_multidim(sample)
+    sample_cube = SegmentCube(args.dims)
+    sample_cube.add(sample)
+    # Values with tied percentages may be listed in another order, so a top-N list may keep another of them
+    unordered = lambda text: [re.sub(r"^- .*?: ", "- ", line) for line in text.split("\n")]
+    compared = identical = same_lines = 0
+    for doc in documents:
+        criteria = criteria_of(doc.metadata, sample_cube)
+        if criteria is None:
+            continue
+        rendered = render_cube_segment_document(sample_cube, criteria)
+        compared += 1
+        identical += rendered.page_content == doc.page_content and rendered.metadata == doc.metadata
+        same_lines += unordered(rendered.page_content) == unordered(doc.page_content)
+    print(f"Segment documents from the cube ({args.document_rows:,} rows): {identical}/{compared} identical, "
+          f"{same_lines}/{compared} identical up to tie order")
+
+    example = {"Marital_Status": "Single", "Purchase_Channel": "Online", "Purchase_Category": "Electronics"}
+    if all(dim in cube.dims for dim in example):
+        print()
+        print(render_cube_segment_document(cube, example).page_content)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Benchmark completion tokens per QA pair with and without streaming.
+
+Runs the two-call QA pipeline (answer, then format) with streaming=False and
+streaming=True. Tokens are the backend's own counts: for Ollama the
+prompt_eval_count / eval_count it reports, for StubChattyLLM words produced,
+where a closed stream stops counting. The stub's formatted pairs go on after
+the #### line and some of its completions run away, which is the waste
+streaming cuts: it stops after the #### line and aborts runaway completions
+(reported as aborts). Run from the project root:
+    python -m benchmarks.bench_streaming
+    python -m benchmarks.bench_streaming --ollama llama3 --total 4
+"""
+import argparse
+import contextlib
+import io
+import tempfile
+import time
+from langchain.schema import Document
+from benchmarks.bench_fused_generation import CONTEXT_DOCUMENT
+from benchmarks.stubs import StubChattyLLM, StubRetriever
+from src.qa.llm_backend import OllamaBackend
+from src.qa.pipeline import EcommerceQAPairGenerator
+
+def run(backend, streaming, args):
+    """Run the QA pipeline; return (pairs, seconds, LLM calls, aborts, prompt tokens, completion tokens)."""
+    retriever = StubRetriever([Document(page_content=CONTEXT_DOCUMENT)] * args.context_docs)
+    with tempfile.TemporaryDirectory() as output_dir:
+        pipeline = EcommerceQAPairGenerator(
+            vector_store_path=None, llm_model="stub", output_dir=output_dir,
+            num_questions_per_category=args.per_category, max_in_flight=1,
+            llm=backend, retriever=retriever, streaming=streaming,
+        )
+        calls = 0
+        invoke, stream = pipeline.llm.invoke, pipeline.llm.stream
+
+        def counting_invoke(prompt, *a, **k):
+            nonlocal calls
+            calls += 1
+            return invoke(prompt, *a, **k)
+
+        def counting_stream(prompt, *a, **k):
+            nonlocal calls
+            calls += 1
+            return stream(prompt, *a, **k)
+
+        pipeline.llm.invoke, pipeline.llm.stream = counting_invoke, counting_stream
+        prompt_before, generated_before = backend.prompt_tokens, backend.generated_tokens
+        log = io.StringIO()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(log):
+            pairs = pipeline.run_pipeline(args.categories, args.total)
+        elapsed = time.perf_counter() - start
+        aborts = log.getvalue().count("Stopped generation after")
+        return (len(pairs), elapsed, calls, aborts, backend.prompt_tokens - prompt_before,
+                backend.generated_tokens - generated_before)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ollama", metavar="MODEL", help="Ollama model to use instead of the stub")
+    parser.add_argument("--context-docs", type=int, default=4, help="Retrieved documents per question")
+    parser.add_argument("--categories", nargs="+", default=["customer segments", "purchase channels"])
+    parser.add_argument("--per-category", type=int, default=10)
+    parser.add_argument("--total", type=int, default=20)
+    parser.add_argument("--runaway-rate", type=float, default=0.2, help="Stub completions that run away")
+    args = parser.parse_args()
+
+    def backend():
+        # A fresh stub per mode, so both runs see the same responses
+        if args.ollama:
+            return OllamaBackend(args.ollama)
+        return StubChattyLLM(runaway_rate=args.runaway_rate, call_latency=0.0, token_latency=0.0)
+
+    rows = [("invoke", run(backend(), False, args)), ("streaming", run(backend(), True, args))]
+
+    print(f"{'mode':<11}{'pairs':>7}{'calls':>7}{'aborts':>8}{'prompt tok/pair':>17}"
+          f"{'completion tok/pair':>21}{'sec/pair':>10}")
+    completion = {}
+    for name, (pairs, elapsed, calls, aborts, prompt_tokens, generated_tokens) in rows:
+        completion[name] = generated_tokens / max(pairs, 1)
+        print(f"{name:<11}{pairs:>7}{calls:>7}{aborts:>8}{prompt_tokens / max(pairs, 1):>17.0f}"
+              f"{completion[name]:>21.0f}{elapsed / max(pairs, 1):>10.3f}")
+    print(f"Streaming completion tokens per pair: {completion['streaming'] - completion['invoke']:+.0f} "
+          f"({1 - completion['streaming'] / max(completion['invoke'], 1):.0%} fewer)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Benchmark template QA synthesis from segment statistics: throughput, validity and arithmetic.
+
+Run from the project root:
+    python -m benchmarks.bench_template_qa --rows 100000
+"""
+import argparse
+import contextlib
+import io
+import re
+import time
+from fractions import Fraction
+from config.settings import CSV_PATH
+from benchmarks.bench_row_documents import make_synthetic_frame
+from src.segment_aggregation import aggregate_chunks
+from src.qa.template_generator import synthesize_qa_pairs
+from src.qa.qa_formatter import validate_single_qa_pair
+
+# Largest difference from the exact value allowed by the rounding stated in the questions
+ROUNDING_TOLERANCE = Fraction(1, 20)
+
+def step_error(expression, result):
+    """Absolute difference between a left-to-right evaluated "<<expression=result>>" and its result."""
+    tokens = re.findall(r"\d+(?:\.\d+)?|[-+*/]", expression)
+    value = Fraction(tokens[0])
+    for op, operand in zip(tokens[1::2], tokens[2::2]):
+        operand = Fraction(operand)
+        if op == "+":
+            value += operand
+        elif op == "-":
+            value -= operand
+        elif op == "*":
+            value *= operand
+        else:
+            value /= operand
+    return abs(value - Fraction(result))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--csv", default=CSV_PATH)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    df = make_synthetic_frame(args.csv, args.rows)
+    start = time.perf_counter()
+    single_aggregates, multi_aggregates, total_count = aggregate_chunks([df])
+    print(f"Aggregated {total_count} rows in {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        pairs = synthesize_qa_pairs(single_aggregates, multi_aggregates, total_count)
+    elapsed = (time.perf_counter() - start) / args.repeat
+    print(f"Synthesized {len(pairs)} QA pairs in {elapsed * 1000:.1f} ms ({len(pairs) / elapsed:,.0f} pairs/s)")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        valid = sum(validate_single_qa_pair(pair) for pair in pairs)
+    steps = [step for pair in pairs for step in re.findall(r"<<([^=]+)=([^>]+)>>", pair["answer"])]
+    wrong = sum(step_error(expression, result) > ROUNDING_TOLERANCE for expression, result in steps)
+    print(f"Valid: {valid}/{len(pairs)} | Calculation steps: {len(steps)}, wrong: {wrong}")
+
+if __name__ == "__main__":
+    main()
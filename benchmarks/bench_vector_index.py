@@ -0,0 +1,67 @@
+"""Benchmark FAISS index types against the exact flat index on generated table-RAG documents.
+
+Reports build time, serialized index size, per-query latency and recall@k
+relative to flat search. Run from the project root:
+    python -m benchmarks.bench_vector_index --rows 50000
+    python -m benchmarks.bench_vector_index --rows 5000 --ollama   # real embeddings
+"""
+import argparse
+import time
+import numpy as np
+from config.settings import CSV_PATH, EMBEDDING_MODEL, VECTOR_INDEX_PARAMS
+from benchmarks.bench_row_documents import make_synthetic_frame
+from benchmarks.stubs import StubEmbeddings
+from src.document_creation import create_table_rag_documents_multidim
+from src.vector_index import INDEX_DEFAULTS, create_index, index_memory_bytes
+from src.vector_store import embed_texts
+
+def recall_at_k(found, expected):
+    """Mean fraction of the exact top-k neighbours present in the approximate top-k."""
+    return np.mean([len(set(f) & set(e)) / len(e) for f, e in zip(found, expected)])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--csv", default=CSV_PATH)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--noise", type=float, default=0.5, help="Query perturbation relative to the document vector")
+    parser.add_argument("--only", nargs="+", choices=list(INDEX_DEFAULTS), help="Index types to compare with flat")
+    parser.add_argument("--ollama", action="store_true", help=f"Embed with Ollama {EMBEDDING_MODEL} instead of the stub")
+    args = parser.parse_args()
+
+    documents = create_table_rag_documents_multidim(make_synthetic_frame(args.csv, args.rows))
+    texts = [doc.page_content for doc in documents]
+    if args.ollama:
+        from langchain_ollama import OllamaEmbeddings
+        embeddings = OllamaEmbeddings(model=EMBEDDING_MODEL)
+    else:
+        embeddings = StubEmbeddings(bag_of_words=True)
+    vectors = np.asarray(embed_texts(texts, embeddings), dtype=np.float32)
+
+    # Queries are perturbed document vectors, so each has a meaningful neighbourhood
+    rng = np.random.default_rng(0)
+    queries = vectors[rng.choice(len(vectors), args.queries, replace=False)]
+    queries = queries + args.noise * rng.standard_normal(queries.shape).astype(np.float32) / np.sqrt(vectors.shape[1])
+    print(f"{len(vectors)} vectors of dimension {vectors.shape[1]}, {args.queries} queries, k={args.k}")
+
+    expected = None
+    print(f"{'index':<10}{'build s':>10}{'size MB':>10}{'query ms':>10}{f'recall@{args.k}':>12}")
+    for index_type in ["flat"] + [t for t in INDEX_DEFAULTS if t != "flat" and (not args.only or t in args.only)]:
+        start = time.perf_counter()
+        index = create_index(vectors, index_type, VECTOR_INDEX_PARAMS)
+        index.add(vectors)
+        build_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        found = [index.search(query[None, :], args.k)[1][0] for query in queries]
+        query_ms = (time.perf_counter() - start) / len(queries) * 1000
+        if expected is None:
+            expected = found
+        print(
+            f"{index_type:<10}{build_time:>10.2f}{index_memory_bytes(index) / 1e6:>10.1f}"
+            f"{query_ms:>10.3f}{recall_at_k(found, expected):>12.3f}"
+        )
+
+if __name__ == "__main__":
+    main()
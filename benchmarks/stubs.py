@@ -0,0 +1,267 @@
+"""Deterministic local stand-ins for the Ollama models, for benchmarks and offline runs."""
+import hashlib
+import json
+import re
+import threading
+import time
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+class StubEmbeddings(Embeddings):
+    """
+    Deterministic embedder: each text maps to a fixed unit vector derived from its hash.
+
+    Args:
+        dim: Embedding dimension.
+        latency: Seconds slept per embed_documents call, simulating a round-trip.
+        per_text_latency: Additional seconds slept per text in the call.
+        failure_rate: Fraction of calls that raise, for exercising retries.
+        seed: Seed for the failure injection.
+        bag_of_words: Embed a text as the normalized sum of its tokens' vectors, so texts
+            sharing words are close (as with a real model) instead of all near-orthogonal.
+    """
+
+    def __init__(self, dim=768, latency=0.0, per_text_latency=0.0, failure_rate=0.0, seed=0, bag_of_words=False):
+        self.dim = dim
+        self.bag_of_words = bag_of_words
+        self._token_vectors = {}
+        self.latency = latency
+        self.per_text_latency = per_text_latency
+        self.failure_rate = failure_rate
+        self.calls = 0
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self._lock:
+            self.calls += 1
+            fail = self._rng.random() < self.failure_rate
+        time.sleep(self.latency + self.per_text_latency * len(texts))
+        if fail:
+            raise ConnectionError("stub embedding server error")
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+    def _vector(self, text):
+        if self.bag_of_words:
+            vector = np.sum([self._token_vector(token) for token in text.lower().split()] or [np.zeros(self.dim)], axis=0)
+            return (vector / max(np.linalg.norm(vector), 1e-12)).astype(np.float32).tolist()
+        return self._hash_vector(text).tolist()
+
+    def _token_vector(self, token):
+        vector = self._token_vectors.get(token)
+        if vector is None:
+            vector = self._token_vectors[token] = self._hash_vector(token)
+        return vector
+
+    def _hash_vector(self, text):
+        seed = int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+        return vector / np.linalg.norm(vector)
+
+class StubLLM:
+    """
+    Deterministic stand-in for OllamaLLM that answers the QA pipeline's three prompts.
+
+    Question-generation prompts get numbered word problems, answering prompts a
+    worked solution, formatting prompts a GSM8K-style pair and single-call prompts
+    the same pair as JSON, all derived from a hash of the prompt so repeated runs
+    produce identical output.
+
+    Args:
+        latency: Seconds each invoke() call takes once a server slot is free.
+        parallel_slots: Requests the simulated server handles at once; further
+            requests queue, as with a local model server. None means unlimited.
+        failure_rate: Fraction of calls that raise, for exercising rate limiting.
+        seed: Seed for the failure injection.
+    """
+
+    def __init__(self, latency=0.2, parallel_slots=None, failure_rate=0.0, seed=0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.calls = 0
+        self.max_concurrent = 0
+        self._active = 0
+        self._slots = threading.Semaphore(parallel_slots) if parallel_slots else None
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+
+    def invoke(self, prompt, *args, **kwargs):
+        with self._lock:
+            self.calls += 1
+            self._active += 1
+            self.max_concurrent = max(self.max_concurrent, self._active)
+            fail = self._rng.random() < self.failure_rate
+        try:
+            if self._slots is not None:
+                with self._slots:
+                    time.sleep(self.latency)
+            else:
+                time.sleep(self.latency)
+            if fail:
+                raise ConnectionError("stub LLM server error")
+            return self._respond(prompt)
+        finally:
+            with self._lock:
+                self._active -= 1
+
+    def stream(self, prompt, *args, **kwargs):
+        """Yield the invoke() response word by word."""
+        for chunk in re.findall(r"\S+\s*", self.invoke(prompt)):
+            yield chunk
+
+    def _respond(self, prompt):
+        seed = int.from_bytes(hashlib.blake2b(prompt.encode(), digest_size=8).digest(), "little")
+        rng = np.random.default_rng(seed)
+        if "YOUR FORMATTED QA PAIR" in prompt:
+            question = prompt.split("ORIGINAL QUESTION:", 1)[1].split("ORIGINAL ANSWER:", 1)[0].strip()
+            return f"question: {question}\n\nanswer: {_formatted_answer(question)}"
+        if "Respond with a JSON object" in prompt:
+            question = prompt.split("QUESTION:", 1)[1].split("Use the following", 1)[0].strip()
+            return json.dumps({"question": question, "answer": _formatted_answer(question)})
+        if "YOUR STEP-BY-STEP SOLUTION" in prompt:
+            question = prompt.split("QUESTION:", 1)[1].split("Use the following", 1)[0].strip()
+            customers, members = _numbers(question)
+            share = round(members / customers * 100, 2)
+            return f"Share of members = {members} / {customers} * 100 = {share}\nThe answer is {share}%."
+        count = int(prompt.split("create ", 1)[1].split(" ", 1)[0])
+        lines = []
+        for i in range(count):
+            customers = int(rng.integers(200, 2000))
+            members = int(rng.integers(10, customers))
+            lines.append(
+                f"{i + 1}. An online store served {customers} customers last quarter and {members} of them "
+                f"joined the loyalty program. What percentage of customers joined the loyalty program?"
+            )
+        return "\n".join(lines)
+
+class StubBatchLLM(StubLLM):
+    """
+    StubLLM with the cost model of a local engine that decodes a batch of prompts together.
+
+    A call costs `call_latency`, plus `prompt_token_latency` per prompt token in
+    the batch, plus one `token_latency` per decoding step, where the number of
+    steps is the longest response in the batch and each extra sequence adds
+    `batch_overhead` to the step time. Tokens are counted as words.
+
+    Args:
+        call_latency: Fixed seconds per engine call (request overhead).
+        token_latency: Seconds per decoding step for a single sequence.
+        batch_overhead: Relative step-time increase per additional sequence in a batch.
+        prompt_token_latency: Seconds per prompt token (prompt processing).
+    """
+
+    def __init__(self, call_latency=0.05, token_latency=0.002, batch_overhead=0.1, prompt_token_latency=0.0):
+        super().__init__(latency=0.0)
+        self.call_latency = call_latency
+        self.token_latency = token_latency
+        self.batch_overhead = batch_overhead
+        self.prompt_token_latency = prompt_token_latency
+        self.model = "stub"
+        self.params = {}
+        self.prompt_tokens = 0
+        self.generated_tokens = 0
+
+    def invoke(self, prompt, *args, **kwargs):
+        return self.batch([prompt])[0]
+
+    def batch(self, prompts):
+        responses = [self._respond(prompt) for prompt in prompts]
+        prompt_tokens = sum(len(prompt.split()) for prompt in prompts)
+        tokens = [len(response.split()) for response in responses]
+        step_latency = self.token_latency * (1 + self.batch_overhead * (len(prompts) - 1))
+        time.sleep(self.call_latency + prompt_tokens * self.prompt_token_latency + max(tokens) * step_latency)
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += prompt_tokens
+            self.generated_tokens += sum(tokens)
+        return responses
+
+class StubChattyLLM(StubBatchLLM):
+    """
+    StubBatchLLM whose completions carry the waste that streaming is meant to cut.
+
+    Formatted pairs continue with chat-style commentary after the #### line, and
+    a `runaway_rate` fraction of answers (and of formatted pairs) is prose
+    without calculations that goes on for `runaway_words` words. A formatting
+    prompt whose original answer has no calculation runs away as well. Which
+    completions run away depends on a hash of the prompt and how often it was
+    seen, so a streaming and a non-streaming run get the same responses.
+    stream() yields one word per chunk and, like a server that stops decoding
+    when the connection closes, counts only the tokens it has produced.
+
+    Args:
+        trailing_words: Words of commentary after the #### line.
+        runaway_rate: Fraction of answering and formatting completions that run away.
+        runaway_words: Length of a runaway completion.
+        **kwargs: StubBatchLLM cost model.
+    """
+
+    def __init__(self, trailing_words=60, runaway_rate=0.2, runaway_words=600, **kwargs):
+        super().__init__(**kwargs)
+        self.trailing_words = trailing_words
+        self.runaway_rate = runaway_rate
+        self.runaway_words = runaway_words
+        self._seen = {}
+
+    def stream(self, prompt, *args, **kwargs):
+        response = self._respond(prompt)
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += len(prompt.split())
+        time.sleep(self.call_latency + len(prompt.split()) * self.prompt_token_latency)
+        for chunk in re.findall(r"\S+\s*", response):
+            time.sleep(self.token_latency)
+            with self._lock:
+                self.generated_tokens += 1
+            yield chunk
+
+    def _respond(self, prompt):
+        response = super()._respond(prompt)
+        with self._lock:
+            occurrence = self._seen.get(prompt, 0)
+            self._seen[prompt] = occurrence + 1
+        key = f"{occurrence}:{prompt}".encode()
+        rng = np.random.default_rng(int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little"))
+        runaway = rng.random() < self.runaway_rate
+        if "YOUR FORMATTED QA PAIR" in prompt:
+            original_answer = prompt.split("ORIGINAL ANSWER:", 1)[1]
+            if runaway or "=" not in original_answer:
+                question = response.split("\n\nanswer:", 1)[0]
+                return f"{question}\n\nanswer: {_prose(rng, self.runaway_words)}"
+            return f"{response}\n\n{_prose(rng, self.trailing_words)}"
+        if "YOUR STEP-BY-STEP SOLUTION" in prompt and runaway:
+            return _prose(rng, self.runaway_words)
+        return response
+
+def _prose(rng, words):
+    """`words` words of filler in lines of ten, with no digits or calculations."""
+    vocabulary = ("the", "customers", "segment", "loyalty", "program", "share", "we", "consider", "store",
+                  "members", "quarter", "overall", "because", "this", "shows", "that", "more", "of")
+    tokens = rng.choice(vocabulary, size=words)
+    return "\n".join(" ".join(tokens[i:i + 10]) for i in range(0, words, 10))
+
+def _formatted_answer(question):
+    """GSM8K-style answer to a stub question."""
+    customers, members = _numbers(question)
+    share = round(members / customers * 100, 2)
+    return f"Share of members = {members} / {customers} * 100 = <<{members}/{customers}*100={share}>>{share}%\n#### {share}"
+
+def _numbers(question):
+    """The first two integers in a stub question."""
+    values = [int(token) for token in question.replace("?", " ").split() if token.isdigit()]
+    return values[0], values[1]
+
+class StubRetriever:
+    """Retriever returning the same documents for every query."""
+
+    def __init__(self, documents=()):
+        self.documents = list(documents)
+
+    def get_relevant_documents(self, query):
+        return self.documents
+
+    def invoke(self, query):
+        return self.documents
@@ -1,17 +1,50 @@
 import pandas as pd
 from IPython.display import display
 
-def load_and_preprocess_data(csv_path):
+# Low-cardinality string columns stored as categoricals in memory-optimized mode
+CATEGORICAL_COLUMNS = [
+    "Gender", "Income_Level", "Marital_Status", "Education_Level", "Occupation",
+    "Purchase_Category", "Purchase_Channel", "Social_Media_Influence", "Discount_Sensitivity",
+    "Engagement_with_Ads", "Device_Used_for_Shopping", "Payment_Method", "Purchase_Intent",
+    "Shipping_Preference",
+]
+
+# TRUE/FALSE columns parsed straight to bool
+BOOLEAN_COLUMNS = ["Discount_Used", "Customer_Loyalty_Program_Member"]
+
+# Integer scores and counts downcast to the smallest integer type that fits (int8 for this dataset)
+INTEGER_COLUMNS = [
+    "Age", "Frequency_of_Purchase", "Brand_Loyalty", "Product_Rating", "Return_Rate",
+    "Customer_Satisfaction", "Time_to_Decision",
+]
+
+# Fractional columns that must not be inferred as integers when a chunk happens to hold whole numbers only
+FLOAT_COLUMNS = {"Time_Spent_on_Product_Research(hours)": "float64"}
+
+# Explicit read schema for memory-optimized mode
+CSV_SCHEMA = {
+    **FLOAT_COLUMNS,
+    "Customer_ID": "object",
+    "Location": "object",
+    "Purchase_Amount": "object",
+    "Time_of_Purchase": "object",
+    **{col: "category" for col in CATEGORICAL_COLUMNS},
+}
+
+def load_and_preprocess_data(csv_path, optimize_memory=False):
     """Load and preprocess the e-commerce CSV data."""
     try:
-        # Load CSV with low_memory=False for large files
-        df = pd.read_csv(csv_path, low_memory=False)
+        if optimize_memory:
+            df = read_csv_optimized(csv_path)
+        else:
+            # Load CSV with low_memory=False for large files
+            df = pd.read_csv(csv_path, low_memory=False)
         print(f"Loaded CSV with {len(df)} rows and {len(df.columns)} columns")
         print(f"Columns: {df.columns.tolist()}")
         display(df.head(3))
 
         # Preprocess data
-        processed_df = preprocess_csv(df)
+        processed_df = preprocess_csv(df, optimize_memory=optimize_memory)
         print(f"Preprocessed {len(processed_df)} rows of e-commerce data")
 
         # Display data types
@@ -40,14 +73,76 @@ def load_and_preprocess_data(csv_path):
         print(f"Error during data loading/preprocessing: {str(e)}")
         raise
 
-def preprocess_csv(df):
-    """Clean and prepare the CSV data."""
-    processed_df = df.copy()
+def iter_preprocessed_chunks(csv_path, chunksize, optimize_memory=False):
+    """
+    Stream the CSV in chunks of `chunksize` rows and preprocess each chunk.
+
+    Chunks keep their position in the file as the index, so row indices match
+    a full load. Peak memory is bounded by the chunk size rather than the file.
+    """
+    try:
+        if optimize_memory:
+            reader = read_csv_optimized(csv_path, chunksize=chunksize)
+        else:
+            reader = pd.read_csv(csv_path, chunksize=chunksize, dtype=FLOAT_COLUMNS, low_memory=False)
+
+        total_rows, chunk_count, missing_values = 0, 0, None
+        with reader:
+            for chunk in reader:
+                processed_chunk = preprocess_csv(chunk, optimize_memory=optimize_memory, report_memory=False)
+                chunk_missing = processed_chunk.isnull().sum()
+                missing_values = chunk_missing if missing_values is None else missing_values + chunk_missing
+                total_rows += len(processed_chunk)
+                chunk_count += 1
+                yield processed_chunk
+
+        print(f"Preprocessed {total_rows} rows of e-commerce data in {chunk_count} chunks of up to {chunksize} rows")
+        if missing_values is not None:
+            print("\nMissing values:")
+            print(missing_values[missing_values > 0] if any(missing_values > 0) else "No missing values")
+
+    except FileNotFoundError:
+        print(f"Error: CSV file not found at {csv_path}")
+        raise
+
+def read_csv_optimized(csv_path, **kwargs):
+    """Read the CSV with the explicit CSV_SCHEMA dtypes and TRUE/FALSE parsed to bool."""
+    return pd.read_csv(
+        csv_path,
+        dtype=CSV_SCHEMA,
+        true_values=["TRUE"],
+        false_values=["FALSE"],
+        low_memory=False,
+        **kwargs,
+    )
+
+def preprocess_csv(df, optimize_memory=False, report_memory=True):
+    """
+    Clean and prepare the CSV data.
+
+    Args:
+        df: Raw DataFrame as read from the CSV.
+        optimize_memory: Convert `df` in place instead of copying it, store
+            CATEGORICAL_COLUMNS as categoricals, BOOLEAN_COLUMNS as bool and
+            downcast INTEGER_COLUMNS.
+        report_memory: Print memory use before and after in memory-optimized mode.
+
+    Returns:
+        The preprocessed DataFrame.
+    """
+    if optimize_memory:
+        if report_memory:
+            memory_before = df.memory_usage(deep=True).sum()
+        processed_df = df
+    else:
+        processed_df = df.copy()
 
     # Clean string columns in one go
     str_columns = processed_df.select_dtypes(include=["object"]).columns
     for col in str_columns:
         processed_df[col] = processed_df[col].str.strip()
+    for col in processed_df.select_dtypes(include=["category"]).columns:
+        processed_df[col] = strip_categories(processed_df[col])
 
     # Convert Purchase_Amount to numeric
     if "Purchase_Amount" in processed_df.columns:
@@ -64,4 +159,35 @@ def preprocess_csv(df):
             processed_df["Time_of_Purchase"], format="%m/%d/%Y", errors="coerce"
         )
 
+    if optimize_memory:
+        optimize_dtypes(processed_df)
+    if optimize_memory and report_memory:
+        memory_after = processed_df.memory_usage(deep=True).sum()
+        print(
+            f"Memory usage: {memory_before / 1024**2:.2f} MB -> {memory_after / 1024**2:.2f} MB "
+            f"({(1 - memory_after / memory_before) * 100:.1f}% saved)"
+        )
+
     return processed_df
+
+def optimize_dtypes(df):
+    """Convert columns to compact dtypes in place."""
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype("category")
+    for col in BOOLEAN_COLUMNS:
+        if col in df.columns and df[col].dtype == object:
+            parsed = df[col].map({"TRUE": True, "FALSE": False, True: True, False: False})
+            if parsed.notna().all():
+                df[col] = parsed.astype(bool)
+    for col in INTEGER_COLUMNS:
+        if col in df.columns and pd.api.types.is_integer_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col], downcast="integer")
+    return df
+
+def strip_categories(series):
+    """Strip whitespace from categorical labels without expanding the column to strings."""
+    stripped = series.cat.categories.str.strip()
+    if stripped.is_unique:
+        return series.cat.rename_categories(stripped)
+    return series.astype(object).str.strip().astype("category")
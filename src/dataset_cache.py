@@ -0,0 +1,110 @@
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+import pyarrow.feather as feather
+from src import data_preprocessing
+from src.data_preprocessing import load_and_preprocess_data
+
+def load_preprocessed_dataset(csv_path, cache_dir, columns=None, optimize_memory=False):
+    """
+    Load the preprocessed dataset from an on-disk Arrow cache, building it on a miss.
+
+    The cache key hashes the CSV contents, the preprocessing code and the
+    preprocessing options, so editing either the CSV or data_preprocessing.py
+    invalidates the entry. Cached frames are stored as uncompressed Arrow IPC
+    (Feather v2) files that are memory-mapped on load.
+
+    Args:
+        csv_path: Path to the source CSV.
+        cache_dir: Directory holding the cached Arrow files.
+        columns: Optional list of columns to read; other columns are never touched.
+        optimize_memory: Forwarded to load_and_preprocess_data.
+
+    Returns:
+        The preprocessed DataFrame (restricted to `columns` if given).
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    cache_path = dataset_cache_path(csv_path, cache_dir, optimize_memory)
+
+    if os.path.exists(cache_path):
+        print(f"Loading preprocessed data from cache {cache_path}")
+        return read_cached_dataset(cache_path, columns)
+
+    processed_df = load_and_preprocess_data(csv_path, optimize_memory=optimize_memory)
+    write_cached_dataset(processed_df, cache_path)
+    remove_stale_entries(cache_path)
+    print(f"Cached preprocessed data to {cache_path}")
+    return processed_df[columns] if columns is not None else processed_df
+
+def dataset_cache_path(csv_path, cache_dir, optimize_memory=False):
+    """Return the cache file path for the current CSV contents and preprocessing code."""
+    key = hashlib.sha256()
+    key.update(source_digest(csv_path, cache_dir).encode())
+    key.update(preprocessing_digest().encode())
+    key.update(f"optimize_memory={optimize_memory};pandas={pd.__version__}".encode())
+    stem = os.path.splitext(os.path.basename(csv_path))[0]
+    mode = "optimized" if optimize_memory else "default"
+    return os.path.join(cache_dir, f"{stem}-{mode}-{key.hexdigest()[:16]}.arrow")
+
+def read_cached_dataset(cache_path, columns=None):
+    """
+    Memory-map a cached Arrow file, reading only the requested columns.
+
+    Arrow has a single null, which to_pandas() turns into None in object
+    columns. Those are set back to NaN, as read_csv leaves them, so a cache hit
+    returns the same frame (and the same "nan" in document text) as a miss.
+    """
+    table = feather.read_table(cache_path, columns=columns, memory_map=True)
+    df = table.to_pandas()
+    for col in table.column_names:
+        if table.column(col).null_count and df[col].dtype == object:
+            df[col] = df[col].where(df[col].notna(), np.nan)
+    return df
+
+def write_cached_dataset(df, cache_path):
+    """Write a DataFrame as an uncompressed Arrow file, atomically replacing any old one."""
+    tmp_path = f"{cache_path}.tmp"
+    feather.write_feather(df.reset_index(drop=True), tmp_path, compression="uncompressed")
+    os.replace(tmp_path, cache_path)
+
+def remove_stale_entries(cache_path):
+    """Delete older cache files for the same CSV and mode as `cache_path`."""
+    cache_dir, name = os.path.split(cache_path)
+    prefix = name.rsplit("-", 1)[0] + "-"
+    for other in os.listdir(cache_dir):
+        if other.startswith(prefix) and other.endswith(".arrow") and other != name:
+            os.remove(os.path.join(cache_dir, other))
+
+def preprocessing_digest():
+    """Hash the source of the preprocessing module."""
+    with open(data_preprocessing.__file__, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def source_digest(csv_path, cache_dir):
+    """
+    Hash the CSV contents.
+
+    Digests are remembered per (path, size, mtime) in the cache directory so an
+    unchanged multi-gigabyte CSV is not re-read on every run.
+    """
+    stat = os.stat(csv_path)
+    fingerprint = f"{os.path.abspath(csv_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+    digests_path = os.path.join(cache_dir, "source_digests.json")
+    digests = {}
+    if os.path.exists(digests_path):
+        with open(digests_path) as f:
+            digests = json.load(f)
+    if fingerprint in digests:
+        return digests[fingerprint]
+
+    digest = hashlib.sha256()
+    with open(csv_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    digests = {k: v for k, v in digests.items() if not k.startswith(f"{os.path.abspath(csv_path)}:")}
+    digests[fingerprint] = digest.hexdigest()
+    with open(digests_path, "w") as f:
+        json.dump(digests, f, indent=2)
+    return digests[fingerprint]
@@ -1,16 +1,61 @@
 from langchain.schema import Document
 from config.settings import SINGLE_DIMENSIONS, AGE_GROUPS, MULTI_DIMENSIONS
-from src.utils import format_value
+from src.utils import format_value, format_column
+from src.segment_aggregation import (
+    aggregate_single_dimensions, aggregate_multi_dimensions, segment_table, segment_distributions,
+    parent_table, calculate_segment_stats, value_distribution, SegmentAggregator, DISTRIBUTION_COLUMNS,
+)
+from itertools import repeat
 import pandas as pd
 
+# Row document layout: (section, [(label, column, suffix), ...]). Kept in sync
+# with create_row_document, which remains the per-row reference implementation.
+ROW_DOCUMENT_SECTIONS = [
+    ("Demographics", [
+        ("Customer ID", "Customer_ID", ""),
+        ("Age", "Age", ""),
+        ("Gender", "Gender", ""),
+        ("Income Level", "Income_Level", ""),
+        ("Marital Status", "Marital_Status", ""),
+        ("Education", "Education_Level", ""),
+        ("Occupation Level", "Occupation", ""),
+        ("Location", "Location", ""),
+    ]),
+    ("Purchase", [
+        ("Category", "Purchase_Category", ""),
+        ("Amount", "Purchase_Amount", ""),
+        ("Frequency", "Frequency_of_Purchase", " times"),
+        ("Channel", "Purchase_Channel", ""),
+        ("Date", "Time_of_Purchase", ""),
+    ]),
+    ("Shopping Behavior", [
+        ("Brand Loyalty", "Brand_Loyalty", "/5"),
+        ("Product Rating", "Product_Rating", "/5"),
+        ("Research Time", "Time_Spent_on_Product_Research(hours)", " hours"),
+        ("Social Media Influence", "Social_Media_Influence", ""),
+        ("Discount Sensitivity", "Discount_Sensitivity", ""),
+        ("Return Rate", "Return_Rate", ""),
+        ("Satisfaction", "Customer_Satisfaction", "/10"),
+        ("Ad Engagement", "Engagement_with_Ads", ""),
+        ("Used Discount", "Discount_Used", ""),
+        ("Loyalty Program Member", "Customer_Loyalty_Program_Member", ""),
+        ("Purchase Intent", "Purchase_Intent", ""),
+        ("Shipping Preference", "Shipping_Preference", ""),
+        ("Time to Decision", "Time_to_Decision", " days"),
+    ]),
+    ("Technology", [
+        ("Device", "Device_Used_for_Shopping", ""),
+        ("Payment", "Payment_Method", ""),
+    ]),
+]
+
 def create_table_rag_documents_multidim(df):
     """Create documents for Table RAG from the e-commerce dataset."""
     documents = []
 
     # 1. Create row-level documents
     print("Creating row-level documents...")
-    for idx, row in df.iterrows():
-        documents.append(create_row_document(idx, row, df.columns))
+    documents.extend(create_row_documents(df))
 
     # 2. Create single-dimension segment statistics
     print("\nCreating single-dimension segment statistics...")
@@ -25,6 +70,54 @@ def create_table_rag_documents_multidim(df):
     print(f"Total documents created: {len(documents)}")
     return documents
 
+def stream_table_rag_documents(chunks, row_documents=None, aggregator=None):
+    """
+    Create Table RAG documents from an iterable of preprocessed DataFrame chunks.
+
+    Row documents are created lazily as each chunk arrives. Segment aggregates
+    are merged across chunks and the segment documents are yielded once the
+    last chunk has been consumed, so only one chunk is held in memory at a
+    time and documents can be consumed one by one (pass [df] for a whole frame).
+
+    Args:
+        chunks: Iterable of preprocessed DataFrame chunks.
+        row_documents: Function yielding the row documents of a chunk (default
+            iter_row_documents; src.document_store.compact_row_documents yields
+            compact ones).
+        aggregator: SegmentAggregator to collect the segment aggregates in, for
+            callers that reuse them once the documents are consumed.
+    """
+    row_documents = row_documents or iter_row_documents
+    aggregator = SegmentAggregator() if aggregator is None else aggregator
+    row_count = 0
+
+    print("Creating row-level documents...")
+    for chunk in chunks:
+        for doc in row_documents(chunk):
+            row_count += 1
+            yield doc
+        aggregator.add(chunk)
+
+    single_aggregates, multi_aggregates, total_count = aggregator.result()
+    if total_count == 0:
+        return
+
+    print("\nCreating single-dimension segment statistics...")
+    segment_count = 0
+    for doc in render_single_dimension_documents(single_aggregates, total_count):
+        segment_count += 1
+        yield doc
+
+    print("\nCreating multi-dimension segment statistics...")
+    multi_segment_count = 0
+    for doc in render_multi_dimension_documents(multi_aggregates, total_count):
+        multi_segment_count += 1
+        yield doc
+
+    print(f"Created {segment_count} single-dimension segment documents")
+    print(f"Created {multi_segment_count} multi-dimension segment documents")
+    print(f"Total documents created: {row_count + segment_count + multi_segment_count}")
+
 def create_row_document(idx, row, columns):
     """Create a row-level document for a customer."""
     content_parts = [f"Customer data (Row {idx}):"]
@@ -84,101 +177,133 @@ def create_row_document(idx, row, columns):
 
     return Document(page_content=content, metadata=metadata)
 
+def create_row_documents(df):
+    """Create row-level documents for every customer, one column at a time.
+
+    Produces the same documents as calling create_row_document per row, but
+    formats each column once as a string Series and assembles page_content and
+    metadata in bulk instead of going through df.iterrows().
+    """
+    return list(iter_row_documents(df))
+
+def iter_row_documents(df):
+    """Yield the documents of create_row_documents one at a time, without building the list."""
+    if len(df) == 0:
+        return
+
+    template, content_values, keys, metadata_values = row_document_columns(df)
+    contents = map(template.format, *content_values)
+    metadata_values = [repeat("customer_row"), content_values[0]] + metadata_values
+    metadatas = (dict(zip(keys, row_values)) for row_values in zip(*metadata_values))
+
+    for content, metadata in zip(contents, metadatas):
+        yield Document(page_content=content, metadata=metadata)
+
+def row_document_columns(df):
+    """
+    Formatted columns that row documents are assembled from.
+
+    Returns (template, content values, metadata keys, metadata values): page_content
+    is template.format() of the content values of a row (the row index first), and
+    the metadata maps the keys to "customer_row", the row index and then the
+    metadata values of the row.
+    """
+    template_parts = ["Customer data (Row {}):"]
+    content_values = [df.index.astype(str)]
+    for section, fields in ROW_DOCUMENT_SECTIONS:
+        labels = []
+        for label, col, suffix in fields:
+            labels.append(f"{label}: " + ("${}" if col == "Purchase_Amount" else "{}") + suffix)
+            content_values.append(_row_content_column(df[col], col))
+        template_parts.append(f"{section}: " + " | ".join(labels))
+    template = "\n".join(template_parts)
+
+    keys = ["doc_type", "row_idx", *df.columns]
+    return template, content_values, keys, [format_column(df[col]) for col in df.columns]
+
+def _row_content_column(series, col):
+    """Render a column the way create_row_document interpolates its values."""
+    if col == "Purchase_Amount":
+        return series.map("{:.2f}".format)
+    if col == "Time_of_Purchase":
+        return format_column(series)
+    return series.astype(str)
+
 def create_single_dimension_documents(df, documents):
     """Create single-dimension segment statistics documents."""
-    segment_count = 0
+    segment_docs = list(render_single_dimension_documents(aggregate_single_dimensions(df), len(df)))
+    documents.extend(segment_docs)
+    return len(segment_docs)
+
+def create_multi_dimension_documents(df, documents):
+    """Create multi-dimension segment statistics documents."""
+    segment_docs = list(render_multi_dimension_documents(aggregate_multi_dimensions(df), len(df)))
+    documents.extend(segment_docs)
+    return len(segment_docs)
 
+def render_single_dimension_documents(aggregates, total_count):
+    """Yield single-dimension segment documents from precomputed aggregates."""
     for dim in SINGLE_DIMENSIONS:
         col, name = dim["column"], dim["name"]
-        for value in df[col].unique():
-            segment_data = df[df[col] == value]
-            if len(segment_data) == 0:
+        aggregate = aggregates[col]
+        distributions = segment_distributions(aggregate)
+        for (value,), segment in segment_table(aggregate).items():
+            if pd.isna(value):
                 continue
-
-            stats = calculate_segment_stats(segment_data, df)
-            segment_title = f"{name}: {value}"
-            content = create_segment_content(segment_title, stats, segment_data, col)
-            metadata = create_segment_metadata(segment_title, col, value, stats)
-
-            documents.append(Document(page_content=content, metadata=metadata))
-            segment_count += 1
+            yield _render_single_segment(f"{name}: {value}", col, value, segment, distributions, total_count)
 
     # Process age groups
+    aggregate = aggregates["Age_Group"]
+    segments = segment_table(aggregate)
+    distributions = segment_distributions(aggregate)
     for group in AGE_GROUPS:
-        segment_data = df[
-            (df["Age"] >= group["min"]) & (df["Age"] <= group["max"])
-        ] if group["min"] != 0 else df[df["Age"] <= group["max"]]
-        if len(segment_data) == 0:
-            continue
-
-        stats = calculate_segment_stats(segment_data, df)
-        segment_title = f"Age Group: {group['label']}"
-        content = create_segment_content(segment_title, stats, segment_data, "Age_Group")
-        metadata = create_segment_metadata(segment_title, "Age_Group", group["label"], stats)
-
-        documents.append(Document(page_content=content, metadata=metadata))
-        segment_count += 1
-
-    return segment_count
-
-def create_multi_dimension_documents(df, documents):
-    """Create multi-dimension segment statistics documents."""
-    multi_segment_count = 0
+        key = (group["label"],)
+        if key in segments:
+            segment_title = f"Age Group: {group['label']}"
+            yield _render_single_segment(segment_title, "Age_Group", group["label"], segments[key], distributions, total_count)
 
+def render_multi_dimension_documents(aggregates, total_count):
+    """Yield multi-dimension segment documents from precomputed aggregates."""
     for dim_combo in MULTI_DIMENSIONS:
         dim1, dim2 = dim_combo["dim1"], dim_combo["dim2"]
         name1, name2 = dim_combo["name1"], dim_combo["name2"]
+        aggregate = aggregates[(dim1, dim2)]
+        segments = segment_table(aggregate)
+        parents = parent_table(aggregate)
+        distributions = segment_distributions(aggregate)
 
-        values1 = [g["label"] for g in AGE_GROUPS] if dim1 == "Age_Group" else df[dim1].unique()
-        values2 = df[dim2].unique()
+        # Segments are listed in first-appearance order, so the unique values of
+        # each key level follow df[dim].unique()
+        values1 = [g["label"] for g in AGE_GROUPS] if dim1 == "Age_Group" else pd.unique(pd.Series([k[0] for k in segments]))
+        values2 = pd.unique(pd.Series([k[1] for k in segments]))
 
         for val1 in values1:
-            filtered_by_dim1 = filter_by_dimension(df, dim1, val1)
-            if len(filtered_by_dim1) == 0:
+            if pd.isna(val1) or val1 not in parents:
                 continue
-
-            parent_stats = {
-                "count": len(filtered_by_dim1),
-                "total_count": len(df),
-                "percentage": len(filtered_by_dim1) / len(df) * 100,
-            }
-
             for val2 in values2:
-                filtered_data = filtered_by_dim1[filtered_by_dim1[dim2] == val2]
-                if len(filtered_data) == 0:
+                segment = segments.get((val1, val2))
+                if pd.isna(val2) or segment is None:
                     continue
 
-                stats = calculate_segment_stats(filtered_data, df, filtered_by_dim1)
+                stats = calculate_segment_stats(segment, total_count, parents[val1])
                 segment_title = f"{name1}: {val1} + {name2}: {val2}"
-                content = create_multi_segment_content(
-                    segment_title, stats, filtered_data, dim1, dim2, filtered_by_dim1
-                )
+                segment_dists = _segment_value_distributions(distributions, (val1, val2))
+                content = create_multi_segment_content(segment_title, stats, segment_dists, dim1, dim2)
                 metadata = create_multi_segment_metadata(segment_title, dim1, dim2, val1, val2, stats)
+                yield Document(page_content=content, metadata=metadata)
 
-                documents.append(Document(page_content=content, metadata=metadata))
-                multi_segment_count += 1
-
-    return multi_segment_count
-
-def calculate_segment_stats(segment_data, df, parent_data=None):
-    """Calculate statistics for a segment."""
-    stats = {
-        "count": len(segment_data),
-        "total_count": len(df),
-        "percentage": len(segment_data) / len(df) * 100,
-        "avg_purchase": segment_data["Purchase_Amount"].mean(),
-        "total_purchase": segment_data["Purchase_Amount"].sum(),
-        "avg_satisfaction": segment_data["Customer_Satisfaction"].mean(),
-        "discount_usage": segment_data["Discount_Used"].mean() * 100,
-        "loyalty_membership": segment_data["Customer_Loyalty_Program_Member"].mean() * 100,
-    }
-    if parent_data is not None:
-        stats["parent_count"] = len(parent_data)
-        stats["percentage_of_parent"] = len(segment_data) / len(parent_data) * 100
-        stats["percentage_of_total"] = len(segment_data) / len(df) * 100
-    return stats
+def _render_single_segment(segment_title, dim, value, segment, distributions, total_count):
+    stats = calculate_segment_stats(segment, total_count)
+    segment_dists = _segment_value_distributions(distributions, (value,))
+    content = create_segment_content(segment_title, stats, segment_dists, dim)
+    metadata = create_segment_metadata(segment_title, dim, value, stats)
+    return Document(page_content=content, metadata=metadata)
 
-def create_segment_content(segment_title, stats, segment_data, dim):
+def _segment_value_distributions(distributions, key):
+    """Percentage distributions of each DISTRIBUTION_COLUMNS column for one segment."""
+    return {col: value_distribution(by_segment.get(key, {})) for col, by_segment in distributions.items()}
+
+def create_segment_content(segment_title, stats, distributions, dim):
     """Create content for a single-dimension segment document."""
     content_parts = [
         f"Segment Analysis: {segment_title}",
@@ -193,27 +318,28 @@ def create_segment_content(segment_title, stats, segment_data, dim):
     ]
 
     if dim != "Purchase_Channel":
-        channel_dist = segment_data["Purchase_Channel"].value_counts(normalize=True) * 100
+        channel_dist = distributions["Purchase_Channel"]
         content_parts.append("Purchase channel distribution:")
         for channel, pct in channel_dist.items():
             content_parts.append(f"- {channel}: {pct:.1f}%")
 
     if dim != "Purchase_Category":
-        top_categories = segment_data["Purchase_Category"].value_counts(normalize=True).head(5) * 100
+        top_categories = distributions["Purchase_Category"].head(5)
         content_parts.append("Top product categories:")
         for category, pct in top_categories.items():
             content_parts.append(f"- {category}: {pct:.1f}%")
 
     if dim != "Device_Used_for_Shopping":
-        device_dist = segment_data["Device_Used_for_Shopping"].value_counts(normalize=True) * 100
+        device_dist = distributions["Device_Used_for_Shopping"]
         content_parts.append("Device usage:")
         for device, pct in device_dist.items():
             content_parts.append(f"- {device}: {pct:.1f}%")
 
     return "\n".join(content_parts)
 
-def create_multi_segment_content(segment_title, stats, filtered_data, dim1, dim2, parent_data):
-    """Create content for a multi-dimension segment document."""
+def create_multi_segment_content(segment_title, stats, distributions, dim1, dim2, *more_dims):
+    """Create content for a multi-dimension segment document (of two or, from a SegmentCube, more dimensions)."""
+    dims = (dim1, dim2, *more_dims)
     content_parts = [
         f"Multi-Dimension Segment Analysis: {segment_title}",
         f"Customer counts:",
@@ -229,14 +355,14 @@ def create_multi_segment_content(segment_title, stats, filtered_data, dim1, dim2
         f"- Loyalty program membership: {stats['loyalty_membership']:.1f}%",
     ]
 
-    if dim1 != "Gender" and dim2 != "Gender":
-        gender_dist = filtered_data["Gender"].value_counts(normalize=True) * 100
+    if "Gender" not in dims:
+        gender_dist = distributions["Gender"]
         content_parts.append("Gender distribution:")
         for gender, pct in gender_dist.items():
             content_parts.append(f"- {gender}: {pct:.1f}%")
 
-    if dim1 != "Purchase_Category" and dim2 != "Purchase_Category":
-        top_categories = filtered_data["Purchase_Category"].value_counts(normalize=True).head(3) * 100
+    if "Purchase_Category" not in dims:
+        top_categories = distributions["Purchase_Category"].head(3)
         content_parts.append("Top product categories:")
         for category, pct in top_categories.items():
             content_parts.append(f"- {category}: {pct:.1f}%")
@@ -246,11 +372,11 @@ def create_multi_segment_content(segment_title, stats, filtered_data, dim1, dim2
         content_parts.append(
             f"Insight: Most customers in this segment ({stats['percentage_of_parent']:.1f}%) are significant."
         )
-    if stats["avg_purchase"] > parent_data["Purchase_Amount"].mean() * 1.2:
+    if stats["avg_purchase"] > stats["parent_avg_purchase"] * 1.2:
         content_parts.append(
             f"Insight: This segment spends significantly more than the average."
         )
-    if stats["avg_satisfaction"] > parent_data["Customer_Satisfaction"].mean() * 1.1:
+    if stats["avg_satisfaction"] > stats["parent_avg_satisfaction"] * 1.1:
         content_parts.append(
             f"Insight: This segment has significantly higher satisfaction."
         )
@@ -273,6 +399,42 @@ def create_segment_metadata(segment_title, dim, value, stats):
         "loyalty_membership": f"{stats['loyalty_membership']:.1f}%",
     }
 
+def render_cube_segment_document(cube, criteria):
+    """
+    Create the segment document for {dimension: value} criteria on demand from a SegmentCube.
+
+    One dimension gives a single-dimension segment document and two or more a
+    multi-dimension one, whose parent segment is the criteria without the last
+    dimension. Documents of three or more dimensions add dimension3/value3 and
+    so on to the multi-dimension metadata. Returns None if no customer matches.
+    """
+    segment = cube.segment(criteria)
+    if segment is None or not criteria:
+        return None
+    names = {dim["column"]: dim["name"] for dim in SINGLE_DIMENSIONS}
+    names["Age_Group"] = "Age Group"
+    dims, values = list(criteria), list(criteria.values())
+    segment_title = " + ".join(f"{names.get(dim, dim)}: {value}" for dim, value in criteria.items())
+    distributions = {
+        col: value_distribution(cube.distribution(criteria, col)) for col in DISTRIBUTION_COLUMNS
+        if col not in dims
+    }
+
+    if len(dims) == 1:
+        stats = calculate_segment_stats(segment, cube.total_count)
+        content = create_segment_content(segment_title, stats, distributions, dims[0])
+        metadata = create_segment_metadata(segment_title, dims[0], values[0], stats)
+        return Document(page_content=content, metadata=metadata)
+
+    parent = cube.segment(dict(zip(dims[:-1], values[:-1])))
+    stats = calculate_segment_stats(segment, cube.total_count, parent)
+    content = create_multi_segment_content(segment_title, stats, distributions, *dims)
+    metadata = create_multi_segment_metadata(segment_title, dims[0], dims[1], values[0], values[1], stats)
+    for i, (dim, value) in enumerate(zip(dims[2:], values[2:]), start=3):
+        metadata[f"dimension{i}"] = dim
+        metadata[f"value{i}"] = str(value)
+    return Document(page_content=content, metadata=metadata)
+
 def create_multi_segment_metadata(segment_title, dim1, dim2, val1, val2, stats):
     """Create metadata for a multi-dimension segment."""
     return {
@@ -292,16 +454,3 @@ def create_multi_segment_metadata(segment_title, dim1, dim2, val1, val2, stats):
         "discount_usage": f"{stats['discount_usage']:.1f}%",
         "loyalty_membership": f"{stats['loyalty_membership']:.1f}%",
     }
-
-def filter_by_dimension(df, dim, value):
-    """Filter dataframe by dimension and value."""
-    if dim == "Age_Group":
-        group = next((g for g in AGE_GROUPS if g["label"] == value), None)
-        if group:
-            return (
-                df[df["Age"] <= group["max"]]
-                if group["min"] == 0
-                else df[(df["Age"] >= group["min"]) & (df["Age"] <= group["max"])]
-            )
-        return pd.DataFrame()
-    return df[df[dim] == value]
@@ -0,0 +1,199 @@
+import sys
+from typing import Dict, List, Union
+import numpy as np
+import pandas as pd
+from langchain.docstore.base import AddableMixin, Docstore
+from langchain.schema import Document
+from src.document_creation import row_document_columns
+
+# Documents materialized to estimate what the store would take as LangChain Documents
+SIZE_SAMPLE = 1000
+
+class RowTable:
+    """
+    Formatted columns of a DataFrame (chunk), from which its row documents are rendered.
+
+    Every formatted column is kept once, as integer codes (of the smallest dtype
+    that fits) into its distinct values, and a column whose page_content and
+    metadata forms are identical is kept once for both. A row is then a position
+    shared by all columns, so its documents need no strings of their own.
+    """
+
+    __slots__ = ("template", "keys", "row_ids", "columns", "content_fields", "metadata_fields")
+
+    def __init__(self, df):
+        template, content_values, keys, metadata_values = row_document_columns(df)
+        self.template = template
+        self.keys = keys
+        if pd.api.types.is_integer_dtype(df.index):
+            self.row_ids = df.index.to_numpy(dtype=np.int64)
+        else:
+            self.row_ids = content_values[0].to_numpy(dtype=object)
+        self.columns = []
+        self.content_fields = [self._add_column(values) for values in content_values[1:]]
+        self.metadata_fields = [self._add_column(values) for values in metadata_values]
+
+    def __len__(self):
+        return len(self.row_ids)
+
+    def _add_column(self, values):
+        """Position in self.columns of the coded column, reusing an identical one."""
+        codes, uniques = pd.factorize(np.asarray(values, dtype=object), use_na_sentinel=False)
+        codes = codes.astype(np.min_scalar_type(max(len(uniques) - 1, 0)))
+        uniques = np.asarray(uniques, dtype=object)
+        for i, (other_codes, other_uniques) in enumerate(self.columns):
+            if len(other_uniques) == len(uniques) and np.array_equal(other_codes, codes) \
+                    and np.array_equal(other_uniques, uniques):
+                return i
+        self.columns.append((codes, uniques))
+        return len(self.columns) - 1
+
+    def _values(self, fields, position):
+        return [self.columns[field][1][self.columns[field][0][position]] for field in fields]
+
+    def page_content(self, position):
+        return self.template.format(str(self.row_ids[position]), *self._values(self.content_fields, position))
+
+    def metadata(self, position):
+        values = ["customer_row", str(self.row_ids[position]), *self._values(self.metadata_fields, position)]
+        return dict(zip(self.keys, values))
+
+    def documents(self):
+        """A RowDocument for every row, in order."""
+        return (RowDocument(self, position) for position in range(len(self)))
+
+    def memory_bytes(self):
+        """Bytes held by the codes, the distinct values and the row IDs."""
+        total = self.row_ids.nbytes + sys.getsizeof(self.template)
+        if self.row_ids.dtype == object:
+            total += sum(map(sys.getsizeof, self.row_ids))
+        for codes, uniques in self.columns:
+            total += codes.nbytes + uniques.nbytes + sum(map(sys.getsizeof, uniques))
+        return total
+
+class RowDocument:
+    """
+    A customer row document held as its RowTable and row position.
+
+    page_content and metadata are rendered on every access instead of being
+    stored, and are the same as those of create_row_documents.
+    """
+
+    __slots__ = ("table", "position")
+
+    def __init__(self, table, position):
+        self.table = table
+        self.position = position
+
+    @property
+    def page_content(self):
+        return self.table.page_content(self.position)
+
+    @property
+    def metadata(self):
+        return self.table.metadata(self.position)
+
+    def to_document(self) -> Document:
+        return Document(page_content=self.page_content, metadata=self.metadata)
+
+class StoredDocument:
+    """Any other document, kept as its page_content and metadata without LangChain's per-object state."""
+
+    __slots__ = ("page_content", "metadata")
+
+    def __init__(self, page_content, metadata):
+        self.page_content = page_content
+        self.metadata = metadata
+
+    def to_document(self) -> Document:
+        return Document(page_content=self.page_content, metadata=self.metadata)
+
+def compact_row_documents(df):
+    """Row documents of a DataFrame (chunk) as RowDocuments sharing one RowTable (see stream_table_rag_documents)."""
+    if len(df) == 0:
+        return iter(())
+    return RowTable(df).documents()
+
+def compact_document(doc):
+    """The compact form of a document: RowDocuments and StoredDocuments as they are, others as a StoredDocument."""
+    if isinstance(doc, (RowDocument, StoredDocument)):
+        return doc
+    return StoredDocument(doc.page_content, doc.metadata)
+
+def as_document(doc) -> Document:
+    """A LangChain Document for a document in either form."""
+    return doc.to_document() if isinstance(doc, (RowDocument, StoredDocument)) else doc
+
+def document_bytes(doc):
+    """
+    Bytes held by one document object: the object, its attribute dict if any, its
+    page_content, its metadata dict and the metadata values (the keys are shared).
+    """
+    metadata = doc.metadata
+    size = sys.getsizeof(doc) + sys.getsizeof(doc.page_content) + sys.getsizeof(metadata)
+    size += sum(map(sys.getsizeof, metadata.values()))
+    if hasattr(doc, "__dict__"):
+        size += sys.getsizeof(vars(doc))
+    return size
+
+class CompactDocumentStore(Docstore, AddableMixin):
+    """
+    LangChain docstore that keeps documents compact and only builds Documents when searched.
+
+    Customer rows added as RowDocuments stay references into their shared
+    RowTable; every other document is kept as a StoredDocument. search() (which
+    FAISS calls for every result) returns a new LangChain Document, while get()
+    returns the compact record, which has the same page_content and metadata.
+    """
+
+    def __init__(self):
+        self._records = {}
+
+    def __len__(self):
+        return len(self._records)
+
+    def add(self, texts: Dict[str, Union[Document, RowDocument, StoredDocument]]) -> None:
+        overlapping = set(texts).intersection(self._records)
+        if overlapping:
+            raise ValueError(f"Tried to add ids that already exist: {overlapping}")
+        for doc_id, doc in texts.items():
+            self._records[doc_id] = compact_document(doc)
+
+    def delete(self, ids: List) -> None:
+        if not set(ids).intersection(self._records):
+            raise ValueError(f"Tried to delete ids that does not  exist: {ids}")
+        for doc_id in ids:
+            self._records.pop(doc_id)
+
+    def search(self, search: str) -> Union[str, Document]:
+        record = self._records.get(search)
+        if record is None:
+            return f"ID {search} not found."
+        return record.to_document()
+
+    def get(self, doc_id):
+        """The compact record of a document, or None."""
+        return self._records.get(doc_id)
+
+    def memory_bytes(self):
+        """Bytes held by the records and the row tables they share, the ID mapping aside."""
+        tables, total = {}, 0
+        for record in self._records.values():
+            if isinstance(record, RowDocument):
+                tables[id(record.table)] = record.table
+                total += sys.getsizeof(record)
+            else:
+                total += document_bytes(record)
+        return total + sum(table.memory_bytes() for table in tables.values())
+
+    def summary(self, sample_size=SIZE_SAMPLE):
+        """Bytes per document as stored, against the same documents as LangChain Documents (estimated on a sample)."""
+        if not self._records:
+            return "no documents"
+        records = list(self._records.values())
+        step = max(1, len(records) // sample_size)
+        sample = [record.to_document() for record in records[::step]]
+        document_size = sum(map(document_bytes, sample)) / len(sample)
+        compact_size = self.memory_bytes() / len(records)
+        return (f"{len(records)} documents, {compact_size:.0f} bytes per document "
+                f"({document_size:.0f} as LangChain Documents, {1 - compact_size / document_size:.0%} saved)")
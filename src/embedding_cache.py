@@ -0,0 +1,167 @@
+import hashlib
+import json
+import os
+import re
+import numpy as np
+
+class EmbeddingCache:
+    """
+    Persistent, content-addressed cache of document embeddings for one embedding model.
+
+    Entries are keyed by the SHA-256 of the text and stored under
+    `cache_dir/<model>/` in a compact layout that can be memory-mapped:
+
+    - vectors.npy: float32 array of shape (capacity, dim)
+    - keys.npy: uint8 array of shape (capacity, 32) holding each slot's digest
+    - last_used.npy: logical access time per slot (0 marks a free slot), for LRU eviction
+    - meta.json: model name, dimension and access clock
+
+    Capacity doubles as entries are added, up to `max_entries`; beyond that the
+    least recently used entries are evicted.
+
+    Inserted vectors are kept in memory until flush(), which commits them so
+    that a crash at any point leaves every slot on disk either free or holding
+    the vector of its own key: the slots being written are first marked free in
+    last_used.npy, then the vectors and keys are written, then last_used.npy
+    again. Each file is replaced atomically.
+    """
+
+    def __init__(self, cache_dir, model, max_entries=1_000_000):
+        self.model = model
+        self.max_entries = max_entries
+        self.path = os.path.join(cache_dir, re.sub(r"[^A-Za-z0-9_.-]", "_", model))
+        os.makedirs(self.path, exist_ok=True)
+        self.dim = None
+        self.clock = 0
+        self.vectors = None
+        self.keys = np.zeros((0, 32), dtype=np.uint8)
+        self.last_used = np.zeros(0, dtype=np.int64)
+        self.slots = {}
+        # Vectors inserted since the last flush, by slot
+        self.pending = {}
+        self._load()
+
+    def __len__(self):
+        return len(self.slots)
+
+    def lookup(self, texts):
+        """Return a list with the cached vector for each text, or None on a miss."""
+        self.clock += 1
+        results = []
+        for text in texts:
+            slot = self.slots.get(text_digest(text))
+            if slot is None:
+                results.append(None)
+            else:
+                self.last_used[slot] = self.clock
+                vector = self.pending.get(slot)
+                results.append((vector if vector is not None else self.vectors[slot]).tolist())
+        return results
+
+    def insert(self, texts, vectors):
+        """Store vectors for texts, evicting least recently used entries if full."""
+        if not texts:
+            return
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match cache dimension {self.dim}")
+
+        self.clock += 1
+        digests = [text_digest(text) for text in texts]
+        existing = np.array([self.slots[d] for d in digests if d in self.slots], dtype=np.int64)
+        self.last_used[existing] = self.clock
+
+        new_digests = list(dict.fromkeys(d for d in digests if d not in self.slots))[-self.max_entries:]
+        for digest, slot in zip(new_digests, self._allocate(len(new_digests))):
+            self.slots[digest] = slot
+            self.keys[slot] = np.frombuffer(digest, dtype=np.uint8)
+
+        for i, digest in enumerate(digests):
+            slot = self.slots.get(digest)
+            if slot is not None:
+                self.pending[slot] = vectors[i]
+                self.last_used[slot] = self.clock
+
+    def flush(self):
+        """Persist the cache to disk, committing the pending vectors."""
+        if self.vectors is None:
+            return
+        if self.pending:
+            slots = np.fromiter(self.pending, dtype=np.int64, count=len(self.pending))
+            # Until the keys are saved, the slots being overwritten must not map an old key to a new vector
+            invalidated = self.last_used.copy()
+            invalidated[slots] = 0
+            self._save_array("last_used.npy", invalidated)
+            self.vectors[slots] = np.stack(list(self.pending.values()))
+            self.vectors.flush()
+            self.pending = {}
+        self._save_array("keys.npy", self.keys)
+        self._save_array("last_used.npy", self.last_used)
+        meta_path = os.path.join(self.path, "meta.json")
+        with open(f"{meta_path}.tmp", "w") as f:
+            json.dump({"model": self.model, "dim": self.dim, "clock": self.clock}, f)
+        os.replace(f"{meta_path}.tmp", meta_path)
+
+    def _save_array(self, name, array):
+        """Write an array file, atomically replacing the old one."""
+        path = os.path.join(self.path, name)
+        with open(f"{path}.tmp", "wb") as f:
+            np.save(f, array)
+        os.replace(f"{path}.tmp", path)
+
+    def _allocate(self, count):
+        """Return `count` slots for new entries, growing or evicting as needed."""
+        if count == 0:
+            return []
+        used = len(self.slots)
+        if used + count > len(self.last_used) and len(self.last_used) < self.max_entries:
+            self._grow(min(self.max_entries, max(used + count, 2 * len(self.last_used), 1024)))
+
+        free = np.flatnonzero(self.last_used == 0)[:count]
+        if len(free) < count:
+            # Evict the least recently used entries to make room
+            occupied = np.flatnonzero(self.last_used > 0)
+            n_evict = count - len(free)
+            victims = occupied[np.argpartition(self.last_used[occupied], n_evict - 1)[:n_evict]]
+            for slot in victims:
+                del self.slots[self.keys[slot].tobytes()]
+            self.last_used[victims] = 0
+            free = np.concatenate([free, victims])
+        return free.tolist()
+
+    def _grow(self, capacity):
+        # Only committed vectors are copied, so the larger file matches the saved keys
+        vectors_path = os.path.join(self.path, "vectors.npy")
+        tmp_path = os.path.join(self.path, "vectors.npy.tmp")
+        grown = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float32, shape=(capacity, self.dim))
+        if self.vectors is not None:
+            grown[:len(self.vectors)] = self.vectors
+            del self.vectors
+        grown.flush()
+        del grown
+        os.replace(tmp_path, vectors_path)
+        self.vectors = np.load(vectors_path, mmap_mode="r+")
+        self.keys = np.concatenate([self.keys, np.zeros((capacity - len(self.keys), 32), dtype=np.uint8)])
+        self.last_used = np.concatenate([self.last_used, np.zeros(capacity - len(self.last_used), dtype=np.int64)])
+
+    def _load(self):
+        meta_path = os.path.join(self.path, "meta.json")
+        if not os.path.exists(meta_path):
+            return
+        with open(meta_path) as f:
+            meta = json.load(f)
+        self.dim, self.clock = meta["dim"], meta["clock"]
+        self.vectors = np.load(os.path.join(self.path, "vectors.npy"), mmap_mode="r+")
+        self.keys = np.load(os.path.join(self.path, "keys.npy"))
+        self.last_used = np.load(os.path.join(self.path, "last_used.npy"))
+        # The vectors file is grown before the keys are next saved; the extra slots are free
+        extra = len(self.vectors) - len(self.last_used)
+        self.keys = np.concatenate([self.keys, np.zeros((extra, 32), dtype=np.uint8)])
+        self.last_used = np.concatenate([self.last_used, np.zeros(extra, dtype=np.int64)])
+        self.slots = {self.keys[slot].tobytes(): slot for slot in np.flatnonzero(self.last_used > 0).tolist()}
+
+def text_digest(text):
+    """SHA-256 digest of a document's page_content."""
+    return hashlib.sha256(text.encode("utf-8")).digest()
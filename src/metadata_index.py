@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+
+# Values held by at least this fraction of documents are stored as bitsets
+# (a packed bitset is smaller than an int32 posting list above 1/32)
+BITSET_MIN_FRACTION = 1 / 32
+
+class MetadataIndex:
+    """
+    Inverted index from (metadata key, value) to the positions of matching documents.
+
+    Built once over a document list. Rare values keep a sorted int32 posting list;
+    frequent values (such as doc_type or Gender) keep a packed bitset. Conjunctive
+    criteria are answered by intersecting the smallest posting list with the others
+    and probing the bitsets, so the cost depends on the rarest criterion rather than
+    on the number of documents. Positions are returned in document order.
+    """
+
+    def __init__(self, documents, bitset_min_fraction=BITSET_MIN_FRACTION):
+        self.documents = list(documents)
+        self.size = len(self.documents)
+        self.postings = {}
+        self.bitsets = {}
+        self.values_by_key = {}
+
+        metadatas = [doc.metadata for doc in self.documents]
+        bitset_min_count = max(1, int(self.size * bitset_min_fraction))
+        for key in dict.fromkeys(key for metadata in metadatas for key in metadata):
+            codes, values = pd.factorize(pd.Series([metadata.get(key) for metadata in metadatas], dtype=object))
+            order = np.argsort(codes, kind="stable").astype(np.int32)
+            sorted_codes = codes[order]
+            starts = np.searchsorted(sorted_codes, np.arange(len(values)), side="left")
+            ends = np.searchsorted(sorted_codes, np.arange(len(values)), side="right")
+            self.values_by_key[key] = list(values)
+            for value, start, end in zip(values, starts, ends):
+                positions = order[start:end]
+                if end - start >= bitset_min_count:
+                    mask = np.zeros(self.size, dtype=bool)
+                    mask[positions] = True
+                    self.bitsets[(key, value)] = np.packbits(mask)
+                else:
+                    self.postings[(key, value)] = positions
+
+    def __len__(self):
+        return self.size
+
+    def positions(self, criteria):
+        """Return the sorted positions of documents whose metadata matches every criterion."""
+        lists, bitsets = [], []
+        for item in criteria.items():
+            if item in self.postings:
+                lists.append(self.postings[item])
+            elif item in self.bitsets:
+                bitsets.append(self.bitsets[item])
+            else:
+                return np.zeros(0, dtype=np.int64)
+
+        if not lists:
+            if not bitsets:
+                return np.arange(self.size)
+            combined = np.bitwise_and.reduce(bitsets) if len(bitsets) > 1 else bitsets[0]
+            return np.flatnonzero(np.unpackbits(combined, count=self.size))
+
+        lists.sort(key=len)
+        matches = lists[0].astype(np.int64)
+        for other in lists[1:]:
+            matches = np.intersect1d(matches, other, assume_unique=True)
+        for bitset in bitsets:
+            matches = matches[(bitset[matches >> 3] >> (7 - (matches & 7))) & 1 == 1]
+        return matches
+
+    def count(self, criteria):
+        """Number of documents matching the criteria."""
+        return len(self.positions(criteria))
+
+    def match(self, criteria, limit=None):
+        """Return matching documents in document order, at most `limit` of them."""
+        return [self.documents[i] for i in self.positions(criteria)[:limit]]
@@ -1,8 +1,17 @@
 from langchain.prompts import PromptTemplate
-from langchain_ollama.llms import OllamaLLM
+from src.qa.context_packing import ContextPacker, build_context
+from src.qa.llm_backend import LLMBackend
+from src.qa.streaming import AnswerMonitor, generate_monitored
 
-def answer_question(llm: OllamaLLM, retriever, question: str) -> str:
-    """Answer a question using the e-commerce RAG system with GSM8K-style reasoning."""
+def answer_question(llm: LLMBackend, retriever, question: str, stream: bool = False,
+                    context_packer: ContextPacker = None) -> str:
+    """
+    Answer a question using the e-commerce RAG system with GSM8K-style reasoning.
+
+    With `stream`, the answer is generated as a stream and aborted with
+    GenerationAborted as soon as it turns into runaway prose. With a
+    `context_packer`, the retrieved documents are packed into its token budget.
+    """
     answering_template = """
     You are an expert mathematician solving word problems in the style of GSM8K dataset answers.
     
@@ -38,14 +47,15 @@ def answer_question(llm: OllamaLLM, retriever, question: str) -> str:
     
     print(f"Retrieving context for question: '{question[:50]}...'")
     docs = retriever.get_relevant_documents(question)
-    context_text = "\n\n".join([doc.page_content for doc in docs])
+    context_text = build_context(docs, question, context_packer)
     
     print("Generating answer...")
-    response = llm.invoke(
-        answer_prompt.format(
-            question=question,
-            context=context_text
-        )
+    prompt = answer_prompt.format(
+        question=question,
+        context=context_text
     )
+    if stream:
+        return generate_monitored(llm, prompt, AnswerMonitor())
+    response = llm.invoke(prompt)
     
     return response
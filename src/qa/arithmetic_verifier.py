@@ -0,0 +1,214 @@
+import json
+import math
+import re
+import sys
+from typing import Dict, List, Tuple
+
+# "<<expression=result>>" calculation annotations in a GSM8K-style answer. The first
+# alternative captures the common "a op b [op c] = result" form so it can be checked
+# without tokenizing; anything else is captured whole by the second.
+ANNOTATION_PATTERN = re.compile(
+    r"<<\s*(\d+(?:\.\d+)?)\s*([-+*/])\s*(\d+(?:\.\d+)?)\s*(?:([*/])\s*(\d+(?:\.\d+)?)\s*)?=\s*(\d+(?:\.(\d+))?)\s*>>"
+    r"|<<([^<>]*)>>"
+)
+
+# Numbers (with optional thousands separators) and operators in an annotation
+TOKEN_PATTERN = re.compile(r"\d[\d,]*(?:\.\d*)?|\.\d+|[-+*/×÷()]|\S")
+
+# Number after the "####" final answer marker
+FINAL_ANSWER_PATTERN = re.compile(r"####\s*\$?\s*(-?\d[\d,]*(?:\.(\d+))?)")
+
+# Relative tolerance on top of the rounding allowed by the digits a result is written with
+DEFAULT_REL_TOL = 1e-6
+
+# Rounding tolerance of a result written with i decimals
+ROUNDING_TOLERANCE = [0.5 * 10.0 ** -decimals for decimals in range(16)]
+
+# Deepest nesting of parentheses and unary signs the parser follows; deeper expressions
+# are reported as malformed instead of exhausting the recursion limit
+MAX_NESTING = 100
+
+MULTIPLY = {"*", "×"}
+DIVIDE = {"/", "÷"}
+
+def evaluate_expression(expression: str) -> float:
+    """
+    Evaluate an arithmetic expression with + - * / (also × and ÷), parentheses and unary minus.
+
+    Numbers may carry "$" signs and thousands separators. This is a small
+    recursive-descent parser, not eval(), so anything else raises ValueError, as
+    do nesting deeper than MAX_NESTING and numbers or results that overflow.
+    """
+    tokens = TOKEN_PATTERN.findall(expression.replace("$", ""))
+    if len(tokens) == 3 and tokens[0][0].isdigit() and tokens[2][0].isdigit():
+        # Fast path for the common "a op b"
+        return _apply(_number(tokens[0]), tokens[1], _number(tokens[2]))
+    value, position = _parse_sum(tokens, 0, 0)
+    if position != len(tokens):
+        raise ValueError(f"unexpected {tokens[position]!r} in {expression!r}")
+    return value
+
+def parse_number(text: str) -> float:
+    """Parse a written result such as "$1,200.50" or "45.2%"."""
+    return _number(text.strip().lstrip("$").rstrip("%").strip())
+
+def results_match(value: float, result: str, rel_tol: float = DEFAULT_REL_TOL) -> bool:
+    """Whether the written `result` equals `value` rounded to the number of decimals `result` is written with."""
+    written = parse_number(result)
+    decimals = result.strip().rstrip("%").partition(".")[2]
+    return abs(value - written) <= _rounding_tolerance(len(decimals)) + rel_tol * abs(value)
+
+def find_arithmetic_errors(answer: str, rel_tol: float = DEFAULT_REL_TOL) -> List[Tuple[str, str]]:
+    """
+    Check every <<expression=result>> annotation of an answer and its "####" final answer.
+
+    A result written after "≈" is checked like one after "=". The final answer
+    must match the result of the last annotation (it may be rounded further).
+
+    Returns:
+        List of (kind, detail) problems; empty if the arithmetic is correct. Kinds
+        are "no_annotations", "malformed", "incorrect", "no_final_answer" and
+        "final_mismatch".
+    """
+    errors = []
+    last_result = last_value = None
+    for a, operator1, b, operator2, c, result, decimals, annotation in ANNOTATION_PATTERN.findall(answer):
+        if not annotation:
+            try:
+                if not operator2:
+                    x, y = float(a), float(b)
+                    value = x * y if operator1 == "*" else x / y if operator1 == "/" else x + y if operator1 == "+" else x - y
+                    if not (math.isfinite(x) and math.isfinite(y) and math.isfinite(value)):
+                        raise ValueError("number out of range")
+                elif operator1 in MULTIPLY or operator1 in DIVIDE:
+                    value = _apply(_apply(_number(a), operator1, _number(b)), operator2, _number(c))
+                else:
+                    value = _apply(_number(a), operator1, _apply(_number(b), operator2, _number(c)))
+                if not math.isfinite(float(result)):
+                    raise ValueError("result out of range")
+            except (ValueError, ZeroDivisionError) as e:
+                errors.append(("malformed", f"<<{a}{operator1}{b}{operator2}{c}={result}>>: {e}"))
+                continue
+            if abs(value - float(result)) > _rounding_tolerance(len(decimals)) + rel_tol * abs(value):
+                errors.append(("incorrect", f"<<{a}{operator1}{b}{operator2}{c}={result}>>: {value:g}"))
+            last_result, last_value = result, float(result)
+            continue
+
+        expression, equals, result = annotation.replace("≈", "=").rpartition("=")
+        if not equals:
+            errors.append(("malformed", f"<<{annotation}>> has no result"))
+            continue
+        expression = expression.partition("=")[0]
+        try:
+            value = evaluate_expression(expression)
+            correct = results_match(value, result, rel_tol)
+        except (ValueError, ZeroDivisionError, IndexError) as e:
+            errors.append(("malformed", f"<<{annotation}>>: {e}"))
+            continue
+        if not correct:
+            errors.append(("incorrect", f"<<{annotation}>>: {expression.strip()} = {value:g}"))
+        last_result, last_value = result, parse_number(result)
+
+    if last_result is None and not errors:
+        errors.append(("no_annotations", "no <<calculation=result>> annotations"))
+    final_answer = FINAL_ANSWER_PATTERN.search(answer)
+    if final_answer is None:
+        errors.append(("no_final_answer", "no number after ####"))
+    elif last_result is not None:
+        final_value = float(final_answer.group(1).replace(",", ""))
+        decimals = final_answer.group(2) or ""
+        if not math.isfinite(final_value) or abs(last_value - final_value) > _rounding_tolerance(len(decimals)) + rel_tol * abs(last_value):
+            errors.append(("final_mismatch", f"#### {final_answer.group(1)} does not match the last result {last_result}"))
+    return errors
+
+def verify_qa_pairs(qa_pairs: List[Dict[str, str]], rel_tol: float = DEFAULT_REL_TOL) -> Dict:
+    """
+    Check the arithmetic of many QA pairs.
+
+    Returns:
+        Dict with "pairs", "valid", "errors" (problem counts by kind) and
+        "invalid" (list of (index, problems) for the failing pairs).
+    """
+    counts = {}
+    invalid = []
+    for i, qa_pair in enumerate(qa_pairs):
+        errors = find_arithmetic_errors(qa_pair.get("answer", ""), rel_tol)
+        if errors:
+            invalid.append((i, errors))
+            for kind, _ in errors:
+                counts[kind] = counts.get(kind, 0) + 1
+    return {"pairs": len(qa_pairs), "valid": len(qa_pairs) - len(invalid), "errors": counts, "invalid": invalid}
+
+def verify_qa_file(path: str, rel_tol: float = DEFAULT_REL_TOL) -> Dict:
+    """Check the arithmetic of a JSON file holding a list of {"question", "answer"} pairs."""
+    with open(path) as f:
+        return verify_qa_pairs(json.load(f), rel_tol)
+
+def _parse_sum(tokens, position, depth):
+    value, position = _parse_product(tokens, position, depth)
+    while position < len(tokens) and tokens[position] in ("+", "-"):
+        operator = tokens[position]
+        operand, position = _parse_product(tokens, position + 1, depth)
+        value = _apply(value, operator, operand)
+    return value, position
+
+def _parse_product(tokens, position, depth):
+    value, position = _parse_factor(tokens, position, depth)
+    while position < len(tokens) and (tokens[position] in MULTIPLY or tokens[position] in DIVIDE):
+        operator = tokens[position]
+        operand, position = _parse_factor(tokens, position + 1, depth)
+        value = _apply(value, operator, operand)
+    return value, position
+
+def _parse_factor(tokens, position, depth):
+    if position >= len(tokens):
+        raise ValueError("incomplete expression")
+    if depth > MAX_NESTING:
+        raise ValueError(f"expression nested more than {MAX_NESTING} levels deep")
+    token = tokens[position]
+    if token == "-":
+        value, position = _parse_factor(tokens, position + 1, depth + 1)
+        return -value, position
+    if token == "+":
+        return _parse_factor(tokens, position + 1, depth + 1)
+    if token == "(":
+        value, position = _parse_sum(tokens, position + 1, depth + 1)
+        if position >= len(tokens) or tokens[position] != ")":
+            raise ValueError("unbalanced parentheses")
+        return value, position + 1
+    return _number(token), position + 1
+
+def _apply(left, operator, right):
+    if operator in MULTIPLY:
+        value = left * right
+    elif operator in DIVIDE:
+        value = left / right
+    elif operator == "+":
+        value = left + right
+    elif operator == "-":
+        value = left - right
+    else:
+        raise ValueError(f"unsupported operator {operator!r}")
+    if not math.isfinite(value):
+        raise ValueError("result out of range")
+    return value
+
+def _rounding_tolerance(decimals):
+    return ROUNDING_TOLERANCE[decimals] if decimals < len(ROUNDING_TOLERANCE) else 0.0
+
+def _number(token):
+    try:
+        value = float(token.replace(",", ""))
+    except ValueError:
+        raise ValueError(f"unexpected {token!r}") from None
+    if not math.isfinite(value):
+        raise ValueError(f"number out of range: {token[:20]}...")
+    return value
+
+if __name__ == "__main__":
+    for path in sys.argv[1:]:
+        report = verify_qa_file(path)
+        print(f"{path}: {report['valid']}/{report['pairs']} pairs with correct arithmetic, problems: {report['errors']}")
+        for index, errors in report["invalid"]:
+            for kind, detail in errors:
+                print(f"  pair {index}: {kind}: {detail}")
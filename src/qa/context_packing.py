@@ -0,0 +1,183 @@
+import math
+import re
+import threading
+from typing import List, Optional, Tuple
+from langchain.schema import Document
+from src.document_creation import ROW_DOCUMENT_SECTIONS
+from src.qa.hybrid_retriever import RRF_K, TOKEN_PATTERN
+
+# Prompt token estimate: words and numbers count one token each, as does every punctuation mark
+ESTIMATE_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+# Row fields kept when the query mentions none
+ROW_DEFAULT_FIELDS = ("Category", "Amount", "Channel")
+
+# Words of row field labels and columns too generic to count as a mention of the field
+GENERIC_FIELD_WORDS = {
+    "customer", "id", "level", "time", "used", "member", "program", "purchase", "product", "rate", "spent", "with",
+    "for", "shopping",
+}
+
+# Further query words that mention a row field
+ROW_FIELD_ALIASES = {
+    "Amount": ("spend", "spent", "spending", "revenue", "sales", "price", "cost", "dollar"),
+    "Frequency": ("often", "times"),
+    "Date": ("month", "year", "day"),
+}
+
+# Segment documents with less budget left than this are dropped rather than cut
+MIN_TRUNCATED_TOKENS = 24
+
+def estimate_tokens(text: str) -> int:
+    """Approximate prompt token count of a text."""
+    return len(ESTIMATE_PATTERN.findall(text))
+
+def _field_keywords():
+    """Stems (first five letters) of the query words that mention each row field label."""
+    keywords = {}
+    for _, fields in ROW_DOCUMENT_SECTIONS:
+        for label, column, _ in fields:
+            words = set(TOKEN_PATTERN.findall(f"{label} {column}".lower())) - GENERIC_FIELD_WORDS
+            words.update(ROW_FIELD_ALIASES.get(label, ()))
+            keywords[label] = {word[:5] for word in words if len(word) > 2 and not word.isdigit()}
+    return keywords
+
+ROW_FIELD_KEYWORDS = _field_keywords()
+
+def compress_row(text: str, query_words: set) -> str:
+    """
+    One-line version of a customer row document with only the fields the query mentions.
+
+    A field is mentioned when the query names it (its label, column or an alias) or
+    contains its value ("Female", "Online"). Without any, ROW_DEFAULT_FIELDS are kept.
+    """
+    lines = text.split("\n")
+    fields = []
+    for line in lines[1:]:
+        _, _, values = line.partition(": ")
+        fields.extend(field.partition(": ")[::2] for field in values.split(" | "))
+    kept = []
+    for label, value in fields:
+        stems = ROW_FIELD_KEYWORDS.get(label, ())
+        value_words = TOKEN_PATTERN.findall(value.lower())
+        if (any(word.startswith(stem) for stem in stems for word in query_words)
+                or value_words and not value_words[0].isdigit() and query_words.issuperset(value_words)):
+            kept.append(f"{label}: {value}")
+    if not kept:
+        kept = [f"{label}: {value}" for label, value in fields if label in ROW_DEFAULT_FIELDS]
+    return f"{lines[0]} {' | '.join(kept)}"
+
+def _document_key(doc: Document) -> Tuple:
+    """Identity of the segment or customer a document describes."""
+    metadata = doc.metadata
+    if "segment_name" in metadata:
+        return metadata.get("doc_type"), metadata["segment_name"]
+    if "row_idx" in metadata:
+        return metadata.get("doc_type"), metadata["row_idx"]
+    return None, " ".join(doc.page_content.split())
+
+def _truncate(text: str, budget: int) -> Optional[str]:
+    """Leading lines of a document that fit in `budget` tokens, or None if too few do."""
+    kept, tokens = [], 0
+    for line in text.split("\n"):
+        line_tokens = estimate_tokens(line)
+        if tokens + line_tokens > budget:
+            break
+        kept.append(line)
+        tokens += line_tokens
+    return "\n".join(kept) if tokens >= MIN_TRUNCATED_TOKENS else None
+
+class ContextPacker:
+    """
+    Packs retrieved documents into a prompt context of at most `token_budget` tokens.
+
+    Documents that describe the same segment or customer (or whose lines all
+    appear in an earlier document) are kept once, customer rows are compressed
+    to the fields the query mentions (see compress_row), and documents are ordered
+    by the reciprocal rank fusion of their retrieval rank and a query-term overlap
+    rank. Documents are added in that order while they fit; a segment document
+    that no longer fits is cut after its last whole line that does. Each call
+    prints its token savings against joining every full document, and the
+    totals are kept for summary().
+
+    Args:
+        token_budget: Maximum estimated tokens of the packed context.
+    """
+
+    def __init__(self, token_budget: int):
+        self.token_budget = token_budget
+        self.calls = 0
+        self.original_tokens = 0
+        self.packed_tokens = 0
+        self._lock = threading.Lock()
+
+    def pack(self, docs: List[Document], query: str) -> str:
+        """The packed context for a query's retrieved documents."""
+        original_tokens = estimate_tokens("\n\n".join(doc.page_content for doc in docs))
+        query_words = set(TOKEN_PATTERN.findall(query.lower()))
+
+        unique, seen_keys, seen_lines = [], set(), set()
+        for doc in docs:
+            key = _document_key(doc)
+            lines = {line.strip() for line in doc.page_content.split("\n") if line.strip()}
+            if key in seen_keys or lines <= seen_lines:
+                continue
+            seen_keys.add(key)
+            seen_lines |= lines
+            unique.append(doc)
+
+        texts = [
+            compress_row(doc.page_content, query_words) if doc.metadata.get("doc_type") == "customer_row"
+            else doc.page_content
+            for doc in unique
+        ]
+        ordered = [texts[i] for i in self._order(texts, query_words)]
+
+        packed, tokens = [], 0
+        for text in ordered:
+            text_tokens = estimate_tokens(text)
+            if tokens + text_tokens > self.token_budget:
+                truncated = _truncate(text, self.token_budget - tokens) if "\n" in text else None
+                if truncated is None:
+                    continue
+                text, text_tokens = truncated, estimate_tokens(truncated)
+            packed.append(text)
+            tokens += text_tokens
+        context = "\n\n".join(packed)
+
+        packed_tokens = estimate_tokens(context)
+        with self._lock:
+            self.calls += 1
+            self.original_tokens += original_tokens
+            self.packed_tokens += packed_tokens
+        saved = 1 - packed_tokens / original_tokens if original_tokens else 0
+        print(f"Packed context: {len(packed)} of {len(docs)} documents, {original_tokens} -> {packed_tokens} "
+              f"tokens ({saved:.0%} saved)")
+        return context
+
+    def _order(self, texts: List[str], query_words: set) -> List[int]:
+        """Indexes of `texts` by the fused retrieval and query-term overlap ranks."""
+        terms = [set(TOKEN_PATTERN.findall(text.lower())) for text in texts]
+        # Query words found in every document do not tell them apart
+        weights = {}
+        for word in query_words:
+            frequency = sum(word in document_terms for document_terms in terms)
+            if frequency:
+                weights[word] = math.log(len(texts) / frequency)
+        overlap = [sum(weight for word, weight in weights.items() if word in document_terms) for document_terms in terms]
+        lexical_rank = {i: rank for rank, i in enumerate(sorted(range(len(texts)), key=lambda i: -overlap[i]))}
+        score = [1 / (RRF_K + i + 1) + 1 / (RRF_K + lexical_rank[i] + 1) for i in range(len(texts))]
+        return sorted(range(len(texts)), key=lambda i: -score[i])
+
+    def summary(self) -> str:
+        if not self.calls:
+            return "no contexts packed"
+        saved = 1 - self.packed_tokens / self.original_tokens if self.original_tokens else 0
+        return (f"{self.calls} contexts, {self.original_tokens / self.calls:.0f} -> "
+                f"{self.packed_tokens / self.calls:.0f} tokens per call ({saved:.0%} saved)")
+
+def build_context(docs: List[Document], query: str, packer: Optional[ContextPacker] = None) -> str:
+    """Prompt context for retrieved documents: packed with `packer`, otherwise every full document."""
+    if packer is None:
+        return "\n\n".join(doc.page_content for doc in docs)
+    return packer.pack(docs, query)
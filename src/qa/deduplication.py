@@ -0,0 +1,201 @@
+import string
+import time
+import zlib
+from array import array
+from typing import Dict, Hashable, List, Optional, Tuple
+import numpy as np
+
+# Punctuation (except the decimal point) and whitespace become spaces and thousands separators
+# are dropped, so numbers stay whole ("$1,200.50" -> "1200.50") and questions built from the
+# same template with different figures stay distinct
+NORMALIZE_TABLE = str.maketrans({**{c: " " for c in string.punctuation + string.whitespace}, ".": ".", ",": None})
+
+# Near-duplicates share at least this fraction (Jaccard similarity) of their shingles
+DEFAULT_THRESHOLD = 0.8
+
+# MinHash permutations (split into LSH bands)
+NUM_PERM = 128
+
+# Odd multipliers combining the hashes of the three words of a shingle
+SHINGLE_MULTIPLIERS = (0x9E3779B1, 0x85EBCA77, 0xC2B2AE3D)
+
+# Candidates whose MinHash estimate falls this far below the threshold are not checked
+# exactly (about four standard deviations of the estimate with 128 permutations)
+ESTIMATE_MARGIN = 0.15
+
+def normalize_question(text: str) -> str:
+    """Lowercase a question and reduce it to words and numbers (markdown, punctuation and "$" are dropped)."""
+    return " ".join(text.lower().translate(NORMALIZE_TABLE).replace(". ", " ").split()).strip(".")
+
+class NearDuplicateIndex:
+    """
+    MinHash/LSH index of questions for finding near-duplicates.
+
+    Each question is reduced to shingles of three consecutive words and a
+    MinHash signature of `num_perm` values, split into bands. Questions sharing
+    any band are candidates. Their full signatures are compared in one numpy
+    operation, and only candidates whose estimated similarity comes close to
+    the threshold are confirmed by the exact Jaccard similarity of their
+    shingles. A check therefore costs a fixed amount of hashing plus a small
+    vectorized cost per candidate, rather than a comparison with every indexed
+    question. Exact duplicates (after normalization) are found by a dictionary
+    lookup before any hashing.
+
+    Words are hashed with CRC32 and the MinHash permutations (x * a + b modulo
+    2**32, with odd a) are drawn from `seed`, so results are the same across
+    runs and processes.
+    """
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD, num_perm: int = NUM_PERM, seed: int = 0):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands, self.rows = lsh_bands(threshold, num_perm)
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(0, 1 << 31, size=num_perm, dtype=np.uint32) * np.uint32(2) + np.uint32(1)
+        self.b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint32)
+        self.word_hashes = {}
+        self.buckets = [{} for _ in range(self.bands)]
+        self.exact = {}
+        self.keys = []
+        self.shingles = []
+        self.signatures = np.empty((1024, num_perm), dtype=np.uint32)
+        self.added = 0
+        self.duplicates = 0
+        self.seconds = 0.0
+
+    def __len__(self):
+        return len(self.keys)
+
+    def find(self, text: str) -> Optional[Hashable]:
+        """Key of an indexed near-duplicate of `text`, or None (nothing is inserted)."""
+        normalized = normalize_question(text)
+        if normalized in self.exact:
+            return self.keys[self.exact[normalized]]
+        shingles = self._shingles(normalized)
+        signature = self._signature(shingles)
+        position = self._find_similar(shingles, signature, self._band_keys(signature))
+        return None if position is None else self.keys[position]
+
+    def add(self, text: str, key: Hashable = None) -> Optional[Hashable]:
+        """
+        Index `text` unless it is a near-duplicate of an indexed question.
+
+        Args:
+            text: Question text.
+            key: Returned when a later question duplicates this one (default: insertion number).
+
+        Returns:
+            Key of the near-duplicate found (`text` is then not indexed), or None if `text` was added.
+        """
+        start = time.perf_counter()
+        try:
+            normalized = normalize_question(text)
+            if normalized in self.exact:
+                self.duplicates += 1
+                return self.keys[self.exact[normalized]]
+            shingles = self._shingles(normalized)
+            signature = self._signature(shingles)
+            band_keys = self._band_keys(signature)
+            position = self._find_similar(shingles, signature, band_keys)
+            if position is not None:
+                self.duplicates += 1
+                return self.keys[position]
+
+            position = len(self.keys)
+            if position == len(self.signatures):
+                self.signatures = np.concatenate([self.signatures, np.empty_like(self.signatures)])
+            self.signatures[position] = signature
+            self.keys.append(self.added if key is None else key)
+            self.shingles.append(shingles)
+            self.exact[normalized] = position
+            for buckets, band_key in zip(self.buckets, band_keys):
+                bucket = buckets.get(band_key)
+                if bucket is None:
+                    buckets[band_key] = array("q", [position])
+                else:
+                    bucket.append(position)
+            self.added += 1
+            return None
+        finally:
+            self.seconds += time.perf_counter() - start
+
+    def summary(self) -> str:
+        """Checked, duplicate and throughput counts for a progress report."""
+        checked = self.added + self.duplicates
+        rate = self.duplicates / checked if checked else 0.0
+        throughput = f", {checked / self.seconds:,.0f} checks/s" if self.seconds else ""
+        return f"{self.duplicates} of {checked} near-duplicates ({rate:.1%}){throughput}"
+
+    def _shingles(self, normalized):
+        """Hashes of the overlapping three-word sequences of a normalized question."""
+        word_hashes = self.word_hashes
+        hashes = []
+        for word in normalized.split():
+            word_hash = word_hashes.get(word)
+            if word_hash is None:
+                word_hash = word_hashes[word] = zlib.crc32(word.encode())
+            hashes.append(word_hash)
+        if len(hashes) < 3:
+            # Shorter questions are a single shingle
+            hashes = (hashes + [0, 0, 0])[:3]
+        m1, m2, m3 = SHINGLE_MULTIPLIERS
+        return frozenset([(x * m1 + y * m2 + z * m3) & 0xFFFFFFFF for x, y, z in zip(hashes, hashes[1:], hashes[2:])])
+
+    def _signature(self, shingles):
+        hashes = np.fromiter(shingles, dtype=np.uint32, count=len(shingles))
+        return (np.multiply.outer(hashes, self.a) + self.b).min(axis=0)
+
+    def _band_keys(self, signature):
+        signature = signature.tobytes()
+        size = 4 * self.rows
+        return [signature[i:i + size] for i in range(0, len(signature), size)]
+
+    def _find_similar(self, shingles, signature, band_keys):
+        buckets = [buckets[band_key] for buckets, band_key in zip(self.buckets, band_keys) if band_key in buckets]
+        if not buckets:
+            return None
+        candidates = np.unique(np.concatenate([np.frombuffer(bucket, dtype=np.int64) for bucket in buckets]))
+        estimates = np.count_nonzero(self.signatures[candidates] == signature, axis=1)
+        close = np.flatnonzero(estimates >= (self.threshold - ESTIMATE_MARGIN) * self.num_perm)
+        for position in candidates[close[np.argsort(-estimates[close], kind="stable")]].tolist():
+            other = self.shingles[position]
+            common = len(shingles & other)
+            if common >= self.threshold * (len(shingles) + len(other) - common):
+                return position
+        return None
+
+def lsh_bands(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """
+    Split `num_perm` MinHash values into (bands, rows per band) for a similarity threshold.
+
+    Two questions of Jaccard similarity s become candidates with probability
+    1 - (1 - s**rows)**bands, which rises steeply around (1 / bands) ** (1 / rows).
+    The split whose rise lies closest to the threshold without exceeding it is
+    chosen, so near-duplicates are rarely missed and the extra candidates are
+    removed by the exact check.
+    """
+    splits = [(num_perm // rows, rows) for rows in range(1, num_perm + 1) if num_perm % rows == 0]
+    below = [(bands, rows) for bands, rows in splits if (1 / bands) ** (1 / rows) <= threshold]
+    return max(below or splits[:1], key=lambda split: (1 / split[0]) ** (1 / split[1]))
+
+def deduplicate_qa_pairs(qa_pairs: List[Dict[str, str]], threshold: float = DEFAULT_THRESHOLD,
+                         index: Optional[NearDuplicateIndex] = None) -> Tuple[List[Dict[str, str]], List[Tuple[int, Hashable]]]:
+    """
+    Drop QA pairs whose question is a near-duplicate of an earlier one.
+
+    With an existing `index`, questions already indexed count as earlier ones and
+    the kept pairs are added to it.
+
+    Returns:
+        The kept pairs (in order) and a list of (dropped index, key of the question it duplicates).
+    """
+    index = index if index is not None else NearDuplicateIndex(threshold)
+    kept = []
+    dropped = []
+    for i, qa_pair in enumerate(qa_pairs):
+        duplicate_of = index.add(qa_pair.get("question", ""), key=i)
+        if duplicate_of is None:
+            kept.append(qa_pair)
+        else:
+            dropped.append((i, duplicate_of))
+    return kept, dropped
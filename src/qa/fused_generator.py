@@ -0,0 +1,63 @@
+from typing import Tuple
+from langchain.prompts import PromptTemplate
+from src.qa.context_packing import ContextPacker, build_context
+from src.qa.llm_backend import LLMBackend
+from src.qa.qa_formatter import parse_structured_qa
+
+def generate_formatted_qa(llm: LLMBackend, retriever, question: str,
+                          context_packer: ContextPacker = None) -> Tuple[str, dict[str, str]]:
+    """
+    Answer a question and write it in GSM8K format in a single LLM call.
+
+    Replaces answer_question followed by format_qa_pair: the model gets the
+    retrieved context and the format rules at once and returns a JSON object,
+    requested with the backend's JSON output mode where it has one.
+
+    Args:
+        llm: LLM backend.
+        retriever: Retriever for the question's context.
+        question: Generated question.
+        context_packer: Optional packer fitting the retrieved documents into a token budget.
+
+    Returns:
+        The raw completion (kept as the original answer) and the formatted QA pair.
+    """
+    fused_template = """
+    You are an expert mathematician writing e-commerce word problems and solutions in the GSM8K dataset format.
+
+    QUESTION:
+    {question}
+
+    Use the following e-commerce data to fill in the numbers:
+    {context}
+
+    Rewrite the question as a self-contained word problem that states every value needed, reads like a
+    real-world scenario without referring to "the data", and ends with a clear mathematical question.
+    Then solve it step by step, one step per line. Write every calculation as
+    "X operation Y = <<X operation Y=result>>result" and end with a line "#### [numerical answer]".
+
+    EXAMPLE:
+    {{"question": "An online store sold 240 items in the electronics category and 180 items in the clothing category last month. If electronics items cost $85 on average and clothing items cost $45 on average, what was the total revenue from both categories?",
+     "answer": "Electronics revenue = 240 * 85 = <<240*85=20400>>20400\\nClothing revenue = 180 * 45 = <<180*45=8100>>8100\\nTotal revenue = 20400 + 8100 = <<20400+8100=28500>>28500\\n#### 28500"}}
+
+    Respond with a JSON object with the keys "question" and "answer" only.
+    """
+
+    fused_prompt = PromptTemplate(
+        input_variables=["question", "context"],
+        template=fused_template,
+    )
+
+    print(f"Retrieving context for question: '{question[:50]}...'")
+    docs = retriever.get_relevant_documents(question)
+    context_text = build_context(docs, question, context_packer)
+
+    print("Generating formatted QA pair...")
+    response = llm.invoke(
+        fused_prompt.format(
+            question=question,
+            context=context_text
+        ),
+        format="json",
+    )
+    return response, parse_structured_qa(response, question)
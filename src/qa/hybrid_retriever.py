@@ -0,0 +1,269 @@
+import math
+import re
+from collections import Counter
+from itertools import product
+from typing import Dict, List, Tuple
+import numpy as np
+from langchain.schema import Document
+from config.settings import SINGLE_DIMENSIONS, MULTI_DIMENSIONS
+from src.document_store import CompactDocumentStore
+from src.metadata_index import MetadataIndex
+from src.vector_index import filtered_search
+
+# Candidates fetched from the vector search for every document returned
+DENSE_FETCH_MULTIPLIER = 4
+
+# Reciprocal rank fusion constant: a document's score is sum(1 / (RRF_K + rank)) over the rankings
+RRF_K = 60
+
+# Specificity of candidates that matched no segment criteria
+UNMATCHED = (-1, -2)
+
+# BM25 term-frequency saturation and document-length normalization
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Segment values that are also everyday words or shared flags; they only count as a
+# mention when the query also names their dimension ("Payment Method: Other")
+GENERIC_VALUES = {"Other", "Mixed", "True", "False"}
+
+def index_vector_store(vector_store) -> MetadataIndex:
+    """
+    MetadataIndex over a FAISS vector store's documents, in FAISS id order so positions double as search ids.
+
+    A CompactDocumentStore contributes its compact records rather than a LangChain Document per document.
+    """
+    id_map = vector_store.index_to_docstore_id
+    docstore = vector_store.docstore
+    lookup = docstore.get if isinstance(docstore, CompactDocumentStore) else docstore.search
+    return MetadataIndex(lookup(id_map[i]) for i in range(vector_store.index.ntotal))
+
+def _phrase_pattern(phrase: str) -> str:
+    """Regex for a vocabulary phrase: any case and separator, optionally in the plural."""
+    words = [re.escape(word) for word in re.split(r"[\s_]+", phrase.strip())]
+    last = words[-1]
+    if last[-1:].isalpha():
+        words[-1] = f"{last[:-1]}(?:y|ies)" if last.endswith("y") else f"{last}(?:s|es)?"
+    return r"[\s_-]+".join(words)
+
+def _alternation(phrases) -> Tuple[re.Pattern, List[str]]:
+    """
+    Whole-word pattern matching any of the phrases, longest first ("High School" before "High").
+
+    Returns the pattern and the ordered phrases; phrase i is captured by group i + 1.
+    """
+    ordered = sorted(phrases, key=len, reverse=True)
+    return re.compile(r"(?<!\w)(?:" + "|".join(f"({_phrase_pattern(p)})" for p in ordered) + r")(?!\w)",
+                      re.IGNORECASE), ordered
+
+class SegmentVocabulary:
+    """
+    Dimension and segment value mentions in a query.
+
+    Dimension names are the SINGLE_DIMENSIONS and MULTI_DIMENSIONS names and columns
+    (plus "Age" for Age_Group); segment values are those of the indexed segment
+    statistics documents, which include the AGE_GROUPS labels. A value shared by
+    several dimensions ("High" is an income level and a social media influence) or
+    listed in GENERIC_VALUES only counts for the dimensions the query also names.
+    """
+
+    def __init__(self, values_by_dimension: Dict[str, List[str]]):
+        names = {}
+        for dim in SINGLE_DIMENSIONS:
+            names.setdefault(dim["column"], set()).update({dim["name"], dim["column"]})
+        for combo in MULTI_DIMENSIONS:
+            names.setdefault(combo["dim1"], set()).update({combo["name1"], combo["dim1"]})
+            names.setdefault(combo["dim2"], set()).update({combo["name2"], combo["dim2"]})
+        # Age groups are derived from the Age column
+        names.setdefault("Age_Group", set()).update({"Age Group", "Age"})
+
+        dimension_by_name = {}
+        for column, column_names in names.items():
+            for name in column_names:
+                dimension_by_name[" ".join(re.split(r"[\s_]+", name.lower()))] = column
+        self.name_pattern, self.names = _alternation(dimension_by_name)
+        self.name_dimensions = [dimension_by_name[name] for name in self.names]
+
+        dimensions_by_value = {}
+        for column, values in values_by_dimension.items():
+            if column not in names:
+                continue
+            for value in values:
+                if TOKEN_PATTERN.search(value.lower()) and value != "N/A":
+                    dimensions_by_value.setdefault(value, []).append(column)
+        self.value_pattern, self.values = _alternation(dimensions_by_value) if dimensions_by_value else (None, [])
+        self.value_dimensions = [dimensions_by_value[value] for value in self.values]
+
+    @classmethod
+    def from_index(cls, metadata_index: MetadataIndex) -> "SegmentVocabulary":
+        """Vocabulary of the segment statistics documents in a MetadataIndex."""
+        values_by_dimension = {}
+        for doc in metadata_index.match({"doc_type": "segment_statistics"}):
+            values_by_dimension.setdefault(doc.metadata["dimension"], []).append(doc.metadata["segment_value"])
+        return cls(values_by_dimension)
+
+    def extract(self, query: str) -> Tuple[List[str], Dict[str, List[str]]]:
+        """(mentioned dimensions, {dimension: mentioned values}), both in order of appearance."""
+        named = {}
+        for match in self.name_pattern.finditer(query):
+            named[self.name_dimensions[match.lastindex - 1]] = True
+        values = {}
+        if self.value_pattern is not None:
+            for match in self.value_pattern.finditer(query):
+                value = self.values[match.lastindex - 1]
+                candidates = self.value_dimensions[match.lastindex - 1]
+                if len(candidates) > 1 or value in GENERIC_VALUES:
+                    candidates = [dim for dim in candidates if dim in named]
+                for dim in candidates:
+                    if value not in values.setdefault(dim, []):
+                        values[dim].append(value)
+        dimensions = list(dict.fromkeys([*values, *named]))
+        return dimensions, values
+
+class HybridRetriever:
+    """
+    Retriever that narrows the vector search to the segments a query mentions.
+
+    Dimension and value mentions (see SegmentVocabulary) select the matching
+    segment statistics documents and the multi-dimension documents of every
+    MULTI_DIMENSIONS pair involving them; customer rows with all the mentioned
+    values are added only when fewer than k segment documents match. The vector
+    search runs over those candidates only. Candidates are ordered by how closely
+    their segment matches the mentions, then by the reciprocal rank fusion of the
+    vector ranking and a BM25 ranking of their text. Queries without mentions fall
+    back to a plain vector search.
+
+    Args:
+        vector_store: LangChain FAISS vector store.
+        embeddings: Embeddings used to embed queries.
+        k: Documents returned per query.
+        metadata_index: MetadataIndex over the store (see index_vector_store); built if omitted.
+    """
+
+    search_type = "hybrid"
+
+    def __init__(self, vector_store, embeddings, k: int = 5, metadata_index: MetadataIndex = None):
+        self.vector_store = vector_store
+        self.embeddings = embeddings
+        self.search_kwargs = {"k": k}
+        self.metadata_index = metadata_index if metadata_index is not None else index_vector_store(vector_store)
+        self.vocabulary = SegmentVocabulary.from_index(self.metadata_index)
+        self.term_counts = {}
+        self.queries = 0
+        self.filtered = 0
+        self.candidates = 0
+
+    def get_relevant_documents(self, query: str) -> List[Document]:
+        k = self.search_kwargs["k"]
+        self.queries += 1
+        query_vector = [self.embeddings.embed_query(query)]
+        segments, candidates = self.candidate_positions(query)
+        if len(candidates) == 0:
+            _, ids = self.vector_store.index.search(np.asarray(query_vector, dtype=np.float32), k)
+            return [self.metadata_index.documents[i] for i in ids[0] if i >= 0]
+        self.filtered += 1
+        self.candidates += len(candidates)
+
+        fetch_k = min(k * DENSE_FETCH_MULTIPLIER, len(candidates))
+        _, ids = filtered_search(self.vector_store.index, query_vector, fetch_k, candidates)
+        dense = [int(i) for i in ids[0] if i >= 0]
+        dense_rank = {position: rank for rank, position in enumerate(dense)}
+        pool = list(dict.fromkeys([*segments, *dense]))
+
+        scores = Counter()
+        for ranking in (dense, self.bm25_ranking(query, pool)):
+            for rank, position in enumerate(ranking):
+                scores[position] += 1 / (RRF_K + rank + 1)
+        # Customer rows rank below every segment document
+        ranked = sorted(pool, key=lambda p: (segments.get(p, UNMATCHED), scores[p]), reverse=True)
+        return [self.metadata_index.documents[i] for i in ranked[:k]]
+
+    def invoke(self, query: str) -> List[Document]:
+        return self.get_relevant_documents(query)
+
+    def candidate_positions(self, query: str) -> Tuple[Dict[int, Tuple[int, int]], np.ndarray]:
+        """
+        Metadata pre-filter for a query.
+
+        Returns ({segment document position: specificity}, sorted positions of every
+        candidate document); both are empty without mentions. The specificity is
+        (mentioned values the document matches, minus its dimensions the query does
+        not mention), so "Female + Online" ranks the Gender x Purchase Channel
+        document first, then the Female and Online documents, then other documents
+        with Female or Online. Customer rows are only candidates when fewer than k
+        segment documents match.
+        """
+        dimensions, values = self.vocabulary.extract(query)
+        segments = {}
+        if not dimensions:
+            return segments, np.zeros(0, dtype=np.int64)
+        index = self.metadata_index
+
+        for dim in dimensions:
+            for value in values.get(dim, [None]):
+                criteria = {"doc_type": "segment_statistics", "dimension": dim}
+                if value is not None:
+                    criteria["segment_value"] = value
+                for position in index.positions(criteria):
+                    segments[int(position)] = (int(value is not None), 0)
+
+        # Multi-dimension documents of every pair with a mentioned dimension, narrowed
+        # to the mentioned values of either dimension
+        for combo in MULTI_DIMENSIONS:
+            dim1, dim2 = combo["dim1"], combo["dim2"]
+            covered = (dim1 in dimensions) + (dim2 in dimensions)
+            if not covered:
+                continue
+            for value1, value2 in product(values.get(dim1, [None]), values.get(dim2, [None])):
+                criteria = {"doc_type": "multi_segment_statistics", "dimension1": dim1, "dimension2": dim2}
+                if value1 is not None:
+                    criteria["value1"] = value1
+                if value2 is not None:
+                    criteria["value2"] = value2
+                for position in index.positions(criteria):
+                    segments[int(position)] = ((value1 is not None) + (value2 is not None), covered - 2)
+
+        positions = [np.fromiter(segments, dtype=np.int64, count=len(segments))]
+        # Customer rows carry the raw columns, so age groups cannot be matched on them
+        row_values = {dim: dim_values for dim, dim_values in values.items() if dim != "Age_Group"}
+        if row_values and len(segments) < self.search_kwargs["k"]:
+            for combination in product(*row_values.values()):
+                criteria = {"doc_type": "customer_row", **dict(zip(row_values, combination))}
+                positions.append(index.positions(criteria).astype(np.int64))
+        return segments, np.unique(np.concatenate(positions))
+
+    def bm25_ranking(self, query: str, positions: List[int]) -> List[int]:
+        """Positions ordered by the BM25 score of their text for the query, with statistics over `positions`."""
+        terms = set(TOKEN_PATTERN.findall(query.lower()))
+        documents = [self._term_counts(position) for position in positions]
+        if not documents or not terms:
+            return []
+        average_length = sum(length for _, length in documents) / len(documents) or 1
+        frequencies = {term: sum(term in counts for counts, _ in documents) for term in terms}
+        idf = {term: math.log(1 + (len(documents) - df + 0.5) / (df + 0.5)) for term, df in frequencies.items() if df}
+        scores = []
+        for position, (counts, length) in zip(positions, documents):
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+            score = sum(weight * counts[term] * (BM25_K1 + 1) / (counts[term] + norm)
+                        for term, weight in idf.items() if term in counts)
+            if score > 0:
+                scores.append((score, position))
+        scores.sort(key=lambda item: -item[0])
+        return [position for _, position in scores]
+
+    def _term_counts(self, position: int) -> Tuple[Counter, int]:
+        """Term counts and length of a document's text, computed once per document."""
+        cached = self.term_counts.get(position)
+        if cached is None:
+            tokens = TOKEN_PATTERN.findall(self.metadata_index.documents[position].page_content.lower())
+            cached = self.term_counts[position] = (Counter(tokens), len(tokens))
+        return cached
+
+    def summary(self) -> str:
+        if not self.queries:
+            return "no queries"
+        average = self.candidates / self.filtered if self.filtered else 0
+        return (f"{self.filtered} of {self.queries} queries pre-filtered by segment mentions "
+                f"({average:.0f} candidates on average)")
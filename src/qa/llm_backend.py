@@ -0,0 +1,240 @@
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, Iterator, List
+
+class LLMBackend:
+    """
+    Interface the QA modules use to call an LLM.
+
+    Backends implement invoke() for a single prompt; backends that can run many
+    prompts in one engine call override batch(). invoke() takes per-call options
+    such as format="json" for structured output, which backends without such a
+    mode ignore. `params` holds the sampling parameters (used in cache keys),
+    `prompt_tokens` counts input tokens and `generated_tokens` output tokens.
+    """
+
+    model: str = ""
+    params: Dict = {}
+    prompt_tokens: int = 0
+    generated_tokens: int = 0
+
+    def invoke(self, prompt: str, **options) -> str:
+        raise NotImplementedError
+
+    def batch(self, prompts: List[str]) -> List[str]:
+        return [self.invoke(prompt) for prompt in prompts]
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        """Yield the completion in chunks; closing the generator stops generation where supported."""
+        yield self.invoke(prompt)
+
+class OllamaBackend(LLMBackend):
+    """One HTTP request per prompt to an Ollama server."""
+
+    def __init__(self, model: str, **options):
+        from langchain_ollama.llms import OllamaLLM
+        self.model = model
+        self.llm = OllamaLLM(model=model, **options)
+        self.params = self.llm._default_params
+        self.prompt_tokens = 0
+        self.generated_tokens = 0
+        self._lock = threading.Lock()
+
+    def invoke(self, prompt: str, **options) -> str:
+        result = self.llm.generate([prompt], **options)
+        generation = result.generations[0][0]
+        info = generation.generation_info or {}
+        with self._lock:
+            self.prompt_tokens += info.get("prompt_eval_count", len(prompt.split()))
+            self.generated_tokens += info.get("eval_count", len(generation.text.split()))
+        return generation.text
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        # _stream() yields GenerationChunks; the final one carries Ollama's token counts.
+        # Ollama sends one token per chunk, which is the count if the stream is closed first.
+        chunks, info = 0, {}
+        try:
+            for chunk in self.llm._stream(prompt):
+                if chunk.generation_info:
+                    info = chunk.generation_info
+                if chunk.text:
+                    chunks += 1
+                    yield chunk.text
+        finally:
+            with self._lock:
+                self.prompt_tokens += info.get("prompt_eval_count", len(prompt.split()))
+                self.generated_tokens += info.get("eval_count", chunks)
+
+class TransformersBackend(LLMBackend):
+    """
+    Local causal LM run with Hugging Face transformers on CPU (or `device`).
+
+    batch() pads the prompts on the left and decodes them together in a single
+    generate() call, which is where batching pays off on a local engine.
+    stream() decodes one prompt in a background thread and stops at the next
+    decoding step once the generator is closed. Requires the optional `transformers` and `torch` packages.
+    """
+
+    def __init__(self, model: str, max_new_tokens: int = 512, temperature: float = 0.0, device: str = "cpu",
+                 **generate_options):
+        try:
+            import torch
+            from transformers import AutoModelForCausalLM, AutoTokenizer
+        except ImportError as e:
+            raise ImportError("TransformersBackend requires `pip install transformers torch`") from e
+        self.torch = torch
+        self.model = model
+        self.device = device
+        self.tokenizer = AutoTokenizer.from_pretrained(model, padding_side="left")
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+        self.engine = AutoModelForCausalLM.from_pretrained(model).to(device).eval()
+        self.generate_options = {"max_new_tokens": max_new_tokens, **generate_options}
+        if temperature > 0:
+            self.generate_options.update(do_sample=True, temperature=temperature)
+        else:
+            self.generate_options.update(do_sample=False)
+        self.params = {"model": model, **self.generate_options}
+        self.prompt_tokens = 0
+        self.generated_tokens = 0
+        self._lock = threading.Lock()
+
+    def invoke(self, prompt: str, **options) -> str:
+        # Output is not grammar-constrained here; structured output relies on the prompt
+        return self.batch([prompt])[0]
+
+    def batch(self, prompts: List[str]) -> List[str]:
+        inputs = self.tokenizer(prompts, return_tensors="pt", padding=True).to(self.device)
+        with self._lock, self.torch.no_grad():
+            outputs = self.engine.generate(**inputs, pad_token_id=self.tokenizer.pad_token_id, **self.generate_options)
+        new_tokens = outputs[:, inputs["input_ids"].shape[1]:]
+        self.prompt_tokens += int(inputs["attention_mask"].sum())
+        self.generated_tokens += int((new_tokens != self.tokenizer.pad_token_id).sum())
+        return self.tokenizer.batch_decode(new_tokens, skip_special_tokens=True)
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        from transformers import StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
+
+        inputs = self.tokenizer([prompt], return_tensors="pt").to(self.device)
+        prompt_length = inputs["input_ids"].shape[1]
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        closed = threading.Event()
+        state = {"length": prompt_length, "error": None}
+
+        class StopWhenClosed(StoppingCriteria):
+            def __call__(self, input_ids, scores, **kwargs):
+                state["length"] = input_ids.shape[1]
+                return closed.is_set()
+
+        def generate():
+            try:
+                with self._lock, self.torch.no_grad():
+                    self.engine.generate(
+                        **inputs, streamer=streamer, pad_token_id=self.tokenizer.pad_token_id,
+                        stopping_criteria=StoppingCriteriaList([StopWhenClosed()]), **self.generate_options,
+                    )
+            except Exception as e:
+                state["error"] = e
+                streamer.end()
+
+        thread = threading.Thread(target=generate, daemon=True)
+        thread.start()
+        try:
+            yield from streamer
+        finally:
+            closed.set()
+            thread.join()
+            with self._lock:
+                self.prompt_tokens += prompt_length
+                self.generated_tokens += state["length"] - prompt_length
+        if state["error"] is not None:
+            raise state["error"]
+
+class MicroBatchingLLM:
+    """
+    Collects concurrent invoke() calls into batch() calls on a backend.
+
+    Each invoke() queues its prompt and blocks; a worker thread takes up to
+    `max_batch_size` queued prompts, waiting at most `max_wait` seconds for a
+    batch to fill, and runs them in one backend call. With run_pipeline's
+    concurrent questions this fills batches across questions. Calls with
+    per-call options (e.g. format="json") cannot share a batch() call, so they
+    go straight to the backend's invoke().
+    """
+
+    def __init__(self, backend: LLMBackend, max_batch_size: int = 8, max_wait: float = 0.05):
+        self.backend = backend
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.batch_sizes = []
+        self._queue = []
+        self._condition = threading.Condition()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def invoke(self, prompt: str, **options) -> str:
+        if options:
+            return self.backend.invoke(prompt, **options)
+        future = Future()
+        with self._condition:
+            self._queue.append((prompt, future))
+            self._condition.notify_all()
+        return future.result()
+
+    def batch(self, prompts: List[str]) -> List[str]:
+        return self.backend.batch(prompts)
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        # A batched engine returns whole completions, so there is nothing to stop early;
+        # streaming only saves tokens with max_batch_size=1
+        yield self.invoke(prompt)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._queue:
+                    self._condition.wait()
+                deadline = time.monotonic() + self.max_wait
+                while len(self._queue) < self.max_batch_size and time.monotonic() < deadline:
+                    self._condition.wait(deadline - time.monotonic())
+                items = self._queue[:self.max_batch_size]
+                del self._queue[:self.max_batch_size]
+            self.batch_sizes.append(len(items))
+            try:
+                responses = self.backend.batch([prompt for prompt, _ in items])
+                for (_, future), response in zip(items, responses):
+                    future.set_result(response)
+            except Exception as e:
+                for _, future in items:
+                    future.set_exception(e)
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+def create_llm_backend(kind: str, model: str, max_batch_size: int = 1, max_wait: float = 0.05, **options):
+    """
+    Create the LLM used by the QA pipeline.
+
+    Args:
+        kind: "ollama" (one request per prompt) or "transformers" (local batched engine).
+        model: Model name (Ollama tag or Hugging Face model ID).
+        max_batch_size: If above 1, concurrent calls are micro-batched into backend.batch().
+            Only backends with a batched engine call (transformers) support it.
+        max_wait: Seconds to wait for a micro-batch to fill.
+        **options: Backend-specific options.
+    """
+    backend_classes = {"ollama": OllamaBackend, "transformers": TransformersBackend}
+    if kind not in backend_classes:
+        raise ValueError(f"Unknown LLM backend {kind!r}, expected 'ollama' or 'transformers'")
+    backend_class = backend_classes[kind]
+    if max_batch_size > 1 and backend_class.batch is LLMBackend.batch:
+        # The default batch() loops invoke() on the batching thread, which would serialize concurrent requests
+        raise ValueError(
+            f"The {kind!r} backend has no batched engine call; use a batch size of 1 "
+            f"(got {max_batch_size}) and QA_MAX_IN_FLIGHT for concurrency"
+        )
+    backend = backend_class(model, **options)
+    if max_batch_size > 1:
+        return MicroBatchingLLM(backend, max_batch_size, max_wait)
+    return backend
@@ -1,29 +1,80 @@
 import os
 import json
 import time
-from typing import List, Dict
-from langchain_ollama.llms import OllamaLLM
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Dict, Optional
 from langchain.vectorstores import FAISS
 from langchain_ollama import OllamaEmbeddings
+from src.vector_index import apply_search_params
 from src.qa.question_generator import generate_questions
 from src.qa.answer_generator import answer_question
+from src.qa.context_packing import ContextPacker
+from src.qa.arithmetic_verifier import find_arithmetic_errors
+from src.qa.deduplication import NearDuplicateIndex, deduplicate_qa_pairs
+from src.qa.fused_generator import generate_formatted_qa
+from src.qa.hybrid_retriever import HybridRetriever, index_vector_store
 from src.qa.qa_formatter import format_qa_pair, validate_single_qa_pair
+from src.qa.llm_backend import create_llm_backend
+from src.qa.rate_limiter import AdaptiveRateLimiter, RateLimitedLLM
+from src.qa.run_journal import RunJournal
+from src.qa.result_cache import ResultCache, CachedLLM, CachedRetriever, current_attempt
+from src.vector_store import vector_store_version
 
 class EcommerceQAPairGenerator:
     """Automated pipeline for generating QA pairs from e-commerce data using RAG."""
     
-    def __init__(self, vector_store_path: str, llm_model: str, output_dir: str, num_questions_per_category: int):
+    def __init__(self, vector_store_path: str, llm_model: str, output_dir: str, num_questions_per_category: int,
+                 index_search_params: Dict = None, max_in_flight: int = 1, latency_tolerance: Optional[float] = None,
+                 llm=None, retriever=None, cache_path: Optional[str] = None, cache_ttl_seconds: Optional[float] = None,
+                 cache_max_entries: Optional[int] = None, refresh_cache: bool = False,
+                 journal_path: Optional[str] = None, journal_batch_size: int = 16,
+                 llm_backend: str = "ollama", llm_batch_size: int = 1, llm_batch_wait: float = 0.05,
+                 llm_options: Dict = None, streaming: bool = False,
+                 fused_generation: bool = False, dedup_threshold: Optional[float] = None,
+                 hybrid_retrieval: bool = False, context_token_budget: Optional[int] = None):
         self.vector_store_path = vector_store_path
+        self.index_search_params = index_search_params
         self.llm_model = llm_model
         self.output_dir = output_dir
         self.num_questions_per_category = num_questions_per_category
+        self.max_in_flight = max_in_flight
+        self.rate_limiter = AdaptiveRateLimiter(max_in_flight, latency_tolerance=latency_tolerance)
+        self.llm = llm
+        self.llm_backend = llm_backend
+        self.llm_batch_size = llm_batch_size
+        self.llm_batch_wait = llm_batch_wait
+        self.llm_options = llm_options or {}
+        self.streaming = streaming
+        self.fused_generation = fused_generation
+        self.dedup_threshold = dedup_threshold
+        self.hybrid_retrieval = hybrid_retrieval
+        self.hybrid_retriever = None
+        self.context_packer = ContextPacker(context_token_budget) if context_token_budget else None
+        self.retriever = retriever
+        self.cache = ResultCache(cache_path, cache_ttl_seconds, cache_max_entries) if cache_path else None
+        self.refresh_cache = refresh_cache
+        self.journal_path = journal_path
+        self.journal_batch_size = journal_batch_size
         os.makedirs(output_dir, exist_ok=True)
         self._initialize_components()
     
     def _initialize_components(self):
-        """Initialize LLM, embeddings, and vector store."""
+        """Initialize LLM, embeddings, and vector store (unless an LLM and retriever were passed in)."""
         print("Initializing pipeline components...")
-        self.llm = OllamaLLM(model=self.llm_model)
+        if self.llm is None:
+            self.llm = create_llm_backend(
+                self.llm_backend, self.llm_model, self.llm_batch_size, self.llm_batch_wait, **self.llm_options
+            )
+        self.llm = RateLimitedLLM(self.llm, self.rate_limiter)
+        if self.retriever is None:
+            self._load_vector_store()
+        if self.cache is not None:
+            # Cache hits bypass the rate limiter; the index version invalidates cached retrievals on rebuilds
+            self.llm = CachedLLM(self.llm, self.cache, self.llm_model, refresh=self.refresh_cache)
+            self.retriever = CachedRetriever(self.retriever, self.cache, vector_store_version(self.vector_store_path))
+
+    def _load_vector_store(self):
+        """Load the FAISS vector store and build the retriever."""
         self.embeddings = OllamaEmbeddings(model="nomic-embed-text")
         try:
             self.vector_store = FAISS.load_local(
@@ -31,69 +82,181 @@ class EcommerceQAPairGenerator:
                 self.embeddings,
                 allow_dangerous_deserialization=True
             )
-            self.retriever = self.vector_store.as_retriever(search_kwargs={"k": 5})
+            apply_search_params(self.vector_store.index, self.index_search_params)
+            if self.hybrid_retrieval:
+                self.hybrid_retriever = HybridRetriever(
+                    self.vector_store, self.embeddings, k=5, metadata_index=index_vector_store(self.vector_store)
+                )
+                self.retriever = self.hybrid_retriever
+            else:
+                self.retriever = self.vector_store.as_retriever(search_kwargs={"k": 5})
             print(f"Successfully loaded vector store from {self.vector_store_path}")
         except Exception as e:
             print(f"Error loading vector store: {e}")
             raise
     
-    def run_pipeline(self, categories: List[str], num_questions_total: int) -> List[Dict[str, str]]:
-        """Run the complete QA pair generation pipeline."""
+    def run_pipeline(self, categories: List[str], num_questions_total: int, resume: bool = False,
+                     template_qa_pairs: Optional[List[Dict[str, str]]] = None) -> List[Dict[str, str]]:
+        """
+        Run the complete QA pair generation pipeline.
+
+        Questions are processed on a pool of `max_in_flight` threads, with the LLM
+        calls themselves throttled by the adaptive rate limiter. QA pairs are numbered
+        in category/question order, exactly as a sequential run would, and no more
+        questions are started once the first `num_questions_total` valid pairs in
+        that order are known. Questions for the next category are only generated
+        while the pairs still outstanding could fall short of that total.
+
+        Generated questions and per-question outcomes are recorded in the run
+        journal. With `resume`, the latest unfinished run with the same settings
+        is continued: its questions are reused and finished questions are skipped.
+
+        `template_qa_pairs` (e.g. from synthesize_qa_pairs) are written to the
+        final and GSM8K outputs after the LLM-generated pairs.
+
+        With a `dedup_threshold`, generated questions that are near-duplicates of
+        an earlier question are skipped before they are answered, and validated
+        pairs (and template pairs) whose formatted question is a near-duplicate
+        of an accepted one are dropped.
+        """
         all_formatted_qa_pairs = []
+        all_qa_pairs = []
+        question_index = pair_index = None
+        if self.dedup_threshold is not None:
+            question_index = NearDuplicateIndex(self.dedup_threshold)
+            pair_index = NearDuplicateIndex(self.dedup_threshold)
         questions_per_category = min(self.num_questions_per_category, max(1, num_questions_total // len(categories)))
         
         print(f"Starting pipeline to generate {num_questions_total} total QA pairs")
         print(f"Will generate {questions_per_category} questions per category")
+        print(f"Processing with up to {self.max_in_flight} concurrent LLM requests")
+        start_time = time.perf_counter()
+        prompt_tokens_before = getattr(self.llm, "prompt_tokens", 0)
+        generated_tokens_before = getattr(self.llm, "generated_tokens", 0)
+
+        journal = RunJournal(self.journal_path or ":memory:", batch_size=self.journal_batch_size)
+        run_id = journal.start_run({
+            "llm_model": self.llm_model,
+            "categories": categories,
+            "num_questions_total": num_questions_total,
+            "questions_per_category": questions_per_category,
+        }, resume=resume)
         
         try:
-            for category in categories:
-                if len(all_formatted_qa_pairs) >= num_questions_total:
-                    break
-                print(f"\n{'='*50}\nProcessing category: {category}\n{'='*50}")
-                
-                questions = generate_questions(self.llm, self.retriever, category, questions_per_category)
-                print(f"Generated {len(questions)} questions for category: {category}")
-                
-                for i, question in enumerate(questions):
-                    if len(all_formatted_qa_pairs) >= num_questions_total:
+            with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+                questions_by_category = journal.questions(run_id)
+                # Finished questions of a resumed run are not processed again
+                finished_results = journal.results(run_id)
+                if finished_results:
+                    print(f"Skipping {len(finished_results)} questions finished in a previous attempt")
+
+                tasks, results = [], []
+                pending = set()
+                next_task = 0
+                next_result = 0
+                # Categories are started in order, and their questions become tasks in order
+                next_generation = 0
+                next_category = 0
+                while len(all_formatted_qa_pairs) < num_questions_total:
+                    while next_category < next_generation and categories[next_category] in questions_by_category:
+                        category = categories[next_category]
+                        next_category += 1
+                        questions = questions_by_category[category]
+                        print(f"Generated {len(questions)} questions for category: {category}")
+                        for i, question in enumerate(questions):
+                            if question_index is not None:
+                                duplicate_of = question_index.add(question, key=(category, i))
+                                if duplicate_of is not None:
+                                    print(f"Skipping near-duplicate of question {duplicate_of[1]+1} in "
+                                          f"{duplicate_of[0]}: {question[:60]}...")
+                                    continue
+                            tasks.append((category, i, len(questions), question))
+                            results.append((finished_results[(category, i)],)
+                                           if (category, i) in finished_results else None)
+
+                    # Number results in task order as soon as their predecessors are done
+                    while next_result < len(tasks) and results[next_result] is not None:
+                        qa_pair = results[next_result][0]
+                        next_result += 1
+                        if qa_pair is None or len(all_formatted_qa_pairs) >= num_questions_total:
+                            continue
+                        if pair_index is not None and pair_index.add(qa_pair["formatted_question"]) is not None:
+                            print(f"Dropping near-duplicate QA pair: {qa_pair['formatted_question'][:60]}...")
+                            continue
+                        all_qa_pairs.append(qa_pair)
+                        all_formatted_qa_pairs.append({
+                            "question": qa_pair["formatted_question"],
+                            "answer": qa_pair["formatted_answer"]
+                        })
+                        print(f"Accepted QA pair {len(all_formatted_qa_pairs)}")
+                    if len(all_formatted_qa_pairs) >= num_questions_total or (
+                            next_result >= len(tasks) and next_category >= len(categories)):
                         break
-                    print(f"\n{'-'*50}\nProcessing question {i+1}/{len(questions)}: {question[:100]}...")
-                    
-                    try:
-                        max_attempts = 2
-                        for attempt in range(max_attempts):
-                            try:
-                                answer = answer_question(self.llm, self.retriever, question)
-                                formatted_qa = format_qa_pair(self.llm, question, answer)
-                                
-                                if validate_single_qa_pair(formatted_qa):
-                                    qa_pair = {
-                                        "original_question": question,
-                                        "original_answer": answer,
-                                        "formatted_question": formatted_qa["question"],
-                                        "formatted_answer": formatted_qa["answer"]
-                                    }
-                                    all_formatted_qa_pairs.append({
-                                        "question": formatted_qa["question"],
-                                        "answer": formatted_qa["answer"]
-                                    })
-                                    with open(f"{self.output_dir}/qa_pair_{len(all_formatted_qa_pairs)}.json", "w") as f:
-                                        json.dump(qa_pair, f, indent=2)
-                                    print(f"Successfully processed and saved QA pair {len(all_formatted_qa_pairs)}")
-                                    break
-                                else:
-                                    print(f"Attempt {attempt+1}: QA pair failed validation, trying again")
-                                    if attempt == max_attempts - 1:
-                                        print(f"Skipping question after {max_attempts} failed attempts")
-                            except Exception as e:
-                                print(f"Error in attempt {attempt+1}: {e}")
-                                if attempt == max_attempts - 1:
-                                    print(f"Skipping question after {max_attempts} failed attempts")
-                        time.sleep(0.5)
-                    except Exception as e:
-                        print(f"Error processing question: {e}")
-                        continue
+
+                    while next_task < len(tasks) and len(pending) < self.max_in_flight:
+                        if results[next_task] is None:
+                            future = executor.submit(self._process_question, *tasks[next_task])
+                            future.task_index = next_task
+                            pending.add(future)
+                        next_task += 1
+
+                    # Start another category only while the pairs still outstanding could fall short of the total
+                    while next_generation < len(categories) and len(pending) < self.max_in_flight:
+                        outstanding = len(tasks) - next_result + questions_per_category * (next_generation - next_category)
+                        if len(all_formatted_qa_pairs) + outstanding >= num_questions_total:
+                            break
+                        category = categories[next_generation]
+                        next_generation += 1
+                        if category not in questions_by_category:
+                            future = executor.submit(
+                                generate_questions, self.llm, self.retriever, category, questions_per_category,
+                                self.context_packer
+                            )
+                            future.category = category
+                            pending.add(future)
+
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    failed = [future for future in finished if hasattr(future, "category") and future.exception()]
+                    if failed:
+                        # Keep the questions of every other category for a resumed run before failing
+                        finished |= wait([future for future in pending if hasattr(future, "category")]).done
+                    for future in finished:
+                        if hasattr(future, "category"):
+                            if future.exception() is None:
+                                journal.record_questions(run_id, future.category, future.result())
+                                questions_by_category[future.category] = future.result()
+                            continue
+                        qa_pair = future.result()
+                        results[future.task_index] = (qa_pair,)
+                        category, index, _, question = tasks[future.task_index]
+                        journal.record_result(run_id, category, index, question, qa_pair)
+                    if failed:
+                        failed[0].result()
+
+                for future in pending:
+                    future.cancel()
+            journal.finish_run(run_id)
             
+            if self.cache is not None:
+                print(f"QA cache: {self.cache.hits} hits, {self.cache.misses} misses")
+            if all_formatted_qa_pairs:
+                pairs = len(all_formatted_qa_pairs)
+                prompt_tokens = getattr(self.llm, "prompt_tokens", 0) - prompt_tokens_before
+                generated_tokens = getattr(self.llm, "generated_tokens", 0) - generated_tokens_before
+                print(f"Per QA pair ({'single-call' if self.fused_generation else 'two-call'} generation): "
+                      f"{(time.perf_counter() - start_time) / pairs:.2f}s, {prompt_tokens / pairs:.0f} prompt tokens, "
+                      f"{generated_tokens / pairs:.0f} generated tokens")
+            if template_qa_pairs:
+                if pair_index is not None:
+                    template_qa_pairs, _ = deduplicate_qa_pairs(template_qa_pairs, index=pair_index)
+                print(f"Adding {len(template_qa_pairs)} template QA pairs")
+                all_formatted_qa_pairs.extend(template_qa_pairs)
+            if question_index is not None:
+                print(f"Deduplication: questions {question_index.summary()}; QA pairs {pair_index.summary()}")
+            if self.hybrid_retriever is not None:
+                print(f"Hybrid retrieval: {self.hybrid_retriever.summary()}")
+            if self.context_packer is not None:
+                print(f"Context packing: {self.context_packer.summary()}")
             gsm8k_format_pairs = self.convert_to_gsm8k_format(all_formatted_qa_pairs)
             final_output_path = f"{self.output_dir}/formatted_qa_pairs_final.json"
             with open(final_output_path, "w") as f:
@@ -101,6 +264,9 @@ class EcommerceQAPairGenerator:
             gsm8k_output_path = f"{self.output_dir}/gsm8k_formatted_qa_pairs.json"
             with open(gsm8k_output_path, "w") as f:
                 json.dump(gsm8k_format_pairs, f, indent=2)
+            detailed_output_path = f"{self.output_dir}/qa_pairs_detailed.json"
+            with open(detailed_output_path, "w") as f:
+                json.dump(all_qa_pairs, f, indent=2)
             
             print(f"\nPipeline complete! Generated {len(all_formatted_qa_pairs)} QA pairs")
             print(f"Final output saved to: {final_output_path}")
@@ -114,7 +280,47 @@ class EcommerceQAPairGenerator:
                 with open(recovery_path, "w") as f:
                     json.dump(all_formatted_qa_pairs, f, indent=2)
                 print(f"Saved {len(all_formatted_qa_pairs)} recovered QA pairs to: {recovery_path}")
+            print(f"Progress is saved in the run journal; rerun with --resume to continue run {run_id}")
             raise
+        finally:
+            journal.close()
+
+    def _process_question(self, category: str, index: int, num_questions: int, question: str) -> Optional[Dict[str, str]]:
+        """Answer and format one question, returning the QA pair or None if every attempt failed."""
+        print(f"\n{'-'*50}\n[{category}] Processing question {index+1}/{num_questions}: {question[:100]}...")
+        try:
+            max_attempts = 2
+            for attempt in range(max_attempts):
+                current_attempt.set(attempt)
+                try:
+                    if self.fused_generation:
+                        answer, formatted_qa = generate_formatted_qa(
+                            self.llm, self.retriever, question, self.context_packer
+                        )
+                    else:
+                        answer = answer_question(
+                            self.llm, self.retriever, question, stream=self.streaming,
+                            context_packer=self.context_packer,
+                        )
+                        formatted_qa = format_qa_pair(self.llm, question, answer, stream=self.streaming)
+                    
+                    if validate_single_qa_pair(formatted_qa):
+                        return {
+                            "original_question": question,
+                            "original_answer": answer,
+                            "formatted_question": formatted_qa["question"],
+                            "formatted_answer": formatted_qa["answer"]
+                        }
+                    print(f"Attempt {attempt+1}: QA pair failed validation, trying again")
+                    if attempt == max_attempts - 1:
+                        print(f"Skipping question after {max_attempts} failed attempts")
+                except Exception as e:
+                    print(f"Error in attempt {attempt+1}: {e}")
+                    if attempt == max_attempts - 1:
+                        print(f"Skipping question after {max_attempts} failed attempts")
+        except Exception as e:
+            print(f"Error processing question: {e}")
+        return None
     
     def convert_to_gsm8k_format(self, qa_pairs: List[Dict[str, str]]) -> List[Dict[str, str]]:
         """Convert QA pairs to the exact format needed for GSM8K-style GPTO fine-tuning."""
@@ -125,6 +331,9 @@ class EcommerceQAPairGenerator:
             if "<<" not in answer or ">>" not in answer or "####" not in answer:
                 print(f"Skipping pair with improper format: {question[:30]}...")
                 continue
+            if find_arithmetic_errors(answer):
+                print(f"Skipping pair with incorrect arithmetic: {question[:30]}...")
+                continue
             gsm8k_pairs.append({"question": question, "answer": answer})
         print(f"Converted {len(gsm8k_pairs)}/{len(qa_pairs)} pairs to GSM8K format")
         return gsm8k_pairs
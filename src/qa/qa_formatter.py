@@ -1,9 +1,21 @@
+import json
 import re
 from langchain.prompts import PromptTemplate
-from langchain_ollama.llms import OllamaLLM
+from src.qa.arithmetic_verifier import find_arithmetic_errors
+from src.qa.llm_backend import LLMBackend
+from src.qa.response_parsing import find_written_calculations, last_number, split_qa_response
+from src.qa.streaming import FormattedQAMonitor, generate_monitored
 
-def format_qa_pair(llm: OllamaLLM, question: str, answer: str) -> dict[str, str]:
-    """Format a question-answer pair into the GSM8K-style format."""
+# "#### <number>" final answer line required by validation
+PROPER_FINAL_ANSWER_PATTERN = re.compile(r"####\s*\$?(\d+\.?\d*%?)")
+
+def format_qa_pair(llm: LLMBackend, question: str, answer: str, stream: bool = False) -> dict[str, str]:
+    """
+    Format a question-answer pair into the GSM8K-style format.
+
+    With `stream`, generation stops once the "####" final answer line is complete
+    and is aborted with GenerationAborted on clear format violations.
+    """
     format_template = """
     You are an expert in formatting mathematical problems and solutions to match the GSM8K dataset format for GPTO fine-tuning.
     
@@ -61,49 +73,51 @@ def format_qa_pair(llm: OllamaLLM, question: str, answer: str) -> dict[str, str]
     )
     
     print("Formatting QA pair...")
-    response = llm.invoke(
-        format_prompt.format(
-            question=question,
-            answer=answer
-        )
+    prompt = format_prompt.format(
+        question=question,
+        answer=answer
     )
-    
+    if stream:
+        response = generate_monitored(llm, prompt, FormattedQAMonitor())
+    else:
+        response = llm.invoke(prompt)
+    return parse_formatted_qa(response, question, answer)
+
+def parse_structured_qa(response: str, question: str) -> dict[str, str]:
+    """
+    Parse a JSON {"question": ..., "answer": ...} completion into the GSM8K-style format.
+
+    The fields go through parse_formatted_qa, so single-call and two-call QA pairs
+    are cleaned and repaired the same way. The answer may also be a list of step
+    lines. A completion that is not valid JSON is parsed as plain
+    "question: / answer:" text.
+    """
+    start, end = response.find("{"), response.rfind("}")
+    try:
+        structured = json.loads(response[start:end + 1]) if start != -1 else {}
+    except json.JSONDecodeError:
+        structured = {}
+    if not isinstance(structured, dict) or not structured.get("question") or not structured.get("answer"):
+        print("Warning: Could not parse structured QA pair as JSON, parsing as text")
+        return parse_formatted_qa(response, question, response)
+    answer = structured["answer"]
+    if isinstance(answer, list):
+        answer = "\n".join(str(step) for step in answer)
+    return parse_formatted_qa(f"question: {structured['question']}\n\nanswer: {answer}", question, answer)
+
+def parse_formatted_qa(response: str, question: str, answer: str) -> dict[str, str]:
+    """
+    Parse a "question: / answer:" completion, falling back to `question` and repairing the answer format.
+
+    The response is scanned once for its markers (see split_qa_response) and the
+    question and answer keep their original case.
+    """
     formatted_qa = {"question": "", "answer": ""}
-    lines = response.lower().split('\n')
-    question_index = -1
-    answer_index = -1
-    
-    for i, line in enumerate(lines):
-        if "question:" in line:
-            question_index = i
-        if "answer:" in line and i > question_index:
-            answer_index = i
-            break
-    
-    if question_index != -1 and answer_index != -1:
-        question_text = lines[question_index].split("question:", 1)[1].strip()
-        if question_index + 1 < answer_index:
-            for j in range(question_index + 1, answer_index):
-                question_text += " " + lines[j].strip()
-        
-        answer_lines = []
-        answer_start = lines[answer_index].split("answer:", 1)[1].strip()
-        if answer_start:
-            answer_lines.append(answer_start)
-        for j in range(answer_index + 1, len(lines)):
-            answer_lines.append(lines[j].strip())
-        
-        formatted_qa["question"] = question_text
-        formatted_qa["answer"] = "\n".join(answer_lines)
+    parts = split_qa_response(response)
+    if parts is not None:
+        formatted_qa["question"], formatted_qa["answer"] = parts
     else:
-        print("Warning: Could not parse formatted QA pair, using fallback method")
-        parts = response.split("question:", 1)
-        if len(parts) > 1:
-            rest = parts[1].strip()
-            qa_parts = rest.split("answer:", 1)
-            if len(qa_parts) > 1:
-                formatted_qa["question"] = qa_parts[0].strip()
-                formatted_qa["answer"] = qa_parts[1].strip()
+        print("Warning: Could not find question: and answer: markers in the formatted QA pair")
     
     if not formatted_qa["question"] or not formatted_qa["answer"]:
         print("Warning: Formatted QA pair is incomplete, using original")
@@ -112,29 +126,26 @@ def format_qa_pair(llm: OllamaLLM, question: str, answer: str) -> dict[str, str]
     
     if "<<" not in formatted_qa["answer"] or ">>" not in formatted_qa["answer"]:
         print("Warning: Answer lacks calculation format, fixing formatting")
-        calculations = re.findall(r'(\d+\.?\d*)\s*[+\-*/]\s*(\d+\.?\d*)\s*=\s*(\d+\.?\d*)', answer)
+        calculations = find_written_calculations(answer)
         if calculations:
-            fixed_answer_lines = []
-            for op1, op2, result in calculations:
-                operation = "+" if "+" in answer[answer.find(op1):answer.find(result)] else \
-                           "-" if "-" in answer[answer.find(op1):answer.find(result)] else \
-                           "*" if "*" in answer[answer.find(op1):answer.find(result)] else "/"
-                step_description = "Calculation"
-                if "total" in answer.lower():
-                    step_description = "Total"
-                elif "average" in answer.lower():
-                    step_description = "Average"
-                elif "percentage" in answer.lower():
-                    step_description = "Percentage"
-                fixed_answer_lines.append(f"{step_description} = {op1} {operation} {op2} = <<{op1}{operation}{op2}={result}>>{result}")
-            final_result = calculations[-1][2] if calculations else "100"
-            fixed_answer_lines.append(f"#### {final_result}")
+            lowered = answer.lower()
+            step_description = "Calculation"
+            if "total" in lowered:
+                step_description = "Total"
+            elif "average" in lowered:
+                step_description = "Average"
+            elif "percentage" in lowered:
+                step_description = "Percentage"
+            fixed_answer_lines = [
+                f"{step_description} = {op1} {operation} {op2} = <<{op1}{operation}{op2}={result}>>{result}"
+                for op1, operation, op2, result in calculations
+            ]
+            fixed_answer_lines.append(f"#### {calculations[-1][3]}")
             formatted_qa["answer"] = "\n".join(fixed_answer_lines)
     
     if "####" not in formatted_qa["answer"]:
         print("Warning: Answer lacks final answer format, adding it")
-        final_numbers = re.findall(r'(\d+\.?\d*)', formatted_qa["answer"])
-        final_result = final_numbers[-1] if final_numbers else "100"
+        final_result = last_number(formatted_qa["answer"]) or "100"
         formatted_qa["answer"] += f"\n#### {final_result}"
     
     return formatted_qa
@@ -143,17 +154,19 @@ def validate_single_qa_pair(qa_pair: dict[str, str]) -> bool:
     """Validate a single QA pair to ensure it meets GSM8K format."""
     question = qa_pair.get("question", "")
     answer = qa_pair.get("answer", "")
+    question_lower = question.lower()
+    answer_lower = answer.lower()
     
     has_question_mark = "?" in question
     has_calculation_format = "<<" in answer and ">>" in answer
     has_final_answer = "####" in answer
     has_numbers_in_question = any(char.isdigit() for char in question)
-    has_data_reference = "according to the data" in question.lower() or "the data shows" in question.lower()
-    has_segment_reference = "segment analysis" in question.lower() and not any(char.isdigit() for char in question)
-    has_placeholder_text = "[insert" in answer or "unknown" in answer.lower() or "no calculation needed" in answer
-    final_answer_pattern = r'####\s*\$?(\d+\.?\d*%?)'
-    has_proper_final_answer = bool(re.search(final_answer_pattern, answer))
+    has_data_reference = "according to the data" in question_lower or "the data shows" in question_lower
+    has_segment_reference = "segment analysis" in question_lower and not has_numbers_in_question
+    has_placeholder_text = "[insert" in answer_lower or "unknown" in answer_lower or "no calculation needed" in answer_lower
+    has_proper_final_answer = bool(PROPER_FINAL_ANSWER_PATTERN.search(answer))
     has_sufficient_length = len(question) >= 80
+    arithmetic_errors = find_arithmetic_errors(answer) if has_calculation_format and has_final_answer else []
     
     is_valid = (
         has_question_mark and 
@@ -164,7 +177,8 @@ def validate_single_qa_pair(qa_pair: dict[str, str]) -> bool:
         not has_segment_reference and 
         not has_placeholder_text and
         has_proper_final_answer and
-        has_sufficient_length
+        has_sufficient_length and
+        not arithmetic_errors
     )
     
     if not is_valid:
@@ -178,5 +192,6 @@ def validate_single_qa_pair(qa_pair: dict[str, str]) -> bool:
         if has_segment_reference: print("- References segment analysis without numbers")
         if has_placeholder_text: print("- Contains placeholder text")
         if not has_sufficient_length: print("- Question too short, likely missing context")
+        for _, detail in arithmetic_errors: print(f"- Incorrect arithmetic: {detail}")
     
     return is_valid
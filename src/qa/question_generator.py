@@ -1,8 +1,11 @@
 from langchain.prompts import PromptTemplate
-from langchain_ollama.llms import OllamaLLM
+from src.qa.context_packing import ContextPacker, build_context
+from src.qa.llm_backend import LLMBackend
+from src.qa.response_parsing import parse_numbered_questions
 
-def generate_questions(llm: OllamaLLM, retriever, query: str, num_questions: int) -> list[str]:
-    """Generate analytical questions based on e-commerce data."""
+def generate_questions(llm: LLMBackend, retriever, query: str, num_questions: int,
+                       context_packer: ContextPacker = None) -> list[str]:
+    """Generate analytical questions based on e-commerce data, packing the context with `context_packer` if given."""
     question_gen_template = """
     You are an expert in creating mathematical word problems like those in the GSM8K dataset.
     
@@ -43,7 +46,7 @@ def generate_questions(llm: OllamaLLM, retriever, query: str, num_questions: int
     
     print(f"Retrieving context for query: '{query}'")
     docs = retriever.get_relevant_documents(query)
-    context_text = "\n\n".join([doc.page_content for doc in docs])
+    context_text = build_context(docs, query, context_packer)
     
     print(f"Generating {num_questions} questions...")
     response = llm.invoke(
@@ -53,23 +56,7 @@ def generate_questions(llm: OllamaLLM, retriever, query: str, num_questions: int
         )
     )
     
-    questions = []
-    lines = response.split('\n')
-    for line in lines:
-        line = line.strip()
-        if line and (line.startswith('Q') or line.startswith('Question') or (line[0].isdigit() and '.' in line[:3])):
-            clean_question = line
-            if line[0].isdigit() and '.' in line[:3]:
-                clean_question = line.split('.', 1)[1].strip()
-            elif line.startswith('Question'):
-                parts = line.split(':', 1)
-                if len(parts) > 1:
-                    clean_question = parts[1].strip()
-            questions.append(clean_question)
-    
-    if not questions:
-        questions = [line.strip() for line in response.split('\n') if '?' in line]
-    
+    questions = parse_numbered_questions(response)
     if not questions:
         print("Warning: Could not extract questions, using raw response")
         return [response.strip()]
@@ -0,0 +1,96 @@
+import threading
+import time
+from typing import Optional
+
+class AdaptiveRateLimiter:
+    """
+    AIMD limit on the number of concurrent LLM requests.
+
+    The limit grows by one for every `limit` successful requests (additive
+    increase) and is halved when a request fails or, if `latency_tolerance` is
+    set, when a request takes longer than `latency_tolerance` times the fastest
+    latency seen so far (multiplicative decrease). After a failure, new requests
+    also wait for an exponentially growing backoff delay.
+    """
+
+    def __init__(self, max_limit: int, min_limit: int = 1, initial_limit: Optional[int] = None,
+                 decrease_factor: float = 0.5, latency_tolerance: Optional[float] = None,
+                 backoff: float = 0.5, max_backoff: float = 30.0):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.limit = float(initial_limit or max_limit)
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.in_flight = 0
+        self.min_latency = None
+        self.failures = 0
+        self.resume_at = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """Block until a request may start."""
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+            delay = self.resume_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def release(self, success: bool, latency: float):
+        """Record the outcome of a finished request and adjust the limit."""
+        with self._condition:
+            self.in_flight -= 1
+            overloaded = not success
+            if success:
+                self.failures = 0
+                if self.min_latency is None or latency < self.min_latency:
+                    self.min_latency = latency
+                elif self.latency_tolerance and latency > self.latency_tolerance * self.min_latency:
+                    overloaded = True
+            if overloaded:
+                self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            if not success:
+                self.failures += 1
+                delay = min(self.max_backoff, self.backoff * 2 ** (self.failures - 1))
+                self.resume_at = time.monotonic() + delay
+            self._condition.notify_all()
+
+class RateLimitedLLM:
+    """Wraps an LLM so every invoke() call goes through an AdaptiveRateLimiter."""
+
+    def __init__(self, llm, limiter: AdaptiveRateLimiter):
+        self.llm = llm
+        self.limiter = limiter
+
+    def invoke(self, prompt, *args, **kwargs):
+        self.limiter.acquire()
+        start = time.perf_counter()
+        success = False
+        try:
+            response = self.llm.invoke(prompt, *args, **kwargs)
+            success = True
+            return response
+        finally:
+            self.limiter.release(success, time.perf_counter() - start)
+
+    def stream(self, prompt, *args, **kwargs):
+        """Stream a completion, holding a rate-limiter slot until the stream ends or is closed."""
+        self.limiter.acquire()
+        start = time.perf_counter()
+        success = False
+        try:
+            yield from self.llm.stream(prompt, *args, **kwargs)
+            success = True
+        except GeneratorExit:
+            success = True
+            raise
+        finally:
+            self.limiter.release(success, time.perf_counter() - start)
+
+    def __getattr__(self, name):
+        return getattr(self.llm, name)
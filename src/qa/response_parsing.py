@@ -0,0 +1,58 @@
+import re
+from typing import List, Optional, Tuple
+
+# "question:" / "answer:" markers of a formatted QA completion, matched in any case and
+# also when wrapped in markdown emphasis ("**Question:**", "**Answer**:"). Each starts
+# with a literal, so a search skips ahead with a fast substring scan.
+QUESTION_MARKER_PATTERN = re.compile(r"question\**\s*:\**", re.IGNORECASE)
+ANSWER_MARKER_PATTERN = re.compile(r"answer\**\s*:\**", re.IGNORECASE)
+
+# Lines of a numbered question list: "1. ...", "2) ...", "Q3: ...", "Question 4: ...", "**5.** ..."
+NUMBERED_QUESTION_PATTERN = re.compile(
+    r"^[ \t]*\**(?:\d{1,3}[.)](?!\d)|Q(?:uestion)?[ \t]*\d*[ \t]*[:.)])\**[ \t]*(.+)", re.MULTILINE
+)
+
+# Lines with a question mark, the fallback when the questions are not numbered
+QUESTION_LINE_PATTERN = re.compile(r"^.*\?.*", re.MULTILINE)
+
+# "a op b = result" calculations written out in an answer
+WRITTEN_CALCULATION_PATTERN = re.compile(r"(\d+\.?\d*)\s*([+\-*/])\s*(\d+\.?\d*)\s*=\s*(\d+\.?\d*)")
+
+NUMBER_PATTERN = re.compile(r"\d+\.?\d*")
+
+def split_qa_response(response: str) -> Optional[Tuple[str, str]]:
+    """
+    Split a "question: ... answer: ..." completion into its question and answer, keeping their case.
+
+    The question is the text after the last "question:" marker that precedes an
+    "answer:" marker, joined into one line; the answer is everything after that
+    "answer:" marker, with each line stripped. Returns None without both markers.
+    """
+    question_marker = QUESTION_MARKER_PATTERN.search(response)
+    if question_marker is None:
+        return None
+    answer_marker = ANSWER_MARKER_PATTERN.search(response, question_marker.end())
+    if answer_marker is None:
+        return None
+    while True:
+        later_question = QUESTION_MARKER_PATTERN.search(response, question_marker.end(), answer_marker.start())
+        if later_question is None:
+            break
+        question_marker = later_question
+    question = " ".join(response[question_marker.end():answer_marker.start()].split()).strip("* ")
+    answer = "\n".join(map(str.strip, response[answer_marker.end():].strip().split("\n")))
+    return question, answer
+
+def parse_numbered_questions(response: str) -> List[str]:
+    """Questions of a numbered list, or every line with a question mark if nothing is numbered."""
+    questions = NUMBERED_QUESTION_PATTERN.findall(response) or QUESTION_LINE_PATTERN.findall(response)
+    return [question.strip() for question in questions]
+
+def find_written_calculations(text: str) -> List[Tuple[str, str, str, str]]:
+    """(operand, operator, operand, result) of every "a op b = result" calculation in `text`."""
+    return WRITTEN_CALCULATION_PATTERN.findall(text)
+
+def last_number(text: str) -> Optional[str]:
+    """The last number in `text`, or None."""
+    numbers = NUMBER_PATTERN.findall(text)
+    return numbers[-1] if numbers else None
@@ -0,0 +1,166 @@
+import contextvars
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+from langchain.schema import Document
+
+# Attempt number of the current question in run_pipeline's retry loop. It is part of the
+# LLM cache key so a retry samples a new completion instead of replaying the failed one.
+current_attempt = contextvars.ContextVar("current_attempt", default=0)
+
+# Number of writes between eviction passes
+EVICT_EVERY = 256
+
+class ResultCache:
+    """
+    Persistent key-value cache in SQLite with TTL and size-bounded LRU eviction.
+
+    Values are JSON-serializable. Entries older than `ttl_seconds` are ignored
+    and periodically deleted; beyond `max_entries`, the least recently used
+    entries are deleted. Safe to share between threads.
+    """
+
+    def __init__(self, path: str, ttl_seconds: Optional[float] = None, max_entries: Optional[int] = None):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, namespace TEXT, value TEXT, created REAL, last_used REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries(last_used)")
+        self._conn.commit()
+
+    def get(self, namespace: str, key: str):
+        """Return the cached value, or None on a miss or expired entry."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created FROM entries WHERE key = ?", (f"{namespace}:{key}",)
+            ).fetchone()
+            if row is None or (self.ttl_seconds is not None and now - row[1] > self.ttl_seconds):
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE entries SET last_used = ? WHERE key = ?", (now, f"{namespace}:{key}"))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, namespace: str, key: str, value):
+        """Store a value, evicting expired and least recently used entries from time to time."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                (f"{namespace}:{key}", namespace, json.dumps(value), now, now),
+            )
+            self._writes += 1
+            if self._writes % EVICT_EVERY == 1:
+                self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        if self.ttl_seconds is not None:
+            self._conn.execute("DELETE FROM entries WHERE created < ?", (now - self.ttl_seconds,))
+        if self.max_entries is not None:
+            self._conn.execute(
+                "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def cache_key(*parts) -> str:
+    """SHA-256 of the JSON encoding of the key parts."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+class CachedLLM:
+    """
+    Caches LLM completions keyed by (model, sampling parameters, prompt, attempt).
+
+    With `refresh`, cached completions are not read but new ones are still
+    written, for runs that need fresh sampling.
+    """
+
+    def __init__(self, llm, cache: ResultCache, model: str, refresh: bool = False):
+        self.llm = llm
+        self.cache = cache
+        self.model = model
+        self.refresh = refresh
+        self.params = getattr(llm, "params", {})
+
+    def invoke(self, prompt, *args, **kwargs):
+        key = cache_key(self.model, self.params, prompt, current_attempt.get(), args, kwargs)
+        if not self.refresh:
+            cached = self.cache.get("llm", key)
+            if cached is not None:
+                return cached
+        response = self.llm.invoke(prompt, *args, **kwargs)
+        self.cache.set("llm", key, response)
+        return response
+
+    def stream(self, prompt, *args, **kwargs):
+        """
+        Stream a completion, replaying the cached text if present.
+
+        Whatever was consumed is cached, including a stream the caller stopped
+        early: the same prompt then replays the same prefix and reaches the same
+        stop decision without calling the LLM.
+        """
+        key = cache_key(self.model, self.params, prompt, current_attempt.get(), args, kwargs)
+        if not self.refresh:
+            cached = self.cache.get("llm-stream", key)
+            if cached is not None:
+                yield cached
+                return
+        chunks = []
+        try:
+            for chunk in self.llm.stream(prompt, *args, **kwargs):
+                chunks.append(chunk)
+                yield chunk
+        except GeneratorExit:
+            self.cache.set("llm-stream", key, "".join(chunks))
+            raise
+        self.cache.set("llm-stream", key, "".join(chunks))
+
+    def __getattr__(self, name):
+        return getattr(self.llm, name)
+
+class CachedRetriever:
+    """Caches retriever results keyed by (query, k, index version) and the search type unless it is similarity."""
+
+    def __init__(self, retriever, cache: ResultCache, index_version: str):
+        self.retriever = retriever
+        self.cache = cache
+        self.index_version = index_version
+        self.k = getattr(retriever, "search_kwargs", {}).get("k")
+        self.search_type = getattr(retriever, "search_type", "similarity")
+
+    def get_relevant_documents(self, query: str):
+        key = cache_key(query, self.k, self.index_version)
+        if self.search_type != "similarity":
+            key = cache_key(query, self.k, self.index_version, self.search_type)
+        cached = self.cache.get("retriever", key)
+        if cached is not None:
+            return [Document(page_content=doc["page_content"], metadata=doc["metadata"]) for doc in cached]
+        docs = self.retriever.get_relevant_documents(query)
+        self.cache.set("retriever", key, [{"page_content": doc.page_content, "metadata": doc.metadata} for doc in docs])
+        return docs
+
+    def invoke(self, query: str):
+        return self.get_relevant_documents(query)
+
+    def __getattr__(self, name):
+        return getattr(self.retriever, name)
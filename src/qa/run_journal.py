@@ -0,0 +1,101 @@
+import json
+import os
+import sqlite3
+import time
+from typing import Dict, List, Optional, Tuple
+
+class RunJournal:
+    """
+    SQLite ledger of QA pipeline runs, used to resume interrupted runs.
+
+    Records each run's configuration, the questions generated for every
+    category and the outcome of every question (its QA pair, or failure).
+    Question outcomes are buffered and written in one transaction every
+    `batch_size` records or `flush_interval` seconds, so an abrupt kill loses
+    at most one batch.
+    """
+
+    def __init__(self, path: str, batch_size: int = 16, flush_interval: float = 10.0):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending = []
+        self._last_flush = time.monotonic()
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id INTEGER PRIMARY KEY AUTOINCREMENT, config TEXT, status TEXT, created REAL, finished REAL);
+            CREATE TABLE IF NOT EXISTS questions (
+                run_id INTEGER, category TEXT, questions TEXT, PRIMARY KEY (run_id, category));
+            CREATE TABLE IF NOT EXISTS results (
+                run_id INTEGER, category TEXT, question_index INTEGER, question TEXT, status TEXT, qa_pair TEXT,
+                PRIMARY KEY (run_id, category, question_index));
+            """
+        )
+        self._conn.commit()
+
+    def start_run(self, config: Dict, resume: bool = False) -> int:
+        """
+        Return the run ID to use: with `resume`, the latest unfinished run with the
+        same configuration, otherwise a new run.
+        """
+        config_json = json.dumps(config, sort_keys=True)
+        if resume:
+            row = self._conn.execute(
+                "SELECT run_id FROM runs WHERE status = 'running' AND config = ? ORDER BY run_id DESC LIMIT 1",
+                (config_json,),
+            ).fetchone()
+            if row is not None:
+                print(f"Resuming QA run {row[0]}")
+                return row[0]
+            print("No unfinished QA run with the same configuration found, starting a new run")
+        cursor = self._conn.execute(
+            "INSERT INTO runs (config, status, created) VALUES (?, 'running', ?)", (config_json, time.time())
+        )
+        self._conn.commit()
+        return cursor.lastrowid
+
+    def finish_run(self, run_id: int):
+        self.flush()
+        self._conn.execute("UPDATE runs SET status = 'finished', finished = ? WHERE run_id = ?", (time.time(), run_id))
+        self._conn.commit()
+
+    def questions(self, run_id: int) -> Dict[str, List[str]]:
+        """Questions already generated in the run, by category."""
+        rows = self._conn.execute("SELECT category, questions FROM questions WHERE run_id = ?", (run_id,))
+        return {category: json.loads(questions) for category, questions in rows}
+
+    def record_questions(self, run_id: int, category: str, questions: List[str]):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO questions VALUES (?, ?, ?)", (run_id, category, json.dumps(questions))
+        )
+        self._conn.commit()
+
+    def results(self, run_id: int) -> Dict[Tuple[str, int], Optional[Dict[str, str]]]:
+        """Finished questions of the run: (category, question index) -> QA pair, or None if it failed."""
+        rows = self._conn.execute(
+            "SELECT category, question_index, qa_pair FROM results WHERE run_id = ?", (run_id,)
+        )
+        return {(category, index): json.loads(qa_pair) for category, index, qa_pair in rows}
+
+    def record_result(self, run_id: int, category: str, question_index: int, question: str,
+                      qa_pair: Optional[Dict[str, str]]):
+        """Buffer the outcome of one question, flushing when the batch is full or old enough."""
+        status = "failed" if qa_pair is None else "done"
+        self._pending.append((run_id, category, question_index, question, status, json.dumps(qa_pair)))
+        if len(self._pending) >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Write buffered results in one transaction."""
+        if self._pending:
+            with self._conn:
+                self._conn.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)", self._pending)
+            self._pending = []
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        self.flush()
+        self._conn.close()
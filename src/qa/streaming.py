@@ -0,0 +1,181 @@
+import re
+from typing import Optional
+from src.qa.response_parsing import ANSWER_MARKER_PATTERN, QUESTION_MARKER_PATTERN
+
+# Calculations like "240 * 85 = 20400" in a worked answer
+CALCULATION_PATTERN = re.compile(r"\d\s*[+\-*/×x÷]\s*\$?\d[\d,.]*\s*=")
+
+class GenerationAborted(Exception):
+    """Raised when a streamed completion is stopped because it cannot pass validation."""
+
+    def __init__(self, reason: str, text: str, chunks: int):
+        super().__init__(f"generation aborted after {chunks} chunks: {reason}")
+        self.reason = reason
+        self.text = text
+        self.chunks = chunks
+
+class StreamMonitor:
+    """
+    Consumes a completion chunk by chunk and decides whether to keep generating.
+
+    Subclasses inspect each completed line in on_line() and return "complete"
+    (stop, the response is finished) or an abort reason. Text is only judged on
+    whole lines, so a marker split across chunks is never missed, and length
+    limits are checked at the end of each line, so the verdict does not depend
+    on how the text was chunked.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.chunks = 0
+        self.complete_at = None
+        self._scanned = 0
+
+    def feed(self, chunk: str) -> Optional[str]:
+        """Add a chunk; return "complete", an abort reason, or None to keep going."""
+        self.text += chunk
+        self.chunks += 1
+        while True:
+            newline = self.text.find("\n", self._scanned)
+            if newline == -1:
+                return self.on_partial(self.text[self._scanned:])
+            line = self.text[self._scanned:newline]
+            self._scanned = newline + 1
+            verdict = self.on_line(line)
+            if verdict == "complete":
+                self.complete_at = self._scanned
+            if verdict is not None:
+                return verdict
+
+    def finish(self) -> Optional[str]:
+        """Judge the last line when the stream ends without a trailing newline."""
+        if self._scanned < len(self.text):
+            line = self.text[self._scanned:]
+            self._scanned = len(self.text)
+            return self.on_line(line)
+        return None
+
+    def on_line(self, line: str) -> Optional[str]:
+        return None
+
+    def on_partial(self, partial: str) -> Optional[str]:
+        return None
+
+    def result(self) -> str:
+        """The response text, cut after the line that completed it."""
+        return self.text[:self.complete_at].rstrip("\n") if self.complete_at is not None else self.text
+
+class FormattedQAMonitor(StreamMonitor):
+    """
+    Monitors format_qa_pair completions.
+
+    Completes once the "#### <number>" line of the answer is finished. Aborts if
+    no "question:" marker appears within `max_chars_before_question` characters,
+    if the answer runs past `max_answer_chars` without a final answer, or if
+    `max_lines_without_calculation` answer lines pass without a <<...>> calculation.
+    """
+
+    def __init__(self, max_chars_before_question: int = 1500, max_answer_chars: int = 3000,
+                 max_lines_without_calculation: int = 12):
+        super().__init__()
+        self.max_chars_before_question = max_chars_before_question
+        self.max_answer_chars = max_answer_chars
+        self.max_lines_without_calculation = max_lines_without_calculation
+        self.state = "preamble"
+        self.answer_start = None
+        self.lines_without_calculation = 0
+
+    def on_line(self, line: str) -> Optional[str]:
+        # Same markers as split_qa_response; "answer:" counts on a line after "question:"
+        if self.state == "question" and ANSWER_MARKER_PATTERN.search(line):
+            self.state = "answer"
+            self.answer_start = self._scanned
+        elif self.state == "preamble" and QUESTION_MARKER_PATTERN.search(line):
+            self.state = "question"
+            return None
+        if self.state == "preamble":
+            return self._check_preamble(self._scanned)
+        if self.state != "answer":
+            return None
+
+        stripped = line.strip()
+        if stripped.startswith("####") and re.search(r"\d", stripped):
+            return "complete"
+        if "<<" in line:
+            self.lines_without_calculation = 0
+        elif stripped:
+            self.lines_without_calculation += 1
+            if self.lines_without_calculation > self.max_lines_without_calculation:
+                return f"{self.lines_without_calculation} answer lines without a <<calculation>>"
+        return self._check_answer_length(self._scanned)
+
+    def on_partial(self, partial: str) -> Optional[str]:
+        if self.state == "preamble" and not QUESTION_MARKER_PATTERN.search(partial):
+            return self._check_preamble(len(self.text))
+        if self.state == "answer":
+            return self._check_answer_length(len(self.text))
+        return None
+
+    def _check_preamble(self, position: int):
+        if position > self.max_chars_before_question:
+            return f"no 'question:' marker in the first {self.max_chars_before_question} characters"
+        return None
+
+    def _check_answer_length(self, position: int):
+        if position - self.answer_start > self.max_answer_chars:
+            return f"answer exceeds {self.max_answer_chars} characters without a #### line"
+        return None
+
+class AnswerMonitor(StreamMonitor):
+    """
+    Monitors answer_question completions.
+
+    Aborts runaway prose: no "X op Y = Z" calculation within
+    `max_chars_without_calculation` characters, or more than `max_chars` in total.
+    """
+
+    def __init__(self, max_chars_without_calculation: int = 1500, max_chars: int = 5000):
+        super().__init__()
+        self.max_chars_without_calculation = max_chars_without_calculation
+        self.max_chars = max_chars
+        self.has_calculation = False
+
+    def on_line(self, line: str) -> Optional[str]:
+        if CALCULATION_PATTERN.search(line):
+            self.has_calculation = True
+        return self._check_length(self._scanned)
+
+    def on_partial(self, partial: str) -> Optional[str]:
+        return self._check_length(len(self.text))
+
+    def _check_length(self, position: int):
+        if not self.has_calculation and position > self.max_chars_without_calculation:
+            return f"no calculation in the first {self.max_chars_without_calculation} characters"
+        if position > self.max_chars:
+            return f"answer exceeds {self.max_chars} characters"
+        return None
+
+def generate_monitored(llm, prompt: str, monitor: StreamMonitor) -> str:
+    """
+    Stream a completion through `monitor`, stopping as soon as it is complete.
+
+    Closing the stream early ends generation on the server. Raises
+    GenerationAborted if the monitor rejects the completion.
+    """
+    stream = llm.stream(prompt)
+    verdict = None
+    try:
+        for chunk in stream:
+            verdict = monitor.feed(chunk)
+            if verdict is not None:
+                break
+        else:
+            verdict = monitor.finish()
+    finally:
+        stream.close()
+    if verdict is not None and verdict != "complete":
+        print(f"Stopped generation after {monitor.chunks} chunks: {verdict}")
+        raise GenerationAborted(verdict, monitor.text, monitor.chunks)
+    if verdict == "complete":
+        print(f"Final answer complete after {monitor.chunks} chunks, stopped generation")
+    return monitor.result()
@@ -0,0 +1,250 @@
+from decimal import Decimal, ROUND_HALF_UP
+from itertools import combinations
+from typing import Dict, List, Optional
+import numpy as np
+import pandas as pd
+from src.segment_aggregation import segment_table, parent_table
+
+# How a segment is described after "customers who ..."; values of the dimensions in
+# LOWERCASE_DIMENSIONS are lowercased, boolean dimensions map each value to a phrase
+SEGMENT_PREDICATES = {
+    "Gender": "identify as {value}",
+    "Income_Level": "have a {value} income",
+    "Marital_Status": "are {value}",
+    "Education_Level": "have a {value} education",
+    "Purchase_Category": "bought {value}",
+    "Purchase_Channel": "shop through the {value} channel",
+    "Device_Used_for_Shopping": "shop on a {value}",
+    "Payment_Method": "use the {value} payment method",
+    "Discount_Used": {True: "used a discount", False: "did not use a discount"},
+    "Customer_Loyalty_Program_Member": {True: "are loyalty program members", False: "are not loyalty program members"},
+    "Purchase_Intent": "make {value} purchases",
+    "Social_Media_Influence": "report {value} social media influence",
+    "Age_Group": "are aged {value}",
+}
+LOWERCASE_DIMENSIONS = {"Gender", "Income_Level", "Marital_Status", "Device_Used_for_Shopping", "Purchase_Intent",
+                        "Social_Media_Influence"}
+
+# Rounding of percentages and dollar amounts (stated in the questions)
+PERCENT = Decimal("0.1")
+CENT = Decimal("0.01")
+
+def synthesize_qa_pairs(single_aggregates: Dict, multi_aggregates: Dict, total_count: int,
+                        max_pairs: Optional[int] = None, seed: int = 0) -> List[Dict[str, str]]:
+    """
+    Generate GSM8K-style QA pairs from segment aggregates without an LLM.
+
+    Every question is filled in from the exact segment counts and sums that the
+    segment documents are rendered from, and every answer is a chain of
+    "<<a op b=c>>" steps computed with decimal arithmetic, ending in "#### c".
+    Divisions are rounded as the question asks (one decimal place for
+    percentages, cents for dollar amounts).
+
+    Args:
+        single_aggregates: aggregate_single_dimensions (or aggregate_chunks) result.
+        multi_aggregates: aggregate_multi_dimensions (or aggregate_chunks) result.
+        total_count: Number of customers (rows) the aggregates cover.
+        max_pairs: If set, a deterministic sample of this many pairs (by `seed`).
+        seed: Seed for the sample.
+
+    Returns:
+        List of {"question", "answer"} dicts, in the format convert_to_gsm8k_format takes.
+    """
+    pairs = []
+    for dim, aggregate in single_aggregates.items():
+        segments = []
+        for (value,), row in segment_table(aggregate).items():
+            predicate = segment_predicate(dim, value)
+            if predicate is not None and row["count"]:
+                segments.append((predicate, row))
+        for predicate, row in segments:
+            pairs.extend(_single_segment_pairs(dim, predicate, row, total_count))
+        for (predicate1, row1), (predicate2, row2) in combinations(segments, 2):
+            pairs.extend(_segment_comparison_pairs(predicate1, row1, predicate2, row2, total_count))
+
+    for (dim1, dim2), aggregate in multi_aggregates.items():
+        parents = parent_table(aggregate)
+        for (value1, value2), row in segment_table(aggregate).items():
+            predicate1, predicate2 = segment_predicate(dim1, value1), segment_predicate(dim2, value2)
+            if predicate1 is None or predicate2 is None or not row["count"]:
+                continue
+            pairs.extend(_multi_segment_pairs((dim1, dim2), predicate1, predicate2, row, parents[value1]))
+
+    if max_pairs is not None and len(pairs) > max_pairs:
+        sample = np.random.default_rng(seed).choice(len(pairs), size=max_pairs, replace=False)
+        pairs = [pairs[i] for i in sorted(sample)]
+    return pairs
+
+def segment_predicate(dim: str, value) -> Optional[str]:
+    """Describe a segment as the predicate of "customers who ...", or None if it cannot be phrased."""
+    template = SEGMENT_PREDICATES.get(dim)
+    if template is None or pd.isna(value):
+        return None
+    if isinstance(template, dict):
+        return template.get(bool(value))
+    value = str(value)
+    # Skip values mangled by unquoted commas in the CSV, e.g. "Travel & Leisure (Flights"
+    if value.count("(") != value.count(")"):
+        return None
+    return template.format(value=value.lower() if dim in LOWERCASE_DIMENSIONS else value)
+
+def _single_segment_pairs(dim, predicate, row, total_count):
+    count = int(row["count"])
+    pairs = []
+
+    rest = total_count - count
+    pairs.append(_pair(
+        f"An online store analyzed its {total_count} customers and found that {count} of them {predicate}. "
+        f"How many of the store's customers are not in this group?",
+        [_step("Customers not in the group", total_count, "-", count, rest)],
+    ))
+
+    share = _percentage(count, total_count)
+    pairs.append(_pair(
+        f"An online store analyzed its {total_count} customers and found that {count} of them {predicate}. "
+        f"What percentage of the store's customers {predicate}? Round to one decimal place.",
+        [_percentage_step("Percentage of customers", count, total_count, share)],
+    ))
+
+    purchases = int(row["Purchase_Amount_count"])
+    if purchases:
+        spent = _money(row["Purchase_Amount_sum"])
+        average = _quantize(spent / purchases, CENT)
+        pairs.append(_pair(
+            f"The customers of an online store who {predicate} made {purchases} purchases worth ${spent} in total. "
+            f"What was their average purchase amount in dollars, rounded to the nearest cent?",
+            [_step("Average purchase amount", spent, "/", purchases, average)],
+        ))
+
+    ratings = int(row["Customer_Satisfaction_count"])
+    if ratings:
+        points = int(row["Customer_Satisfaction_sum"])
+        average = _quantize(Decimal(points) / ratings, PERCENT)
+        pairs.append(_pair(
+            f"{ratings} customers of an online store who {predicate} rated their satisfaction on a scale of 1 to 10, "
+            f"and their ratings add up to {points} points. What is their average satisfaction rating, "
+            f"rounded to one decimal place?",
+            [_step("Average satisfaction rating", points, "/", ratings, average)],
+        ))
+
+    if dim != "Discount_Used" and row["Discount_Used_count"]:
+        customers = int(row["Discount_Used_count"])
+        with_discount = int(row["Discount_Used_sum"])
+        without_discount = customers - with_discount
+        share = _percentage(without_discount, customers)
+        pairs.append(_pair(
+            f"An online store has {customers} customers who {predicate}, and {with_discount} of them used a "
+            f"discount on their last purchase. What percentage of these customers did not use a discount? "
+            f"Round to one decimal place.",
+            [
+                _step("Customers without a discount", customers, "-", with_discount, without_discount),
+                _percentage_step("Percentage without a discount", without_discount, customers, share),
+            ],
+        ))
+    return pairs
+
+def _segment_comparison_pairs(predicate1, row1, predicate2, row2, total_count):
+    """Pairs comparing two segments of the same dimension (so the segments do not overlap)."""
+    if row1["count"] < row2["count"]:
+        predicate1, row1, predicate2, row2 = predicate2, row2, predicate1, row1
+    count1, count2 = int(row1["count"]), int(row2["count"])
+    pairs = []
+
+    if count1 != count2:
+        difference = count1 - count2
+        pairs.append(_pair(
+            f"At an online store, {count1} customers {predicate1}, while {count2} customers {predicate2}. "
+            f"How many more customers {predicate1} than {predicate2}?",
+            [_step("Difference", count1, "-", count2, difference)],
+        ))
+
+    combined = count1 + count2
+    share = _percentage(combined, total_count)
+    pairs.append(_pair(
+        f"An online store has {total_count} customers. {count1} of them {predicate1} and {count2} of them "
+        f"{predicate2}. What percentage of all customers are in one of these two groups? Round to one decimal place.",
+        [
+            _step("Customers in either group", count1, "+", count2, combined),
+            _percentage_step("Percentage of all customers", combined, total_count, share),
+        ],
+    ))
+
+    purchases1, purchases2 = int(row1["Purchase_Amount_count"]), int(row2["Purchase_Amount_count"])
+    if purchases1 and purchases2:
+        spent1, spent2 = _money(row1["Purchase_Amount_sum"]), _money(row2["Purchase_Amount_sum"])
+        purchases, spent = purchases1 + purchases2, spent1 + spent2
+        average = _quantize(spent / purchases, CENT)
+        pairs.append(_pair(
+            f"At an online store, customers who {predicate1} made {purchases1} purchases worth ${spent1}, and "
+            f"customers who {predicate2} made {purchases2} purchases worth ${spent2}. What was the average "
+            f"purchase amount across both groups in dollars, rounded to the nearest cent?",
+            [
+                _step("Total purchases", purchases1, "+", purchases2, purchases),
+                _step("Total spent", spent1, "+", spent2, spent),
+                _step("Average purchase amount", spent, "/", purchases, average),
+            ],
+        ))
+    return pairs
+
+def _multi_segment_pairs(dims, predicate1, predicate2, row, parent):
+    count, parent_count = int(row["count"]), int(parent["count"])
+    pairs = []
+
+    share = _percentage(count, parent_count)
+    pairs.append(_pair(
+        f"An online store has {parent_count} customers who {predicate1}. {count} of these customers also "
+        f"{predicate2}. What percentage of the customers who {predicate1} also {predicate2}? "
+        f"Round to one decimal place.",
+        [_percentage_step("Percentage of the group", count, parent_count, share)],
+    ))
+
+    parent_spent, spent = _money(parent["Purchase_Amount_sum"]), _money(row["Purchase_Amount_sum"])
+    if parent_spent and spent:
+        share = _percentage(spent, parent_spent)
+        pairs.append(_pair(
+            f"Customers of an online store who {predicate1} spent ${parent_spent} in total. Of that, ${spent} "
+            f"came from the customers who also {predicate2}. What percentage of the spending came from them? "
+            f"Round to one decimal place.",
+            [_percentage_step("Percentage of spending", spent, parent_spent, share)],
+        ))
+
+    if "Customer_Loyalty_Program_Member" not in dims and row["Customer_Loyalty_Program_Member_count"]:
+        customers = int(row["Customer_Loyalty_Program_Member_count"])
+        members = int(row["Customer_Loyalty_Program_Member_sum"])
+        pairs.append(_pair(
+            f"An online store has {customers} customers who {predicate1} and {predicate2}. {members} of them are "
+            f"loyalty program members. How many of these customers are not loyalty program members?",
+            [_step("Customers outside the loyalty program", customers, "-", members, customers - members)],
+        ))
+    return pairs
+
+def _pair(question, steps):
+    return {"question": question, "answer": "\n".join(steps) + f"\n#### {_final_result(steps)}"}
+
+def _final_result(steps):
+    """The result of the last step, i.e. the number after the last ">>"."""
+    return steps[-1].rsplit(">>", 1)[1]
+
+def _step(label, a, op, b, result):
+    a, b, result = _number(a), _number(b), _number(result)
+    return f"{label} = {a} {op} {b} = <<{a}{op}{b}={result}>>{result}"
+
+def _percentage_step(label, part, whole, result):
+    part, whole, result = _number(part), _number(whole), _number(result)
+    return f"{label} = {part} / {whole} * 100 = <<{part}/{whole}*100={result}>>{result}"
+
+def _percentage(part, whole):
+    return _quantize(Decimal(part) * 100 / Decimal(whole), PERCENT)
+
+def _money(value):
+    return _quantize(Decimal(str(float(value))), CENT)
+
+def _quantize(value, places):
+    return Decimal(value).quantize(places, rounding=ROUND_HALF_UP)
+
+def _number(value):
+    """Format an int or Decimal without exponent or trailing zeros after the decimal point."""
+    if isinstance(value, Decimal):
+        text = format(value, "f")
+        return text.rstrip("0").rstrip(".") if "." in text else text
+    return str(value)
@@ -0,0 +1,259 @@
+import pandas as pd
+from config.settings import SINGLE_DIMENSIONS, AGE_GROUPS, MULTI_DIMENSIONS
+
+# Columns whose sum and non-null count are kept per segment (means are derived)
+MEASURE_COLUMNS = [
+    "Purchase_Amount",
+    "Customer_Satisfaction",
+    "Discount_Used",
+    "Customer_Loyalty_Program_Member",
+]
+
+# Measure columns summed in integer units of 1/scale (money in cents). Their sums are then
+# exact, so they do not depend on the order rows are added in (chunk sizes, merge order)
+MEASURE_SCALES = {"Purchase_Amount": 100}
+
+# Columns whose value counts are kept per segment for the distribution sections
+DISTRIBUTION_COLUMNS = ["Purchase_Channel", "Purchase_Category", "Device_Used_for_Shopping", "Gender"]
+
+# Number of per-chunk segment aggregates collected before they are merged
+AGGREGATE_MERGE_BATCH = 32
+
+def age_group_labels(age):
+    """Map ages to their AGE_GROUPS label (AGE_GROUPS are assumed not to overlap)."""
+    labels = pd.Series(None, index=age.index, dtype=object)
+    for group in reversed(AGE_GROUPS):
+        in_group = (age <= group["max"]) if group["min"] == 0 else (age >= group["min"]) & (age <= group["max"])
+        labels[in_group] = group["label"]
+    return labels
+
+def dimension_values(df, dim):
+    """Return the segment key column for a dimension, deriving Age_Group from Age."""
+    if dim == "Age_Group" and dim not in df.columns:
+        return age_group_labels(df["Age"]).rename(dim)
+    return df[dim]
+
+def factorize_dimension(df, dim):
+    """Integer-code a dimension in first-appearance order, keeping missing values as a code."""
+    return pd.factorize(dimension_values(df, dim), use_na_sentinel=False)
+
+def aggregate_segments(df, dims, factorized=None):
+    """
+    Aggregate segment statistics for every combination of `dims` in one groupby pass.
+
+    Args:
+        df: Preprocessed e-commerce DataFrame.
+        dims: Dimension columns to segment by (e.g. ["Gender"] or ["Gender", "Purchase_Channel"]).
+        factorized: Optional {column: (codes, uniques)} cache shared between calls so
+            each column is only factorized once per DataFrame.
+
+    Returns:
+        Dict with "dims", a "stats" DataFrame holding the segment size and the
+        sum/non-null count of each MEASURE_COLUMNS column, and "distributions"
+        mapping each DISTRIBUTION_COLUMNS column to per-segment value counts.
+        Segments keep their order of first appearance and missing keys are kept
+        as their own group, so every row is accounted for.
+    """
+    factorized = {} if factorized is None else factorized
+
+    def codes(col):
+        if col not in factorized:
+            factorized[col] = factorize_dimension(df, col)
+        return factorized[col]
+
+    keys = [codes(dim) for dim in dims]
+    measures = df[MEASURE_COLUMNS].copy()
+    for col, scale in MEASURE_SCALES.items():
+        measures[col] = (measures[col].astype(float) * scale).round()
+    grouped = measures.groupby([key_codes for key_codes, _ in keys], sort=False)
+    stats = grouped.agg(["sum", "count"])
+    stats.columns = [f"{col}_{agg}" for col, agg in stats.columns]
+    stats.insert(0, "count", grouped.size())
+    stats.index = _decode_index(stats.index, keys, dims)
+    stats = _from_units(stats)
+
+    distributions = {}
+    for col in DISTRIBUTION_COLUMNS:
+        if col in dims:
+            continue
+        dist_keys = keys + [codes(col)]
+        counts = pd.Series(0, index=df.index).groupby([key_codes for key_codes, _ in dist_keys], sort=False).size()
+        counts.index = _decode_index(counts.index, dist_keys, dims + [f"_{col}"])
+        distributions[col] = counts
+
+    return {"dims": list(dims), "stats": stats, "distributions": distributions}
+
+def aggregate_single_dimensions(df, factorized=None):
+    """Aggregate every SINGLE_DIMENSIONS column plus Age_Group."""
+    factorized = {} if factorized is None else factorized
+    dims = [dim["column"] for dim in SINGLE_DIMENSIONS] + ["Age_Group"]
+    return {dim: aggregate_segments(df, [dim], factorized) for dim in dims}
+
+def aggregate_multi_dimensions(df, factorized=None):
+    """Aggregate every MULTI_DIMENSIONS pair."""
+    factorized = {} if factorized is None else factorized
+    return {
+        (combo["dim1"], combo["dim2"]): aggregate_segments(df, [combo["dim1"], combo["dim2"]], factorized)
+        for combo in MULTI_DIMENSIONS
+    }
+
+def merge_segment_aggregates(aggregates):
+    """
+    Merge aggregates over the same dimensions, e.g. from consecutive CSV chunks.
+
+    Counts, sums and value counts are added; segments keep their order of first
+    appearance across the inputs, so the merged aggregate matches the one
+    computed over the concatenated rows (MEASURE_SCALES sums exactly).
+    """
+    if len(aggregates) == 1:
+        return aggregates[0]
+    return {
+        "dims": aggregates[0]["dims"],
+        "stats": _from_units(_merge_counts([_to_units(aggregate["stats"]) for aggregate in aggregates])),
+        "distributions": {
+            col: _merge_counts([aggregate["distributions"][col] for aggregate in aggregates])
+            for col in aggregates[0]["distributions"]
+        },
+    }
+
+def merge_aggregate_maps(aggregate_maps):
+    """Merge {dims key: aggregate} maps such as aggregate_single_dimensions results."""
+    return {
+        key: merge_segment_aggregates([aggregate_map[key] for aggregate_map in aggregate_maps])
+        for key in aggregate_maps[0]
+    }
+
+class SegmentAggregator:
+    """
+    Accumulates single- and multi-dimension segment aggregates chunk by chunk.
+
+    Per-chunk aggregates are folded together every AGGREGATE_MERGE_BATCH chunks,
+    so the number held stays bounded. stream_table_rag_documents fills one while
+    it creates the documents, and the template QA pairs reuse its result.
+    """
+
+    def __init__(self):
+        self.total_count = 0
+        self._single = []
+        self._multi = []
+
+    def add(self, chunk):
+        factorized = {}
+        self._single.append(aggregate_single_dimensions(chunk, factorized))
+        self._multi.append(aggregate_multi_dimensions(chunk, factorized))
+        self.total_count += len(chunk)
+        if len(self._single) >= AGGREGATE_MERGE_BATCH:
+            self._fold()
+
+    def result(self):
+        """
+        Returns:
+            (single-dimension aggregates, multi-dimension aggregates, row count), as
+            computed over the concatenated chunks (None aggregates if no chunk was added).
+        """
+        if not self._single:
+            return None, None, 0
+        self._fold()
+        return self._single[0], self._multi[0], self.total_count
+
+    def _fold(self):
+        self._single = [merge_aggregate_maps(self._single)]
+        self._multi = [merge_aggregate_maps(self._multi)]
+
+def aggregate_chunks(chunks):
+    """
+    Aggregate single- and multi-dimension segments over an iterable of DataFrame chunks.
+
+    Returns:
+        SegmentAggregator.result() over the chunks.
+    """
+    aggregator = SegmentAggregator()
+    for chunk in chunks:
+        aggregator.add(chunk)
+    return aggregator.result()
+
+def segment_table(aggregate):
+    """Return {segment key tuple: stats row dict} in first-appearance order."""
+    return {_as_tuple(key): row for key, row in aggregate["stats"].to_dict("index").items()}
+
+def segment_distributions(aggregate):
+    """Return {column: {segment key tuple: {value: count}}}, skipping missing values."""
+    n_keys = len(aggregate["dims"])
+    result = {}
+    for col, counts in aggregate["distributions"].items():
+        by_segment = {}
+        for key, count in counts.items():
+            if pd.isna(key[n_keys]):
+                continue
+            by_segment.setdefault(key[:n_keys], {})[key[n_keys]] = count
+        result[col] = by_segment
+    return result
+
+def parent_table(aggregate):
+    """Roll a two-dimension aggregate up to its first dimension."""
+    parents = _from_units(_to_units(aggregate["stats"]).groupby(level=0, sort=False, dropna=False, observed=True).sum())
+    return {key: row for key, row in parents.to_dict("index").items()}
+
+def calculate_segment_stats(segment, total_count, parent=None):
+    """Calculate the statistics for a segment from its aggregated row."""
+    stats = {
+        "count": segment["count"],
+        "total_count": total_count,
+        "percentage": segment["count"] / total_count * 100,
+        "avg_purchase": _mean(segment, "Purchase_Amount"),
+        "total_purchase": segment["Purchase_Amount_sum"],
+        "avg_satisfaction": _mean(segment, "Customer_Satisfaction"),
+        "discount_usage": _mean(segment, "Discount_Used") * 100,
+        "loyalty_membership": _mean(segment, "Customer_Loyalty_Program_Member") * 100,
+    }
+    if parent is not None:
+        stats["parent_count"] = parent["count"]
+        stats["percentage_of_parent"] = segment["count"] / parent["count"] * 100
+        stats["percentage_of_total"] = segment["count"] / total_count * 100
+        stats["parent_avg_purchase"] = _mean(parent, "Purchase_Amount")
+        stats["parent_avg_satisfaction"] = _mean(parent, "Customer_Satisfaction")
+    return stats
+
+def value_distribution(counts):
+    """Turn {value: count} into percentages ordered like Series.value_counts(normalize=True)."""
+    counts = pd.Series(counts, dtype="int64")
+    return counts.sort_values(ascending=False) / counts.sum() * 100
+
+def _decode_index(index, keys, names):
+    """Replace the integer codes of a groupby result index with the original values."""
+    if len(keys) == 1:
+        return pd.Index(keys[0][1].take(index.to_numpy()), name=names[0])
+    return pd.MultiIndex.from_arrays(
+        [uniques.take(index.get_level_values(i).to_numpy()) for i, (_, uniques) in enumerate(keys)],
+        names=names,
+    )
+
+def _to_units(stats):
+    """
+    Stats with the MEASURE_SCALES sums back in integer units.
+
+    A sum of whole units below 2**50 is recovered exactly from its float in
+    dollars (or other unit), so sums can be added without rounding.
+    """
+    stats = stats.copy()
+    for col, scale in MEASURE_SCALES.items():
+        stats[f"{col}_sum"] = (stats[f"{col}_sum"] * scale).round()
+    return stats
+
+def _from_units(stats):
+    """Inverse of _to_units, dividing each MEASURE_SCALES sum once."""
+    for col, scale in MEASURE_SCALES.items():
+        stats[f"{col}_sum"] = stats[f"{col}_sum"] / scale
+    return stats
+
+def _merge_counts(frames):
+    combined = pd.concat(frames)
+    levels = list(range(combined.index.nlevels))
+    return combined.groupby(level=levels if len(levels) > 1 else 0, sort=False, dropna=False, observed=True).sum()
+
+def _mean(row, col):
+    count = row[f"{col}_count"]
+    return row[f"{col}_sum"] / count if count else float("nan")
+
+def _as_tuple(key):
+    return key if isinstance(key, tuple) else (key,)
@@ -0,0 +1,298 @@
+import math
+import numpy as np
+import pandas as pd
+from config.settings import SINGLE_DIMENSIONS
+from src.segment_aggregation import MEASURE_COLUMNS, MEASURE_SCALES, DISTRIBUTION_COLUMNS, factorize_dimension
+
+# Dimensions of the cube: every single dimension plus the derived age groups
+CUBE_DIMENSIONS = [dim["column"] for dim in SINGLE_DIMENSIONS] + ["Age_Group"]
+
+def _value_key(value):
+    """Dictionary key of a dimension value; every kind of missing value is None."""
+    return None if pd.isna(value) else value
+
+class SegmentCube:
+    """
+    Materialized cube of mergeable segment aggregates over integer-coded dimensions.
+
+    The base cells hold, for every combination of dimension values that occurs,
+    the customer count and the sum, sum of squares and non-null count of each
+    MEASURE_COLUMNS column, plus value histograms of the DISTRIBUTION_COLUMNS
+    that are not cube dimensions (those that are come from drilling down).
+    Dimension values are stored once per dimension and cells as int32 codes.
+    Chunks can be added one at a time, so the cube is built in one pass over a
+    streamed CSV: each chunk is reduced to its own cells, which are then added
+    to the matching base cells by key instead of re-reducing the whole cube.
+    MEASURE_SCALES columns are summed in whole units (cents), as in the segment
+    aggregates, so sums do not depend on the chunking.
+
+    There is at most one base cell per combination of dimension values, so
+    their number is bounded by the product of the dimensions' cardinalities
+    (and the row count). The dimensions are categorical, with ages bucketed
+    into Age_Group; with all of them that product is in the tens of millions,
+    so pass fewer `dims` to bound the cells of large data well below its rows.
+
+    Segments over any subset of the dimensions are answered from a roll-up of
+    the base cells (a cuboid) that is computed once per subset and then looked
+    up by key, so a 1-, 2- or 3-way segment costs a dictionary lookup.
+
+    Args:
+        dims: Cube dimensions (default: CUBE_DIMENSIONS).
+    """
+
+    def __init__(self, dims=None):
+        self.dims = list(dims or CUBE_DIMENSIONS)
+        self.measures = list(MEASURE_COLUMNS)
+        self.histogram_columns = [col for col in DISTRIBUTION_COLUMNS if col not in self.dims]
+        # Per dimension (and histogram column): its values in code order and the code of each value
+        self.values = {col: [] for col in self.dims + self.histogram_columns}
+        self.codes = {col: {} for col in self.dims + self.histogram_columns}
+        self.scales = np.array([MEASURE_SCALES.get(col, 1) for col in self.measures], dtype=float)
+        self.total_count = 0
+        # Base cells in arrays grown by doubling, the first `_size` rows in use
+        self._cells = self._empty_cells(0)
+        self._size = 0
+        # Index of the base cells: their code rows viewed as bytes, sorted, and the cell of each
+        self._key_dtype = np.dtype((np.void, 4 * len(self.dims)))
+        self._index_keys = np.empty(0, dtype=self._key_dtype)
+        self._index_rows = np.empty(0, dtype=np.int64)
+        self._cuboids = {}
+
+    @property
+    def cells(self):
+        """The base cells: "keys" (dimension codes), "count", "sum", "sumsq", "nonnull" and "histograms"."""
+        cells = {name: self._cells[name][:self._size] for name in ("keys", "count", "sum", "sumsq", "nonnull")}
+        cells["histograms"] = {col: histogram[:self._size] for col, histogram in self._cells["histograms"].items()}
+        return cells
+
+    def _empty_cells(self, size):
+        return {
+            "keys": np.zeros((size, len(self.dims)), dtype=np.int32),
+            "count": np.zeros(size, dtype=np.int64),
+            "sum": np.zeros((size, len(self.measures))),
+            "sumsq": np.zeros((size, len(self.measures))),
+            "nonnull": np.zeros((size, len(self.measures)), dtype=np.int64),
+            "histograms": {col: np.zeros((size, 0), dtype=np.int64) for col in self.histogram_columns},
+        }
+
+    def _encode(self, col, chunk_codes, uniques):
+        """Map a chunk's factorized codes to the cube's codes for `col`, registering new values."""
+        codes, values = self.codes[col], self.values[col]
+        mapping = np.empty(len(uniques), dtype=np.int32)
+        for i, value in enumerate(uniques):
+            key = _value_key(value)
+            if key not in codes:
+                codes[key] = len(values)
+                values.append(key)
+            mapping[i] = codes[key]
+        return mapping[chunk_codes]
+
+    def add(self, df):
+        """Add the rows of a preprocessed DataFrame (chunk) to the cube."""
+        if len(df) == 0:
+            return
+        keys = np.column_stack([self._encode(dim, *factorize_dimension(df, dim)) for dim in self.dims])
+        measures = np.column_stack([df[col].to_numpy(dtype=float, na_value=np.nan) for col in self.measures])
+        nonnull = ~np.isnan(measures)
+        measures = np.where(nonnull, measures, 0.0)
+        units = measures * self.scales
+        scaled = self.scales != 1
+        units[:, scaled] = np.round(units[:, scaled])
+        rows = {
+            "keys": keys,
+            "count": np.ones(len(df), dtype=np.int64),
+            "sum": units,
+            "sumsq": measures * measures,
+            "nonnull": nonnull.astype(np.int64),
+            "histograms": {},
+        }
+        for col in self.histogram_columns:
+            codes = self._encode(col, *pd.factorize(df[col], use_na_sentinel=False))
+            histogram = np.zeros((len(df), len(self.values[col])), dtype=np.int64)
+            histogram[np.arange(len(df)), codes] = 1
+            rows["histograms"][col] = histogram
+
+        self._merge(self._reduce(rows, list(range(len(self.dims)))))
+        self.total_count += len(df)
+        self._cuboids = {}
+
+    def _merge(self, chunk):
+        """Add the reduced cells of a chunk to the base cells with the same keys, appending new keys."""
+        keys = np.ascontiguousarray(chunk["keys"], dtype=np.int32).view(self._key_dtype).ravel()
+        slots = np.searchsorted(self._index_keys, keys)
+        found = np.zeros(len(keys), dtype=bool)
+        inside = slots < len(self._index_keys)
+        found[inside] = self._index_keys[slots[inside]] == keys[inside]
+        positions = np.empty(len(keys), dtype=np.int64)
+        positions[found] = self._index_rows[slots[found]]
+        new = np.flatnonzero(~found)
+        positions[new] = self._size + np.arange(len(new))
+        order = new[np.argsort(keys[new], kind="stable")]
+        self._index_keys = np.insert(self._index_keys, slots[order], keys[order])
+        self._index_rows = np.insert(self._index_rows, slots[order], positions[order])
+        self._reserve(self._size + len(new))
+        cells = self._cells
+        cells["keys"][positions[new]] = chunk["keys"][new]
+        self._size += len(new)
+        # Positions are distinct within a reduced chunk, so fancy-indexed += adds every cell
+        for name in ("count", "sum", "sumsq", "nonnull"):
+            cells[name][positions] += chunk[name]
+        for col, histogram in chunk["histograms"].items():
+            cells["histograms"][col][positions, :histogram.shape[1]] += histogram
+
+    def _reserve(self, size):
+        """Grow the base cell arrays to at least `size` rows (doubling) and the histograms to every value."""
+        capacity = len(self._cells["count"])
+        if size > capacity:
+            capacity = max(size, 2 * capacity)
+        for name in ("keys", "count", "sum", "sumsq", "nonnull"):
+            self._cells[name] = _grow(self._cells[name], capacity)
+        for col, histogram in self._cells["histograms"].items():
+            self._cells["histograms"][col] = _grow(histogram, capacity, len(self.values[col]))
+
+    def consume(self, chunks):
+        """Yield each chunk of an iterable after adding it to the cube, to build it alongside another pass."""
+        for chunk in chunks:
+            self.add(chunk)
+            yield chunk
+
+    def _reduce(self, cells, columns):
+        """Group `cells` by the dimension codes in `columns`, summing every aggregate."""
+        keys = cells["keys"][:, columns]
+        cardinalities = [max(len(self.values[self.dims[c]]), 1) for c in columns]
+        if math.prod(cardinalities) < 2**62:
+            # Mixed-radix packing of the codes into one int64 key per cell
+            packed = np.zeros(len(keys), dtype=np.int64)
+            for i, cardinality in enumerate(cardinalities):
+                packed = packed * cardinality + keys[:, i]
+            unique, inverse = np.unique(packed, return_inverse=True)
+            unique_keys = np.zeros((len(unique), len(columns)), dtype=np.int32)
+            for i in reversed(range(len(columns))):
+                unique, unique_keys[:, i] = np.divmod(unique, cardinalities[i])
+        else:
+            unique_keys, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        size = len(unique_keys)
+
+        def total(values):
+            if values.ndim == 1:
+                return np.bincount(inverse, weights=values, minlength=size).astype(values.dtype)
+            return np.column_stack([total(values[:, j]) for j in range(values.shape[1])]) if values.shape[1] \
+                else np.zeros((size, 0), dtype=values.dtype)
+
+        return {
+            "keys": unique_keys.astype(np.int32),
+            "count": total(cells["count"]),
+            "sum": total(cells["sum"]),
+            "sumsq": total(cells["sumsq"]),
+            "nonnull": total(cells["nonnull"]),
+            "histograms": {col: total(histogram) for col, histogram in cells["histograms"].items()},
+        }
+
+    def cuboid(self, dims):
+        """
+        Roll-up of the base cells to `dims`, computed on first use and kept.
+
+        Returns the aggregates of every occurring segment over `dims` (in cube
+        dimension order) plus "index", mapping each segment's code tuple to its row.
+        """
+        unknown = [dim for dim in dims if dim not in self.dims]
+        if unknown:
+            raise ValueError(f"Not cube dimensions: {unknown}")
+        key = tuple(sorted(set(dims), key=self.dims.index))
+        cuboid = self._cuboids.get(key)
+        if cuboid is None:
+            cuboid = self._reduce(self.cells, [self.dims.index(dim) for dim in key])
+            cuboid["dims"] = key
+            cuboid["index"] = {tuple(codes): row for row, codes in enumerate(cuboid["keys"].tolist())}
+            self._cuboids[key] = cuboid
+        return cuboid
+
+    def _locate(self, criteria):
+        """(cuboid, row) of the segment matching {dimension: value}, row None if it has no customers."""
+        cuboid = self.cuboid(criteria)
+        codes = []
+        for dim in cuboid["dims"]:
+            code = self.codes[dim].get(_value_key(criteria[dim]))
+            if code is None:
+                return cuboid, None
+            codes.append(code)
+        return cuboid, cuboid["index"].get(tuple(codes))
+
+    def segment(self, criteria):
+        """
+        Aggregates of the customers matching {dimension: value} (an empty dict rolls up to everyone).
+
+        Returns a row like those of segment_table(), so calculate_segment_stats
+        applies: "count" plus "<column>_sum", "<column>_count" and "<column>_sumsq"
+        per measure column. None if no customer matches.
+        """
+        cuboid, row = self._locate(criteria)
+        if row is None:
+            return None
+        result = {"count": int(cuboid["count"][row])}
+        for j, col in enumerate(self.measures):
+            result[f"{col}_sum"] = float(cuboid["sum"][row, j] / self.scales[j])
+            result[f"{col}_count"] = int(cuboid["nonnull"][row, j])
+            result[f"{col}_sumsq"] = float(cuboid["sumsq"][row, j])
+        return result
+
+    def drill_down(self, criteria, dim):
+        """{value of `dim`: segment row} for the segments one level below `criteria`, in code order."""
+        cuboid = self.cuboid([*criteria, dim])
+        positions = [cuboid["dims"].index(d) for d in criteria]
+        fixed = [self.codes[d].get(_value_key(criteria[d])) for d in criteria]
+        if any(code is None for code in fixed):
+            return {}
+        position = cuboid["dims"].index(dim)
+        children = {}
+        for code, value in enumerate(self.values[dim]):
+            codes = [0] * len(cuboid["dims"])
+            for p, c in zip(positions, fixed):
+                codes[p] = c
+            codes[position] = code
+            if tuple(codes) in cuboid["index"]:
+                children[value] = self.segment({**criteria, dim: value})
+        return children
+
+    def distribution(self, criteria, column):
+        """{value: customers} of `column` within a segment, skipping missing values."""
+        if column in self.dims:
+            return {value: row["count"] for value, row in self.drill_down(criteria, column).items() if value is not None}
+        cuboid, row = self._locate(criteria)
+        if row is None:
+            return {}
+        histogram = cuboid["histograms"][column][row]
+        return {value: int(count) for value, count in zip(self.values[column], histogram) if count and value is not None}
+
+    def memory_bytes(self):
+        """Bytes held by the base cell arrays (with spare capacity) and their index, the dimension dictionaries aside."""
+        cells = self._cells
+        return sum(cells[name].nbytes for name in ("keys", "count", "sum", "sumsq", "nonnull")) + \
+            sum(histogram.nbytes for histogram in cells["histograms"].values()) + \
+            self._index_keys.nbytes + self._index_rows.nbytes
+
+def _grow(array, rows, columns=None):
+    """`array` zero-padded to `rows` rows (and `columns` columns), or itself if already that large."""
+    columns = array.shape[1] if columns is None and array.ndim == 2 else columns
+    if len(array) >= rows and (columns is None or array.shape[1] >= columns):
+        return array
+    rows = max(rows, len(array))
+    grown = np.zeros((rows, columns) if columns is not None else rows, dtype=array.dtype)
+    grown[tuple(slice(0, n) for n in array.shape)] = array
+    return grown
+
+def segment_std(segment, col):
+    """Population standard deviation of a measure column within a segment row."""
+    count = segment[f"{col}_count"]
+    if not count:
+        return float("nan")
+    mean = segment[f"{col}_sum"] / count
+    return math.sqrt(max(segment[f"{col}_sumsq"] / count - mean * mean, 0.0))
+
+def build_segment_cube(chunks, dims=None):
+    """Build a SegmentCube over an iterable of preprocessed DataFrame chunks."""
+    cube = SegmentCube(dims)
+    for chunk in chunks:
+        cube.add(chunk)
+    return cube
@@ -1,4 +1,5 @@
 from datetime import datetime
+import numpy as np
 import pandas as pd
 
 def format_value(value):
@@ -12,3 +13,35 @@ def format_value(value):
     if isinstance(value, (int, float)):
         return str(int(value)) if isinstance(value, float) and value == int(value) else str(value)
     return str(value)
+
+def format_column(series):
+    """Vectorized equivalent of format_value applied to every value of a Series."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # Format each category once and expand through the codes
+        categories = format_column(pd.Series(series.cat.categories)).to_numpy(dtype=object)
+        if len(categories) == 0:
+            # Every value is missing (e.g. a chunk of an optimized column that is all NaN)
+            return pd.Series("N/A", index=series.index, dtype=object)
+        codes = series.cat.codes.to_numpy()
+        return pd.Series(np.where(codes >= 0, categories[codes], "N/A"), index=series.index, dtype=object)
+    missing = series.isna()
+    if pd.api.types.is_bool_dtype(series) or pd.api.types.is_integer_dtype(series):
+        formatted = series.astype(str)
+    elif pd.api.types.is_float_dtype(series):
+        values = series.to_numpy()
+        whole = ~missing.to_numpy() & (values == np.floor(values))
+        if (np.abs(values[whole]) >= 2**63).any():
+            return series.map(format_value)
+        formatted = series.astype(str).to_numpy(dtype=object)
+        formatted[whole] = values[whole].astype(np.int64).astype(str)
+        formatted = pd.Series(formatted, index=series.index)
+    elif pd.api.types.is_datetime64_any_dtype(series):
+        stamps = series[~missing]
+        if stamps.dt.tz is not None or (stamps.dt.microsecond != 0).any() or (stamps.dt.nanosecond != 0).any():
+            return series.map(format_value)
+        formatted = series.dt.strftime("%Y-%m-%d %H:%M:%S")
+    elif pd.api.types.infer_dtype(series, skipna=True) in ("string", "empty"):
+        formatted = series.astype(str)
+    else:
+        return series.map(format_value)
+    return formatted.where(~missing, "N/A")
@@ -0,0 +1,142 @@
+import faiss
+import numpy as np
+
+# Supported index types and their default build and search parameters
+INDEX_DEFAULTS = {
+    "flat": {},
+    "ivf_flat": {"nlist": 1024, "nprobe": 16},
+    "ivf_pq": {"nlist": 1024, "pq_m": 16, "pq_nbits": 8, "nprobe": 16},
+    "hnsw": {"hnsw_m": 32, "ef_construction": 200, "ef_search": 64},
+}
+
+# Parameters that only affect queries; changing them does not require a rebuild
+SEARCH_PARAMS = ("nprobe", "ef_search")
+
+# Filtered searches over at most this many candidates are done exactly
+EXACT_FILTER_MAX_IDS = 10_000
+
+# Minimum training points per IVF list recommended by FAISS
+MIN_POINTS_PER_LIST = 39
+
+def index_factory_string(index_type, dim, num_vectors, params=None):
+    """
+    Return the faiss.index_factory description for an index type.
+
+    The number of IVF lists is capped so that every list gets enough training
+    points, which keeps small document sets from failing to train.
+    """
+    params = resolve_index_params(index_type, params)
+    if index_type == "flat":
+        return "Flat"
+    if index_type == "hnsw":
+        return f"HNSW{params['hnsw_m']}"
+
+    nlist = max(1, min(params["nlist"], num_vectors // MIN_POINTS_PER_LIST))
+    if index_type == "ivf_flat":
+        return f"IVF{nlist},Flat"
+    if dim % params["pq_m"] != 0:
+        raise ValueError(f"Embedding dimension {dim} is not divisible by pq_m={params['pq_m']}")
+    return f"IVF{nlist},PQ{params['pq_m']}x{params['pq_nbits']}"
+
+def resolve_index_params(index_type, params=None):
+    """Merge user parameters over the defaults of an index type."""
+    if index_type not in INDEX_DEFAULTS:
+        raise ValueError(f"Unknown index type {index_type!r}, expected one of {list(INDEX_DEFAULTS)}")
+    return {**INDEX_DEFAULTS[index_type], **(params or {})}
+
+def build_params(index_type, params=None):
+    """Resolved parameters that determine how the index is built (i.e. excluding SEARCH_PARAMS)."""
+    return {
+        key: value for key, value in resolve_index_params(index_type, params).items()
+        if key in INDEX_DEFAULTS[index_type] and key not in SEARCH_PARAMS
+    }
+
+def create_index(vectors, index_type="flat", params=None):
+    """
+    Create an empty FAISS index of the given type, trained on `vectors` if required.
+
+    Args:
+        vectors: Training vectors, shape (n, dim).
+        index_type: One of "flat", "ivf_flat", "ivf_pq" or "hnsw".
+        params: Optional overrides of INDEX_DEFAULTS[index_type].
+
+    Returns:
+        A faiss index ready for add(), with search parameters applied.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    params = resolve_index_params(index_type, params)
+    if index_type == "ivf_pq" and len(vectors) < 2 ** params["pq_nbits"]:
+        print(f"Only {len(vectors)} vectors, too few to train PQ{params['pq_m']}x{params['pq_nbits']}; using ivf_flat")
+        index_type = "ivf_flat"
+
+    description = index_factory_string(index_type, vectors.shape[1], len(vectors), params)
+    index = faiss.index_factory(vectors.shape[1], description)
+    if index_type == "hnsw":
+        index.hnsw.efConstruction = params["ef_construction"]
+    if not index.is_trained:
+        index.train(vectors)
+    apply_search_params(index, params)
+    print(f"Created {description} index ({index_type})")
+    return index
+
+def needs_training(index_type):
+    """Whether indexes of this type must be trained on the vectors before any are added."""
+    return index_type in ("ivf_flat", "ivf_pq")
+
+def supports_removal(index):
+    """Whether vectors can be removed from a FAISS index (HNSW indexes do not support it)."""
+    try:
+        index.remove_ids(np.zeros(0, dtype=np.int64))
+    except RuntimeError:
+        return False
+    return True
+
+def apply_search_params(index, params=None):
+    """Set query-time knobs (nprobe for IVF indexes, ef_search for HNSW) on a loaded index."""
+    params = params or {}
+    if "nprobe" in params:
+        try:
+            faiss.extract_index_ivf(index).nprobe = params["nprobe"]
+        except RuntimeError:
+            pass
+    if "ef_search" in params and hasattr(index, "hnsw"):
+        index.hnsw.efSearch = params["ef_search"]
+
+def filtered_search(index, queries, k, allowed_ids):
+    """
+    Search only among `allowed_ids` (e.g. positions from a MetadataIndex).
+
+    Graph and inverted-list traversal can miss most of a selective filter, so
+    small candidate sets are searched exactly over their reconstructed vectors,
+    or, for IVF indexes (which cannot reconstruct without a direct map), by
+    probing every list. Otherwise an ID selector is passed through the index's
+    own search-parameter type so its current nprobe/ef_search still apply.
+    """
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    allowed_ids = np.asarray(allowed_ids, dtype=np.int64)
+    if len(allowed_ids) <= EXACT_FILTER_MAX_IDS:
+        try:
+            candidates = index.reconstruct_batch(allowed_ids)
+        except RuntimeError:
+            candidates = None
+        if candidates is not None:
+            exact = faiss.IndexFlat(index.d, index.metric_type)
+            exact.add(candidates)
+            distances, positions = exact.search(queries, k)
+            return distances, np.where(positions >= 0, allowed_ids[positions], -1)
+
+    selector = faiss.IDSelectorBatch(allowed_ids)
+    try:
+        ivf = faiss.extract_index_ivf(index)
+        nprobe = ivf.nlist if len(allowed_ids) <= EXACT_FILTER_MAX_IDS else ivf.nprobe
+        params = faiss.SearchParametersIVF(sel=selector, nprobe=nprobe)
+    except RuntimeError:
+        if hasattr(index, "hnsw"):
+            params = faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+        else:
+            params = faiss.SearchParameters(sel=selector)
+    return index.search(queries, k, params=params)
+
+def index_memory_bytes(index):
+    """Size of the serialized index, a close proxy for its memory footprint."""
+    return faiss.serialize_index(index).nbytes
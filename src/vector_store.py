@@ -1,29 +1,421 @@
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np
 from langchain_ollama import OllamaEmbeddings
+from langchain.docstore.in_memory import InMemoryDocstore
 from langchain.vectorstores import FAISS
+from src.document_store import CompactDocumentStore, as_document
+from src.embedding_cache import EmbeddingCache
+from src.vector_index import create_index, apply_search_params, build_params, needs_training, supports_removal
 
-def create_vector_store(documents, embedding_model, save_path):
+# Number of embedded batches between embedding-cache flushes
+CACHE_FLUSH_EVERY = 16
+
+# File next to the FAISS index recording the ID, content hash and source of every vector
+MANIFEST_FILE = "manifest.json"
+
+def create_vector_store(documents, embedding_model, save_path, batch_size=64, max_workers=4,
+                        max_in_flight=8, max_retries=3, embeddings=None, cache_dir=None,
+                        cache_max_entries=1_000_000, incremental=True, index_type="flat", index_params=None,
+                        compact_documents=False):
     """
-    Create and save a FAISS vector store from documents.
-    
+    Create or update and save a FAISS vector store from documents.
+
+    Documents are consumed in one pass, so they can come from a generator: they
+    are grouped into embedding batches as they arrive, at most `max_in_flight`
+    batches are embedded at a time, and each embedded batch goes straight into
+    the store. Apart from the store itself, memory is bounded by the batches in
+    flight rather than by the number of documents.
+
+    Every document gets a stable ID derived from its metadata (see document_id), and
+    a manifest next to the index records the content hash and source of each ID.
+    With `incremental`, an existing index built with the same embedding model is
+    updated in place: vectors of changed or removed documents are deleted and only
+    new or changed documents are embedded and added. The index is rebuilt from
+    scratch when there is no manifest, the embedding model or index configuration
+    changed, or the index type does not support removal (e.g. HNSW).
+
     Args:
-        documents: List of LangChain Document objects to embed.
+        documents: Iterable of LangChain Document objects to embed, consumed once.
         embedding_model: Name of the Ollama embedding model.
         save_path: Path to save the FAISS index.
-    
+        batch_size: Number of documents sent per embedding request.
+        max_workers: Number of concurrent embedding workers.
+        max_in_flight: Maximum number of batches submitted but not yet finished.
+        max_retries: Retries per failed batch before giving up.
+        embeddings: Optional embeddings object to use instead of OllamaEmbeddings
+            (e.g. a deterministic stub).
+        cache_dir: Optional directory of the persistent embedding cache; only
+            documents whose page_content is not cached for `embedding_model` are embedded.
+        cache_max_entries: Maximum number of cached embeddings per model.
+        incremental: Update an existing compatible index instead of rebuilding it.
+        index_type: FAISS index type: "flat" (exact), "ivf_flat", "ivf_pq" or "hnsw".
+        index_params: Build and search parameters overriding the defaults of
+            `index_type` (see src/vector_index.py).
+        compact_documents: Keep new stores' documents in a CompactDocumentStore
+            (see src/document_store.py) instead of as LangChain Documents.
+
     Returns:
-        None
+        The saved FAISS vector store.
     """
     try:
         # Initialize embeddings
-        embeddings = OllamaEmbeddings(model=embedding_model)
-        
-        # Create vector store
-        vector_store = FAISS.from_documents(documents, embeddings)
-        
-        # Save vector store
+        embeddings = embeddings or OllamaEmbeddings(model=embedding_model)
+        cache = EmbeddingCache(cache_dir, embedding_model, cache_max_entries) if cache_dir else None
+
+        def embed(batches):
+            return embed_document_batches(batches, embeddings, cache, max_workers, max_in_flight, max_retries)
+
+        index_config = {"type": index_type, "params": build_params(index_type, index_params)}
+        vector_store = None
+        previous = load_manifest(save_path) if incremental else None
+        if previous is None:
+            print("No compatible vector store manifest found, building a new index")
+        elif previous["embedding_model"] != embedding_model:
+            print(f"Embedding model changed from {previous['embedding_model']} to {embedding_model}, rebuilding index")
+        elif previous.get("index") != index_config:
+            print(f"Index configuration changed to {index_config}, rebuilding index")
+        else:
+            vector_store = FAISS.load_local(save_path, embeddings, allow_dangerous_deserialization=True)
+            # Decided before any document is consumed, since they cannot be replayed
+            if not supports_removal(vector_store.index):
+                print("Index does not support removing vectors, rebuilding index")
+                vector_store = None
+
+        entries = {}
+        identified = identify_documents(documents, entries)
+        if vector_store is not None:
+            apply_search_params(vector_store.index, index_params)
+            update_vector_store(vector_store, identified, entries, previous, embed, batch_size)
+        else:
+            # Create vector store
+            vector_store = build_vector_store(embeddings, embed(document_batches(identified, batch_size)),
+                                              index_type, index_params, compact_documents)
+        if isinstance(vector_store.docstore, CompactDocumentStore):
+            print(f"Document store: {vector_store.docstore.summary()}")
+
+        # Save vector store. The old manifest goes first: a crash while the index is written
+        # then leaves no manifest, and the next run rebuilds instead of diffing against it
+        remove_manifest(save_path)
         vector_store.save_local(save_path)
+        save_manifest(save_path, {"embedding_model": embedding_model, "index": index_config, "documents": entries})
         print(f"Vector store saved to {save_path}")
-        
+        return vector_store
+
     except Exception as e:
         print(f"Error creating vector store: {str(e)}")
         raise
+
+def identify_documents(documents, entries):
+    """
+    Yield (ID, document) pairs, recording each document's manifest entry in `entries`.
+
+    Raises:
+        ValueError: If two documents have the same ID.
+    """
+    for doc in documents:
+        doc_id = document_id(doc.metadata)
+        if doc_id in entries:
+            raise ValueError(f"Documents do not have unique IDs ({doc_id} repeats)")
+        entries[doc_id] = {"hash": content_hash(doc.page_content, doc.metadata), "source": document_source(doc.metadata)}
+        yield doc_id, doc
+
+def document_batches(pairs, batch_size):
+    """Group (ID, document) pairs into lists of `batch_size`, pulling pairs only as batches are needed."""
+    batch = []
+    for pair in pairs:
+        batch.append(pair)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def build_vector_store(embeddings, embedded_batches, index_type="flat", index_params=None, compact_documents=False):
+    """
+    Build a new FAISS store from (batch of (ID, document) pairs, vectors) as they are embedded.
+
+    Indexes that need no training are created from the first batch and filled as
+    batches arrive. IVF indexes are trained on every vector, so their vectors are
+    kept (as float32) until the last batch. Documents go into a
+    CompactDocumentStore with `compact_documents`, otherwise into an
+    InMemoryDocstore as LangChain Documents.
+    """
+    compact_store = CompactDocumentStore() if compact_documents else None
+    documents, index_to_docstore_id = {}, {}
+    index, untrained = None, []
+    for batch, vectors in embedded_batches:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if compact_store is not None:
+            compact_store.add(dict(batch))
+        else:
+            documents.update((doc_id, as_document(doc)) for doc_id, doc in batch)
+        for doc_id, _ in batch:
+            index_to_docstore_id[len(index_to_docstore_id)] = doc_id
+        if index is None and not needs_training(index_type):
+            index = create_index(vectors, index_type, index_params)
+        if index is None:
+            untrained.append(vectors)
+        else:
+            index.add(vectors)
+
+    if index is None:
+        if not untrained:
+            raise ValueError("No documents to index")
+        vectors = np.concatenate(untrained)
+        index = create_index(vectors, index_type, index_params)
+        index.add(vectors)
+    docstore = compact_store if compact_store is not None else InMemoryDocstore(documents)
+    return FAISS(embeddings, index, docstore, index_to_docstore_id)
+
+def update_vector_store(vector_store, identified, entries, previous, embed, batch_size=64):
+    """
+    Apply the documents of `identified` ((ID, document) pairs) to a saved store built from `previous`.
+
+    New and changed documents are embedded and added as they arrive. The vectors
+    they replace, and those of documents that are gone, are removed at the end
+    in one pass, since removal renumbers the whole index.
+    """
+    old_entries = previous["documents"]
+    position_of = {doc_id: position for position, doc_id in vector_store.index_to_docstore_id.items()}
+    unchanged = 0
+
+    def changed():
+        nonlocal unchanged
+        for doc_id, doc in identified:
+            entry = old_entries.get(doc_id)
+            if entry is not None and entry["hash"] == entries[doc_id]["hash"] and doc_id in position_of:
+                unchanged += 1
+            else:
+                yield doc_id, doc
+
+    stale, embedded = [], 0
+    for batch, vectors in embed(document_batches(changed(), batch_size)):
+        ids = [doc_id for doc_id, _ in batch]
+        replaced = [doc_id for doc_id in ids if doc_id in position_of]
+        if replaced:
+            # Old vectors stay in the index until the end; only their documents make way
+            stale.extend(position_of.pop(doc_id) for doc_id in replaced)
+            vector_store.docstore.delete(replaced)
+        texts = [doc.page_content for _, doc in batch]
+        vector_store.add_embeddings(list(zip(texts, vectors)), metadatas=[doc.metadata for _, doc in batch], ids=ids)
+        embedded += len(batch)
+
+    removed = [doc_id for doc_id in position_of if doc_id not in entries]
+    if removed:
+        stale.extend(position_of[doc_id] for doc_id in removed)
+        vector_store.docstore.delete(removed)
+    remove_positions(vector_store, stale)
+    print(f"Incremental update: {embedded} documents embedded, {len(stale)} stale vectors removed, "
+          f"{unchanged} unchanged")
+    return vector_store
+
+def remove_positions(vector_store, positions):
+    """Remove the vectors at FAISS `positions` from a store and renumber its ID map to match."""
+    if not positions:
+        return
+    removed = set(positions)
+    vector_store.index.remove_ids(np.fromiter(removed, dtype=np.int64, count=len(removed)))
+    remaining = [doc_id for position, doc_id in sorted(vector_store.index_to_docstore_id.items())
+                 if position not in removed]
+    vector_store.index_to_docstore_id = dict(enumerate(remaining))
+
+def document_id(metadata):
+    """Stable ID of a document: the row index for rows, the segment key for segments."""
+    doc_type = metadata["doc_type"]
+    if doc_type == "customer_row":
+        return f"row:{metadata['row_idx']}"
+    if doc_type == "segment_statistics":
+        return f"segment:{metadata['dimension']}={metadata['segment_value']}"
+    if doc_type == "multi_segment_statistics":
+        return (f"multi:{metadata['dimension1']}={metadata['value1']}"
+                f"|{metadata['dimension2']}={metadata['value2']}")
+    raise ValueError(f"Unknown document type: {doc_type}")
+
+def document_source(metadata):
+    """Source of a document for the manifest: the customer for rows, the statistics for segments."""
+    if metadata["doc_type"] == "customer_row":
+        return {"row_idx": metadata["row_idx"], "Customer_ID": metadata.get("Customer_ID")}
+    return {key: value for key, value in metadata.items() if key != "doc_type"}
+
+def content_hash(text, metadata):
+    """
+    Hex SHA-256 of a document's page_content and metadata.
+
+    The metadata is serialized with sorted keys, so a document whose metadata
+    alone changes is re-indexed while key order does not matter.
+    """
+    canonical = json.dumps(metadata, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(f"{text}\0{canonical}".encode("utf-8")).hexdigest()
+
+def vector_store_version(save_path):
+    """Version of the saved index: a hash of its manifest, or of the index file's size and mtime."""
+    manifest_path = os.path.join(save_path or "", MANIFEST_FILE)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    index_path = os.path.join(save_path or "", "index.faiss")
+    if os.path.exists(index_path):
+        stat = os.stat(index_path)
+        return f"{stat.st_size}:{stat.st_mtime_ns}"
+    return None
+
+def load_manifest(save_path):
+    """Load the manifest saved with the index, or None if there is no usable index."""
+    manifest_path = os.path.join(save_path, MANIFEST_FILE)
+    if not (os.path.exists(manifest_path) and os.path.exists(os.path.join(save_path, "index.faiss"))):
+        return None
+    with open(manifest_path) as f:
+        return json.load(f)
+
+def save_manifest(save_path, manifest):
+    """Write the manifest next to the index, atomically replacing any old one."""
+    manifest_path = os.path.join(save_path, MANIFEST_FILE)
+    with open(f"{manifest_path}.tmp", "w") as f:
+        json.dump(manifest, f)
+    os.replace(f"{manifest_path}.tmp", manifest_path)
+
+def remove_manifest(save_path):
+    """Delete the manifest, so an index being rewritten is never paired with an outdated one."""
+    manifest_path = os.path.join(save_path, MANIFEST_FILE)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+
+def embed_texts(texts, embeddings, batch_size=64, max_workers=4, max_in_flight=8, max_retries=3, backoff=1.0):
+    """
+    Embed texts in batches on a pool of worker threads.
+
+    At most `max_in_flight` batches are outstanding at any time. A failed batch is
+    retried up to `max_retries` times with exponential backoff before the error is
+    raised.
+
+    Args:
+        texts: List of strings to embed.
+        embeddings: Object exposing embed_documents(list_of_texts).
+        batch_size: Number of texts per embed_documents call.
+        max_workers: Number of worker threads.
+        max_in_flight: Maximum number of submitted, unfinished batches.
+        max_retries: Retries per batch after the first failure.
+        backoff: Delay in seconds before the first retry; doubled on each retry.
+
+    Returns:
+        List of embedding vectors in the same order as `texts`.
+    """
+    batches = ((start, texts[start:start + batch_size]) for start in range(0, len(texts), batch_size))
+    vectors = [None] * len(texts)
+    start_time = time.perf_counter()
+    done_count = 0
+
+    for start, batch, batch_vectors in embed_batches(batches, embeddings, max_workers, max_in_flight, max_retries,
+                                                     backoff):
+        vectors[start:start + len(batch_vectors)] = batch_vectors
+        done_count += len(batch_vectors)
+        elapsed = time.perf_counter() - start_time
+        print(f"\rEmbedded {done_count}/{len(texts)} documents ({done_count / max(elapsed, 1e-9):.1f} docs/sec)", end="")
+
+    elapsed = time.perf_counter() - start_time
+    print(f"\nEmbedded {len(texts)} documents in {elapsed:.1f}s ({len(texts) / max(elapsed, 1e-9):.1f} docs/sec)")
+    return vectors
+
+def embed_batches(batches, embeddings, max_workers=4, max_in_flight=8, max_retries=3, backoff=1.0):
+    """
+    Embed (key, texts) batches on a pool of worker threads, yielding (key, texts, vectors) in input order.
+
+    Batches are pulled from `batches` only while fewer than `max_in_flight` have
+    been pulled but not yet yielded, so a generator of batches is consumed lazily
+    and never runs ahead of the embedder. Batches without texts are passed through
+    without an embedding call. A failed batch is retried as in embed_texts.
+    """
+    batches = iter(batches)
+    completed = {}
+    pulled = yielded = 0
+    exhausted = False
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = set()
+        while True:
+            while not exhausted and pulled - yielded < max_in_flight:
+                item = next(batches, None)
+                if item is None:
+                    exhausted = True
+                    break
+                key, texts = item
+                if texts:
+                    future = executor.submit(_embed_batch, embeddings, texts, max_retries, backoff)
+                    future.sequence, future.batch = pulled, item
+                    pending.add(future)
+                else:
+                    completed[pulled] = (key, texts, [])
+                pulled += 1
+
+            if yielded not in completed:
+                if not pending:
+                    return
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    key, texts = future.batch
+                    completed[future.sequence] = (key, texts, future.result())
+            while yielded in completed:
+                yield completed.pop(yielded)
+                yielded += 1
+
+def embed_document_batches(batches, embeddings, cache=None, max_workers=4, max_in_flight=8, max_retries=3):
+    """
+    Embed batches of (ID, document) pairs as they are pulled, yielding (batch, vectors) in order.
+
+    With an EmbeddingCache, each batch's texts are looked up first and only the
+    missing ones are sent to the embedder; new vectors are written to the cache
+    as batches complete.
+    """
+    cached_count = 0
+
+    def lookups():
+        nonlocal cached_count
+        for batch in batches:
+            texts = [doc.page_content for _, doc in batch]
+            cached = cache.lookup(texts) if cache is not None else [None] * len(texts)
+            cached_count += sum(vector is not None for vector in cached)
+            missing = list(dict.fromkeys(text for text, vector in zip(texts, cached) if vector is None))
+            yield (batch, texts, cached), missing
+
+    start_time = time.perf_counter()
+    done_count, stored_batches = 0, 0
+    try:
+        for (batch, texts, cached), missing, missing_vectors in embed_batches(
+                lookups(), embeddings, max_workers, max_in_flight, max_retries):
+            if cache is not None and missing:
+                cache.insert(missing, missing_vectors)
+                stored_batches += 1
+                if stored_batches % CACHE_FLUSH_EVERY == 0:
+                    cache.flush()
+            embedded = dict(zip(missing, missing_vectors))
+            yield batch, [vector if vector is not None else embedded[text] for text, vector in zip(texts, cached)]
+            done_count += len(batch)
+            elapsed = time.perf_counter() - start_time
+            print(f"\rEmbedded {done_count} documents ({done_count / max(elapsed, 1e-9):.1f} docs/sec)", end="")
+    finally:
+        if cache is not None:
+            cache.flush()
+
+    elapsed = time.perf_counter() - start_time
+    cache_note = f", {cached_count} from the embedding cache" if cache is not None else ""
+    print(f"\nEmbedded {done_count} documents in {elapsed:.1f}s ({done_count / max(elapsed, 1e-9):.1f} docs/sec)"
+          f"{cache_note}")
+
+def _embed_batch(embeddings, batch, max_retries, backoff):
+    """Embed one batch, retrying with exponential backoff."""
+    for attempt in range(max_retries + 1):
+        try:
+            batch_vectors = embeddings.embed_documents(batch)
+            if len(batch_vectors) != len(batch):
+                raise ValueError(f"Expected {len(batch)} embeddings, got {len(batch_vectors)}")
+            return batch_vectors
+        except Exception as e:
+            if attempt == max_retries:
+                raise
+            delay = backoff * 2 ** attempt
+            print(f"\nEmbedding batch failed ({e}), retrying in {delay:.2f}s")
+            time.sleep(delay)
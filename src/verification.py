@@ -1,40 +1,111 @@
 import json
 import random
 
+# Document types sampled into table_rag_sample_documents.json, and how many of each
+SAMPLE_DOC_TYPES = ["customer_row", "segment_statistics", "multi_segment_statistics"]
+SAMPLES_PER_TYPE = 5
+
+class DocumentCounters:
+    """Document counts by type and multi-dimension pair, updated one document at a time."""
+
+    def __init__(self):
+        self.doc_types = {}
+        self.dimension_combos = {}
+        self.first_multi_segment = None
+
+    def add(self, doc):
+        doc_type = doc.metadata.get("doc_type", "unknown")
+        self.doc_types[doc_type] = self.doc_types.get(doc_type, 0) + 1
+        if doc_type == "multi_segment_statistics":
+            dim_pair = (doc.metadata.get("dimension1", ""), doc.metadata.get("dimension2", ""))
+            self.dimension_combos[dim_pair] = self.dimension_combos.get(dim_pair, 0) + 1
+            if self.first_multi_segment is None:
+                self.first_multi_segment = doc
+
+    def report(self):
+        """Print the document distribution, the multi-dimension coverage and a sample multi-dimension segment."""
+        print("Document distribution by type:")
+        for doc_type, count in self.doc_types.items():
+            print(f"- {doc_type}: {count} documents")
+
+        # Verify multi-dimension coverage
+        if self.dimension_combos:
+            print("\nMulti-dimension coverage:")
+            for dims, count in self.dimension_combos.items():
+                print(f"- {dims[0]} + {dims[1]}: {count} segments")
+
+        # Display sample multi-dimension segment
+        if self.first_multi_segment is not None:
+            print("\nSample multi-dimension segment document:")
+            print(self.first_multi_segment.page_content)
+            print("\nMulti-segment metadata:")
+            print(self.first_multi_segment.metadata)
+
+class DocumentReservoir:
+    """
+    Uniform random sample of up to `size` documents of each type, kept by reservoir sampling.
+
+    Args:
+        size: Documents kept per type.
+        doc_types: Document types sampled (default: SAMPLE_DOC_TYPES).
+        seed: Optional random seed.
+    """
+
+    def __init__(self, size=SAMPLES_PER_TYPE, doc_types=None, seed=None):
+        self.size = size
+        self.samples = {doc_type: [] for doc_type in (doc_types or SAMPLE_DOC_TYPES)}
+        self.seen = dict.fromkeys(self.samples, 0)
+        self.rng = random.Random(seed)
+
+    def add(self, doc):
+        doc_type = doc.metadata.get("doc_type")
+        sample = self.samples.get(doc_type)
+        if sample is None:
+            return
+        self.seen[doc_type] += 1
+        if len(sample) < self.size:
+            sample.append(doc)
+        else:
+            # Keep the n-th document with probability size / n
+            slot = self.rng.randrange(self.seen[doc_type])
+            if slot < self.size:
+                sample[slot] = doc
+
+    def documents(self):
+        """The sampled documents, grouped by type."""
+        return [doc for sample in self.samples.values() for doc in sample]
+
+    def save(self, path="table_rag_sample_documents.json"):
+        """Save the sampled documents to JSON for inspection."""
+        sample_dict = [{"content": doc.page_content, "metadata": doc.metadata} for doc in self.documents()]
+        with open(path, "w") as f:
+            json.dump(sample_dict, f, indent=2)
+
+        print(f"\nSaved {len(sample_dict)} sample documents to '{path}'")
+
+def observe_documents(documents, *observers):
+    """Yield each document after passing it to every observer's add(), so one pass feeds them all."""
+    for doc in documents:
+        for observer in observers:
+            observer.add(doc)
+        yield doc
+
 def verify_documents(documents):
     """Verify the quality and distribution of created documents."""
-    # Analyze document distribution
-    doc_types = {}
+    counters = DocumentCounters()
     for doc in documents:
-        doc_type = doc.metadata.get("doc_type", "unknown")
-        doc_types[doc_type] = doc_types.get(doc_type, 0) + 1
-
-    print("Document distribution by type:")
-    for doc_type, count in doc_types.items():
-        print(f"- {doc_type}: {count} documents")
-
-    # Verify multi-dimension coverage
-    if "multi_segment_statistics" in doc_types:
-        dimension_combos = {}
-        for doc in documents:
-            if doc.metadata.get("doc_type") == "multi_segment_statistics":
-                dim_pair = (doc.metadata.get("dimension1", ""), doc.metadata.get("dimension2", ""))
-                dimension_combos[dim_pair] = dimension_combos.get(dim_pair, 0) + 1
-
-        print("\nMulti-dimension coverage:")
-        for dims, count in dimension_combos.items():
-            print(f"- {dims[0]} + {dims[1]}: {count} segments")
-
-    # Display sample multi-dimension segment
-    multi_segment_docs = [doc for doc in documents if doc.metadata.get("doc_type") == "multi_segment_statistics"]
-    if multi_segment_docs:
-        print("\nSample multi-dimension segment document:")
-        print(multi_segment_docs[0].page_content)
-        print("\nMulti-segment metadata:")
-        print(multi_segment_docs[0].metadata)
-
-def find_matching_documents(documents, criteria, limit=3):
-    """Find documents that match the specified criteria in metadata."""
+        counters.add(doc)
+    counters.report()
+
+def find_matching_documents(documents, criteria, limit=3, index=None):
+    """
+    Find documents that match the specified criteria in metadata.
+
+    With a MetadataIndex built over `documents`, the matches are looked up in the
+    index instead of scanning every document.
+    """
+    if index is not None:
+        return index.match(criteria, limit)
     matches = []
     for doc in documents:
         if all(doc.metadata.get(key) == value for key, value in criteria.items()):
@@ -43,9 +114,9 @@ def find_matching_documents(documents, criteria, limit=3):
                 break
     return matches
 
-def check_query_capabilities(documents, description, criteria):
+def check_query_capabilities(documents, description, criteria, index=None):
     """Check if documents can answer a specific query."""
-    matches = find_matching_documents(documents, criteria)
+    matches = find_matching_documents(documents, criteria, index=index)
     print(f"\nQuery capability: {description}")
     print(f"Found {len(matches)} matching documents")
 
@@ -60,13 +131,7 @@ def check_query_capabilities(documents, description, criteria):
 
 def save_sample_documents(documents):
     """Save a sample of documents to JSON for inspection."""
-    sample_docs = []
-    for doc_type in ["customer_row", "segment_statistics", "multi_segment_statistics"]:
-        docs = [doc for doc in documents if doc.metadata.get("doc_type") == doc_type]
-        sample_docs.extend(random.sample(docs, min(5, len(docs))))
-
-    sample_dict = [{"content": doc.page_content, "metadata": doc.metadata} for doc in sample_docs]
-    with open("table_rag_sample_documents.json", "w") as f:
-        json.dump(sample_dict, f, indent=2)
-
-    print(f"\nSaved {len(sample_dict)} sample documents to 'table_rag_sample_documents.json'")
+    reservoir = DocumentReservoir()
+    for doc in documents:
+        reservoir.add(doc)
+    reservoir.save()